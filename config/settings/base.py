@@ -296,12 +296,54 @@ DEEDS_INITIAL_DATA = {
     "OriginType": ["birth", "death", "domicile"],
     "Role": ["father", "mother", "bride", "groom", "deceased"],
 }
+# Number of rows read from a data sheet at a time
+DEEDS_IMPORT_CHUNK_SIZE = env.int("DEEDS_IMPORT_CHUNK_SIZE", 5000)
+# Number of rows written per batch by the bulk import
+DEEDS_IMPORT_BATCH_SIZE = env.int("DEEDS_IMPORT_BATCH_SIZE", 500)
+# Number of rows committed per transaction by the row by row import
+DEEDS_IMPORT_COMMIT_SIZE = env.int("DEEDS_IMPORT_COMMIT_SIZE", 500)
+# Number of rows loaded by each job of a background import
+DEEDS_IMPORT_JOB_CHUNK_SIZE = env.int("DEEDS_IMPORT_JOB_CHUNK_SIZE", 1000)
+# Number of location names resolved by each job of a background import
+DEEDS_IMPORT_PLACES_CHUNK_SIZE = env.int("DEEDS_IMPORT_PLACES_CHUNK_SIZE", 500)
+# Formats of the dates in the data sheets, tried in order
+DEEDS_DATE_FORMATS = env.list(
+    "DEEDS_DATE_FORMATS",
+    default=["%d/%m/%Y", "%Y-%m-%d", "%Y-%m-%d %H:%M:%S", "%d-%m-%Y", "%d.%m.%Y"],
+)
+# Formats of the partial dates, read as the first day of the month or year
+DEEDS_PARTIAL_DATE_FORMATS = env.list(
+    "DEEDS_PARTIAL_DATE_FORMATS", default=["%m/%Y", "%Y-%m", "%Y"]
+)
+# Whether the import reuses the persons with a similar surname and birth year
+DEEDS_MATCH_PERSONS = env.bool("DEEDS_MATCH_PERSONS", False)
+# Number of years the birth years of matching persons can differ by
+DEEDS_MATCH_BIRTH_YEAR_WINDOW = env.int("DEEDS_MATCH_BIRTH_YEAR_WINDOW", 1)
+# Number of seconds between the checks of the version of the vocabulary tables,
+# which are changed by other processes
+DEEDS_VOCABULARY_CHECK_INTERVAL = env.float("DEEDS_VOCABULARY_CHECK_INTERVAL", 5)
+# Number of origins fetched at a time by the GeoJSON export
+DEEDS_EXPORT_CHUNK_SIZE = env.int("DEEDS_EXPORT_CHUNK_SIZE", 2000)
 
 # Geonames
 # https://github.com/kingsdigitallab/django-geonames-place
 # ------------------------------------------------------------------------------
 GEONAMES_KEY = env("GEONAMES_KEY")
 GEONAMES_MAX_RESULTS = 1
+# Number of concurrent geonames lookups
+GEONAMES_MAX_WORKERS = env.int("GEONAMES_MAX_WORKERS", 4)
+# Maximum number of geonames requests per second, and per hour, shared by the
+# processes through the cache
+GEONAMES_REQUESTS_PER_SECOND = env.float("GEONAMES_REQUESTS_PER_SECOND", 4)
+GEONAMES_HOURLY_QUOTA = env.int("GEONAMES_HOURLY_QUOTA", 1000)
+# Retries for lookups that fail with a transient error, the wait in seconds before
+# the first retry doubles for each retry after it
+GEONAMES_MAX_RETRIES = env.int("GEONAMES_MAX_RETRIES", 3)
+GEONAMES_RETRY_BACKOFF = env.float("GEONAMES_RETRY_BACKOFF", 1)
+# Number of days the addresses geonames did not find are cached for
+GEONAMES_CACHE_NEGATIVE_TTL = env.int("GEONAMES_CACHE_NEGATIVE_TTL", 30)
+# Number of gazetteer records loaded per batch
+GEONAMES_GAZETTEER_BATCH_SIZE = env.int("GEONAMES_GAZETTEER_BATCH_SIZE", 5000)
 
 # Redis Queue
 # https://github.com/rq/django-rq/
@@ -37,5 +37,9 @@ TEMPLATES[0]["OPTIONS"]["loaders"] = [  # noqa F405
 # https://docs.djangoproject.com/en/dev/ref/settings/#email-backend
 EMAIL_BACKEND = "django.core.mail.backends.locmem.EmailBackend"
 
+# GEONAMES
+# ------------------------------------------------------------------------------
+GEONAMES_MAX_RETRIES = 0
+
 # Your stuff...
 # ------------------------------------------------------------------------------
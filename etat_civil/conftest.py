@@ -1,3 +1,4 @@
+import geocoder
 import pandas as pd
 import pytest
 from django.conf import settings
@@ -8,6 +9,8 @@ from etat_civil.deeds.tests.factories import (
     PersonFactory,
     SourceFactory,
 )
+from etat_civil.geonames_place import resolver
+from etat_civil.geonames_place.tests.fakes import FakeGeonames
 from etat_civil.users.tests.factories import UserFactory
 
 
@@ -61,3 +64,13 @@ def deed() -> DeedFactory:
 @pytest.fixture
 def person() -> PersonFactory:
     return PersonFactory()
+
+
+@pytest.fixture
+def geonames(monkeypatch) -> FakeGeonames:
+    """Answers the geonames lookups from a fake gazetteer, without rate limit."""
+    lookup = FakeGeonames()
+    monkeypatch.setattr(geocoder, "geonames", lookup)
+    monkeypatch.setattr(resolver, "limiter", resolver.RateLimiter(0, None))
+
+    return lookup
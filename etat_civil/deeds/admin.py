@@ -1,15 +1,24 @@
+from collections import Counter
+
 from django.contrib import admin
+from django.shortcuts import get_object_or_404
+from django.template.response import TemplateResponse
+from django.urls import path
 
-from etat_civil.deeds.jobs import import_data_async
+from etat_civil.deeds.jobs import import_data_async, purge_data_async
 from etat_civil.deeds.models import (
     Data,
     Deed,
     DeedType,
     Gender,
+    ImportCheckpoint,
+    ImportReject,
+    ImportRun,
     Origin,
     OriginType,
     Party,
     Person,
+    PlaceAlias,
     Profession,
     Role,
     Source,
@@ -21,13 +30,144 @@ class BaseALAdmin(admin.ModelAdmin):
     search_fields = ["title"]
 
 
+class ImportCheckpointInline(admin.TabularInline):
+    model = ImportCheckpoint
+
+    can_delete = False
+    extra = 0
+    fields = ["sheet", "row", "loaded", "completed", "modified"]
+    readonly_fields = fields
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+
 @admin.register(Data)
 class DataAdmin(admin.ModelAdmin):
+    actions = ["resume_import", "purge_data"]
+    inlines = [ImportCheckpointInline]
     list_display = ["title", "data"]
 
+    def resume_import(self, request, queryset):
+        for data in queryset:
+            import_data_async.delay(data, resume=True)
+
+    resume_import.short_description = "Resume the import of the selected data"
+
+    def purge_data(self, request, queryset):
+        for data in queryset:
+            purge_data_async.delay(data)
+            self.message_user(
+                request, f"{data}: the deeds will be deleted in the background"
+            )
+
+    purge_data.short_description = "Delete the deeds imported from the selected data"
+
     def save_model(self, request, obj, form, change):
         super().save_model(request, obj, form, change)
-        import_data_async.delay(obj)
+        # a new upload of the data is imported incrementally
+        import_data_async.delay(obj, delta=change)
+
+    def get_urls(self):
+        return [
+            path(
+                "<path:object_id>/validate/",
+                self.admin_site.admin_view(self.validate_view),
+                name="deeds_data_validate",
+            )
+        ] + super().get_urls()
+
+    def validate_view(self, request, object_id):
+        """Shows the issues found in the data file, without importing it."""
+        data = get_object_or_404(Data, pk=object_id)
+        issues = data.validate()
+
+        context = {
+            **self.admin_site.each_context(request),
+            "opts": self.model._meta,
+            "original": data,
+            "title": f"Validate {data}",
+            "issues": issues,
+            "counts": Counter(issue.message for issue in issues).most_common(),
+        }
+
+        return TemplateResponse(request, "admin/deeds/data/validate.html", context)
+
+
+class ImportRejectInline(admin.TabularInline):
+    model = ImportReject
+
+    can_delete = False
+    extra = 0
+    fields = ["sheet", "row", "error"]
+    readonly_fields = fields
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(ImportRun)
+class ImportRunAdmin(admin.ModelAdmin):
+    date_hierarchy = "created"
+    inlines = [ImportRejectInline]
+    list_display = [
+        "data",
+        "created",
+        "mode",
+        "status",
+        "duration",
+        "rows_read",
+        "rows_failed",
+        "get_rows_per_second",
+        "parse_time",
+        "places_time",
+        "geocoding_time",
+        "write_time",
+        "queries",
+    ]
+    list_filter = ["data", "mode", "status"]
+    fieldsets = [
+        (None, {"fields": ["data", "mode", "status", "created", "finished"]}),
+        ("Rows", {"fields": ["duration", "rows_read", "rows_failed"]}),
+        (
+            "Stages",
+            {
+                "fields": [
+                    ("parse_time", "parse_queries"),
+                    ("places_time", "places_queries"),
+                    ("geocoding_time", "geocoding_queries"),
+                    ("write_time", "write_queries"),
+                    "queries",
+                ]
+            },
+        ),
+        (
+            "Places",
+            {
+                "fields": [
+                    "places_cache",
+                    "places_geonames_id",
+                    "places_name",
+                    "places_lat_lon",
+                    "places_unresolved",
+                ]
+            },
+        ),
+    ]
+
+    def get_readonly_fields(self, request, obj=None):
+        return [field.name for field in self.model._meta.fields]
+
+    def has_add_permission(self, request):
+        return False
+
+    def get_rows_per_second(self, obj):
+        if obj.rows_per_second is None:
+            return None
+
+        return round(obj.rows_per_second, 1)
+
+    get_rows_per_second.short_description = "Rows per second"
 
 
 class PartyInline(admin.TabularInline):
@@ -88,7 +228,7 @@ class PersonAdmin(admin.ModelAdmin):
     ]
     list_display_links = list_display
     list_filter = ["gender", "age", "surname"]
-    search_fields = ["name", "surname", "origin_from__place__address"]
+    search_fields = ["name", "surname", "match_key", "origin_from__place__address"]
 
 
 @admin.register(Origin)
@@ -99,6 +239,16 @@ class OriginAdmin(admin.ModelAdmin):
     list_filter = ["origin_type", "place"]
 
 
+@admin.register(PlaceAlias)
+class PlaceAliasAdmin(admin.ModelAdmin):
+    autocomplete_fields = ["place"]
+    date_hierarchy = "modified"
+    list_display = ["name", "place", "source", "modified"]
+    list_editable = ["place"]
+    list_filter = ["source", "place__country"]
+    search_fields = ["name", "place__address", "place__geonames_id"]
+
+
 @admin.register(Profession)
 class ProfessionAdmin(BaseALAdmin):
     pass
@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class DeedsConfig(AppConfig):
     name = "etat_civil.deeds"
+
+    def ready(self):
+        import etat_civil.deeds.signals  # noqa F401
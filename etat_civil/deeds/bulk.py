@@ -0,0 +1,611 @@
+from datetime import datetime
+from functools import partial
+from itertools import islice
+
+import pandas as pd
+from django.conf import settings
+from django.core.exceptions import MultipleObjectsReturned
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Q
+
+from etat_civil.deeds.matching import BlockingIndex, get_match_key
+from etat_civil.deeds.models import (
+    Deed,
+    DeedType,
+    Origin,
+    OriginType,
+    Party,
+    Person,
+    Profession,
+    Source,
+)
+from etat_civil.deeds.normalize import iter_records, normalize_sheet
+from etat_civil.deeds.upsert import supports_upsert, upsert
+
+
+# fields of the rows that an upsert never updates, the staged rows that would
+# change them are rejected by the loader
+KEEP_FIELDS = {Deed: ["deed_type"]}
+
+
+def as_date(value):
+    if isinstance(value, datetime):
+        return value.date()
+
+    return value
+
+
+def as_value(value):
+    return None if pd.isnull(value) else value
+
+
+def chunks(values, size):
+    values = iter(values)
+    chunk = list(islice(values, size))
+
+    while chunk:
+        yield chunk
+        chunk = list(islice(values, size))
+
+
+class BulkLoader:
+    """Loads the deed sheets of a `Data` by staging the deeds, persons, origins and
+    parties of the rows in memory, and writing them with batched `bulk_create`
+    calls. It creates the same rows as `Data.load_deed`, but the lookups that
+    `Data.load_deed` does with `get_or_create` are done in memory against the
+    rows that already exist in the database, fetched once per sheet. When the
+    database supports it the rows are written with upserts on their natural keys,
+    see `etat_civil.deeds.upsert`, so that the rows that changed since a previous
+    import are updated."""
+
+    def __init__(self, data, batch_size=None):
+        self.data = data
+        self.batch_size = batch_size or settings.DEEDS_IMPORT_BATCH_SIZE
+
+        self.places = {}
+        self.sources = {}
+        self.professions = {}
+
+        self.deeds = {}
+        self.persons = {}
+        self.ambiguous_persons = set()
+        self.origins = {}
+        self.parties = {}
+
+        self.new_deeds = []
+        self.new_persons = []
+        self.new_origins = []
+        self.new_parties = []
+        self.pending = 0
+
+        # the changes to undo when the row being staged fails
+        self.undo = []
+
+        # the deed loaded from each row of the last sheet, by row index
+        self.row_deeds = {}
+
+        # the numbers for the surnames of the unknown persons, and whether they
+        # were reserved for the import of the data, see `get_unknown_number`
+        self.unknown_numbers = range(0)
+        self.reserved_numbers = False
+
+        # index of the persons to match when the exact lookup fails
+        self.index = None
+        if settings.DEEDS_MATCH_PERSONS:
+            self.index = BlockingIndex(window=settings.DEEDS_MATCH_BIRTH_YEAR_WINDOW)
+
+    def load_births(self, births_df):
+        return self.load_deed(
+            births_df, DeedType.get_birth(), Deed.get_birth_parties(), "births"
+        )
+
+    def load_marriages(self, marriages_df):
+        return self.load_deed(
+            marriages_df,
+            DeedType.get_marriage(),
+            Deed.get_marriage_parties(),
+            "marriages",
+        )
+
+    def load_deaths(self, deaths_df):
+        return self.load_deed(
+            deaths_df,
+            DeedType.get_death(),
+            Deed.get_death_parties(),
+            "deaths",
+            from_death_deed=True,
+        )
+
+    def load_deed(self, df, deed_type, parties, sheet_name=None, from_death_deed=False):
+        if df is None:
+            return False
+
+        labels = [label for label, _, _ in parties]
+        with self.data.stage("parse"):
+            normalized = normalize_sheet(df, labels)
+
+        self.prefetch(normalized, labels)
+        self.row_deeds = {}
+
+        for index, deed_record, person_records in iter_records(normalized, labels):
+            marks = self.get_marks()
+            try:
+                self.row_deeds[index] = self.load_row(
+                    deed_type, parties, deed_record, person_records, from_death_deed
+                )
+            except Exception as e:  # noqa
+                self.rollback_row(marks)
+                self.data.reject_row(sheet_name, index, e)
+                continue
+            finally:
+                self.pending += 1
+
+            if self.pending >= self.batch_size:
+                self.flush()
+
+        self.flush()
+        self.release_unknown_numbers()
+
+        return True
+
+    def get_marks(self):
+        self.undo = []
+
+        return [
+            len(self.new_deeds),
+            len(self.new_persons),
+            len(self.new_origins),
+            len(self.new_parties),
+        ]
+
+    def rollback_row(self, marks):
+        """Unstages the rows staged since the `marks` were taken, so that a row
+        that fails is not partially written."""
+        for staged, mark in zip(
+            [self.new_deeds, self.new_persons, self.new_origins, self.new_parties],
+            marks,
+        ):
+            del staged[mark:]
+
+        for undo in reversed(self.undo):
+            undo()
+        self.undo = []
+
+    def prefetch(self, normalized, labels):
+        """Fetches the deeds and persons, and their parties and origins, that may
+        be matched by the rows in the `normalized` data frame."""
+        for ns in chunks(set(normalized["n"]), self.batch_size):
+            deeds = Deed.objects.filter(n__in=ns).select_related("place", "source")
+            for deed in deeds:
+                self.deeds.setdefault(deed_key(deed.n, deed.date, deed.place), deed)
+
+        names = set()
+        match_keys = set()
+        for label in labels:
+            names.update(
+                (as_value(name), as_value(surname))
+                for name, surname in zip(
+                    normalized[f"{label}name"], normalized[f"{label}surname"]
+                )
+            )
+            if self.index is not None:
+                match_keys.update(
+                    map(get_match_key, normalized[f"{label}surname"].dropna())
+                )
+        names.discard((None, None))
+
+        queries = [
+            Person.objects.filter(get_names_query(values))
+            for values in chunks(names, self.batch_size)
+        ]
+        queries.extend(
+            Person.objects.filter(match_key__in=values)
+            for values in chunks(match_keys - {None}, self.batch_size)
+        )
+
+        seen = {}
+        for query in queries:
+            for person in query:
+                key = person_key(
+                    person.name,
+                    person.surname,
+                    person.unknown,
+                    person.gender_id,
+                    person.birth_year,
+                )
+                if key in seen and seen[key].pk != person.pk:
+                    self.ambiguous_persons.add(key)
+                seen[key] = person
+                if self.persons.setdefault(key, person) is not person:
+                    continue
+                if self.index is not None:
+                    self.index.add(person)
+
+        persons = {p.pk: p for p in self.persons.values() if p.pk}
+        for pks in chunks(persons.keys(), self.batch_size):
+            for origin in Origin.objects.filter(person_id__in=pks):
+                origin.person = persons[origin.person_id]
+                key = origin_key(
+                    origin.person,
+                    origin.place_id,
+                    origin.origin_type_id,
+                    origin.date,
+                    origin.order,
+                )
+                self.origins.setdefault(key, origin)
+
+        deeds = {d.pk: d for d in self.deeds.values() if d.pk}
+        for pks in chunks(deeds.keys(), self.batch_size):
+            parties = Party.objects.filter(deed_id__in=pks).select_related("profession")
+            for party in parties:
+                if party.person_id in persons:
+                    party.deed = deeds[party.deed_id]
+                    party.person = persons[party.person_id]
+                    key = party_key(party.deed, party.person, party.role_id)
+                    self.parties.setdefault(key, party)
+
+    def load_row(
+        self, deed_type, parties, deed_record, person_records, from_death_deed=False
+    ):
+        source = self.get_source(deed_record.classmark, deed_record.microfilm)
+        if not source:
+            return None
+
+        deed = self.get_deed(deed_type, source, deed_record)
+
+        for (_, gender, role), record in zip(parties, person_records):
+            self.load_person(gender, role, deed, record, from_death_deed)
+
+        return deed
+
+    def get_source(self, classmark, microfilm):
+        key = (classmark, microfilm)
+
+        if key not in self.sources:
+            self.sources[key] = Source.load_source(self.data, classmark, microfilm)
+
+        return self.sources[key]
+
+    def get_place(self, name):
+        if name not in self.places:
+            self.places[name], _ = self.data.get_place(name)
+
+        return self.places[name]
+
+    def get_deed(self, deed_type, source, record):
+        place = self.get_place(record.deed_location)
+
+        if place is None or record.date is None:
+            raise IntegrityError("The deed date and place are required")
+
+        key = deed_key(record.n, record.date, place)
+        deed = self.deeds.get(key)
+
+        if deed is None:
+            deed = Deed(
+                deed_type=deed_type,
+                n=record.n,
+                date=record.date,
+                place=place,
+                source=source,
+                notes=record.notes,
+            )
+            self.deeds[key] = deed
+            self.new_deeds.append(deed)
+            self.undo.append(partial(self.deeds.pop, key))
+        elif deed.deed_type_id != deed_type.pk:
+            raise IntegrityError(f"A deed of another type already exists for {key}")
+        elif deed.source.data_id != self.data.pk:
+            raise IntegrityError(
+                f"A deed of another data file already exists for {key}"
+            )
+        elif (deed.source_id, deed.notes) != (source.pk, record.notes):
+            # the deed changed since it was loaded, it is updated
+            self.undo.append(partial(self.restore_deed, deed, deed.source, deed.notes))
+            deed.source = source
+            deed.notes = record.notes
+            if deed not in self.new_deeds:
+                self.new_deeds.append(deed)
+
+        return deed
+
+    def restore_deed(self, deed, source, notes):
+        deed.source = source
+        deed.notes = notes
+
+    def load_person(self, gender, role, deed, record, from_death_deed=False):
+        person = self.get_person(
+            record.name,
+            record.surname,
+            bool(record.unknown),
+            gender,
+            record.age,
+            record.birth_year,
+        )
+
+        self.load_origins(person, deed, record, from_death_deed=from_death_deed)
+        self.load_party(person, role, deed, record)
+
+        return person
+
+    def get_person(self, name, surname, unknown, gender, age, birth_year):
+        gender_id = gender.pk if gender else None
+        key = person_key(name, surname, unknown, gender_id, birth_year)
+
+        if key in self.ambiguous_persons:
+            raise MultipleObjectsReturned(f"More than one person matches {key}")
+
+        person = self.persons.get(key)
+
+        if person is None and self.index is not None and not unknown:
+            person = self.index.match(name, surname, gender_id, birth_year)
+
+        if person is None:
+            person = Person(
+                name=name,
+                surname=surname,
+                unknown=unknown,
+                gender=gender,
+                age=age,
+                birth_year=birth_year,
+            )
+
+            if unknown and not surname:
+                person.surname = str(self.get_unknown_number())
+                key = person_key(name, person.surname, unknown, gender_id, birth_year)
+
+            person.match_key = get_match_key(person.surname)
+
+            self.persons[key] = person
+            self.new_persons.append(person)
+            self.undo.append(partial(self.persons.pop, key))
+            if self.index is not None:
+                self.index.add(person)
+                self.undo.append(partial(self.index.remove, person))
+
+        return person
+
+    def get_unknown_number(self):
+        """Returns the next number for the surname of an unknown person, from the
+        numbers reserved for the import of the data, see
+        `Data.reserve_unknown_numbers`, or from blocks of `batch_size` numbers
+        reserved when there are none."""
+        if not self.unknown_numbers:
+            self.reserved_numbers = bool(self.data.unknown_numbers)
+
+            if self.reserved_numbers:
+                self.unknown_numbers = self.data.unknown_numbers
+                self.data.unknown_numbers = None
+            else:
+                self.unknown_numbers = Person.reserve_unknown_numbers(self.batch_size)
+
+        number = self.unknown_numbers[0]
+        self.unknown_numbers = self.unknown_numbers[1:]
+
+        return number
+
+    def release_unknown_numbers(self):
+        """Gives the numbers left back to the data when they were reserved for its
+        import, they are released when the import ends, or else to the
+        sequence."""
+        if self.reserved_numbers:
+            self.data.unknown_numbers = self.unknown_numbers
+        else:
+            Person.release_unknown_numbers(self.unknown_numbers)
+
+        self.unknown_numbers = range(0)
+        self.reserved_numbers = False
+
+    def load_origins(self, person, deed, record, from_death_deed=False):
+        address = record.domicile
+        if pd.isnull(address):
+            address = deed.place.address
+
+        self.load_origin(
+            person, address, OriginType.get_domicile(), origin_date=deed.date, order=5
+        )
+
+        birth_date = record.birth_date
+        previous_domicile_date = record.previous_domicile_date
+
+        if person.age != record.age:
+            # the person was loaded from another row, the dates are computed from
+            # the age recorded for the person
+            birth_date = Person.get_birth_date(deed.date, person.age)
+            previous_domicile_date = birth_date + (deed.date - birth_date) / 2
+
+        is_date_computed = False
+        if not person.age:
+            is_date_computed = True
+
+        address = record.birth_location
+        if pd.notnull(address):
+            self.load_origin(
+                person,
+                address,
+                OriginType.get_birth(),
+                origin_date=birth_date,
+                is_date_computed=is_date_computed,
+                order=1,
+            )
+
+        if from_death_deed:
+            self.load_origin(
+                person,
+                deed.place.address,
+                OriginType.get_death(),
+                origin_date=deed.date,
+                order=8,
+            )
+        else:
+            address = record.previous_domicile_location
+            if pd.notnull(address):
+                self.load_origin(
+                    person,
+                    address,
+                    OriginType.get_domicile(),
+                    origin_date=previous_domicile_date,
+                    is_date_computed=True,
+                    order=3,
+                )
+
+    def load_origin(
+        self,
+        person,
+        address,
+        origin_type,
+        origin_date=None,
+        is_date_computed=False,
+        order=99,
+    ):
+        if pd.isnull(address):
+            return None
+
+        place = self.get_place(address)
+        if place is None:
+            return None
+
+        key = origin_key(person, place.pk, origin_type.pk, origin_date, order)
+        origin = self.origins.get(key)
+
+        if origin is None:
+            origin = Origin(
+                person=person,
+                place=place,
+                origin_type=origin_type,
+                date=origin_date,
+                is_date_computed=is_date_computed,
+                order=order,
+            )
+            self.origins[key] = origin
+            self.new_origins.append(origin)
+            self.undo.append(partial(self.origins.pop, key))
+        elif origin.is_date_computed != is_date_computed:
+            # the origin changed since it was loaded, it is updated
+            self.undo.append(
+                partial(setattr, origin, "is_date_computed", origin.is_date_computed)
+            )
+            origin.is_date_computed = is_date_computed
+            if origin not in self.new_origins:
+                self.new_origins.append(origin)
+
+        return origin
+
+    def load_party(self, person, role, deed, record):
+        profession = self.get_profession(record.profession)
+
+        key = party_key(deed, person, role.pk)
+        party = self.parties.get(key)
+
+        if party is None:
+            party = Party(deed=deed, person=person, role=role, profession=profession)
+            self.parties[key] = party
+            self.new_parties.append(party)
+            self.undo.append(partial(self.parties.pop, key))
+        elif party.profession_id != (profession.pk if profession else None):
+            # the party changed since it was loaded, it is updated
+            self.undo.append(partial(setattr, party, "profession", party.profession))
+            party.profession = profession
+            if party not in self.new_parties:
+                self.new_parties.append(party)
+
+        return party
+
+    def get_profession(self, title):
+        if pd.isnull(title):
+            return None
+
+        title = title.strip()
+
+        if title not in self.professions:
+            self.professions[title], _ = Profession.objects.get_or_create(title=title)
+
+        return self.professions[title]
+
+    def flush(self):
+        """Writes the staged rows to the database."""
+        with transaction.atomic():
+            self.create(Deed, self.new_deeds)
+            self.create(Person, self.new_persons)
+
+            for origin in self.new_origins:
+                origin.person_id = origin.person.pk
+            self.create(Origin, self.new_origins)
+
+            for party in self.new_parties:
+                party.deed_id = party.deed.pk
+                party.person_id = party.person.pk
+            self.create(Party, self.new_parties)
+
+        self.new_deeds = []
+        self.new_persons = []
+        self.new_origins = []
+        self.new_parties = []
+        self.pending = 0
+
+    def create(self, model, objs):
+        if not objs:
+            return
+
+        if supports_upsert(connection):
+            upsert(
+                model,
+                objs,
+                batch_size=self.batch_size,
+                keep_fields=KEEP_FIELDS.get(model),
+            )
+            return
+
+        for obj in [obj for obj in objs if obj.pk]:
+            obj.save()
+        objs = [obj for obj in objs if not obj.pk]
+
+        returns_ids = connection.features.can_return_ids_from_bulk_insert
+        if returns_ids or model in (Origin, Party):
+            model.objects.bulk_create(objs, batch_size=self.batch_size)
+            return
+
+        # the database does not set the ids of the created objects, they are
+        # needed to link the origins and parties
+        for obj in objs:
+            obj.save(force_insert=True)
+
+
+def deed_key(n, date, place):
+    return (n, as_date(date), place.pk)
+
+
+def person_key(name, surname, unknown, gender_id, birth_year):
+    return (name, surname, unknown, gender_id, birth_year)
+
+
+def get_names_query(names):
+    """Returns the query of the persons with the `(name, surname)` pairs of the
+    `names`, the pairs are grouped by surname, and the missing names and surnames
+    are matched with `isnull`."""
+    surnames = {}
+    for name, surname in names:
+        surnames.setdefault(surname, set()).add(name)
+
+    query = Q()
+    for surname, given_names in surnames.items():
+        names_query = Q(name__in=given_names - {None})
+        if None in given_names:
+            names_query |= Q(name__isnull=True)
+
+        if surname is None:
+            query |= Q(surname__isnull=True) & names_query
+        else:
+            query |= Q(surname=surname) & names_query
+
+    return query
+
+
+def origin_key(person, place_id, origin_type_id, date, order):
+    """Returns the key of an origin, the fields of `Origin.unique_together`."""
+    return (id(person), place_id, origin_type_id, as_date(date), order)
+
+
+def party_key(deed, person, role_id):
+    """Returns the key of a party, the fields of `Party.unique_together`."""
+    return (id(deed), id(person), role_id)
@@ -0,0 +1,108 @@
+"""Parses the dates of the data sheets with explicit, day first, formats instead of
+letting pandas guess the format of each value, which reads `03/05/1818` as the 5th
+of March. Each distinct value of a column is only parsed once. Partial dates, a
+month and year or a year, are parsed as the first day of the month or year."""
+from collections import namedtuple
+from datetime import date, datetime
+
+import pandas as pd
+from django.conf import settings
+
+PRECISION_DAY = "day"
+PRECISION_MONTH = "month"
+PRECISION_YEAR = "year"
+
+ParsedDate = namedtuple("ParsedDate", ["date", "precision"])
+
+
+def get_precision(date_format):
+    if "%d" in date_format:
+        return PRECISION_DAY
+
+    if "%m" in date_format or "%b" in date_format or "%B" in date_format:
+        return PRECISION_MONTH
+
+    return PRECISION_YEAR
+
+
+class DateParser:
+    """Parses dates with the `formats`, tried in order, and the `partial_formats`,
+    by default the `DEEDS_DATE_FORMATS` and `DEEDS_PARTIAL_DATE_FORMATS` settings.
+    The parsed values are kept in a lookup table, so that the values repeated in
+    the rows of a sheet, or in the chunks of a sheet, are only parsed once."""
+
+    def __init__(self, formats=None, partial_formats=None):
+        if formats is None:
+            formats = settings.DEEDS_DATE_FORMATS
+        if partial_formats is None:
+            partial_formats = settings.DEEDS_PARTIAL_DATE_FORMATS
+
+        self.formats = [(f, get_precision(f)) for f in formats + partial_formats]
+        self.lookup = {}
+
+    def parse(self, value):
+        """Returns a `ParsedDate` with the value as a `pd.Timestamp`, or None if
+        the value is not a date in one of the formats, and its precision."""
+        try:
+            return self.lookup[value]
+        except KeyError:
+            pass
+        except TypeError:
+            # unhashable values are not dates
+            return ParsedDate(None, None)
+
+        parsed = self.lookup[value] = self.parse_value(value)
+
+        return parsed
+
+    def parse_value(self, value):
+        if isinstance(value, (datetime, date)):
+            return self.to_timestamp(value, PRECISION_DAY)
+
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            if pd.isnull(value) or value != int(value):
+                return ParsedDate(None, None)
+            # a year read as a number
+            value = str(int(value))
+
+        if not isinstance(value, str):
+            return ParsedDate(None, None)
+
+        value = value.strip()
+        for date_format, precision in self.formats:
+            try:
+                return self.to_timestamp(
+                    datetime.strptime(value, date_format), precision
+                )
+            except ValueError:
+                continue
+
+        return ParsedDate(None, None)
+
+    def to_timestamp(self, value, precision):
+        try:
+            return ParsedDate(pd.Timestamp(value), precision)
+        except (ValueError, OverflowError):
+            # out of the range of the dates pandas can represent
+            return ParsedDate(None, None)
+
+    def parse_dates(self, values):
+        """Returns the values of a series parsed as dates, a `datetime64` series
+        with `NaT` for the values that are not dates."""
+        if pd.api.types.is_datetime64_any_dtype(values):
+            return values
+
+        dates = {value: self.parse(value).date for value in values.dropna().unique()}
+
+        return pd.to_datetime(values.map(dates))
+
+    def parse_precisions(self, values):
+        """Returns the precision of each of the values of a series, or None."""
+        if pd.api.types.is_datetime64_any_dtype(values):
+            return values.notnull().map({True: PRECISION_DAY, False: None})
+
+        precisions = {
+            value: self.parse(value).precision for value in values.dropna().unique()
+        }
+
+        return values.map(precisions).astype(object).where(values.notnull(), None)
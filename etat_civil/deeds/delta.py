@@ -0,0 +1,205 @@
+import hashlib
+from collections import Counter
+
+import pandas as pd
+from django.db import transaction
+
+from etat_civil.deeds.bulk import BulkLoader, chunks
+from etat_civil.deeds.models import (
+    DATA_SHEETS,
+    Deed,
+    Origin,
+    Party,
+    Person,
+    RowFingerprint,
+)
+from etat_civil.deeds.normalize import get_location_names
+
+IDENTITY_COLUMNS = [
+    "classmark",
+    "classmark_microfilm",
+    "deed_location",
+    "deed_number",
+    "deed_date",
+]
+
+
+def to_text(value):
+    """Returns the text of a cell, the same whatever the type pandas infers for the
+    column of the chunk the cell is read in: an integer is the same text as the
+    float of the same value."""
+    if pd.isnull(value):
+        return ""
+
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+
+    return str(value)
+
+
+def get_hash(values):
+    text = "\x1f".join(to_text(value) for value in values)
+
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def fingerprint_rows(df):
+    """Yields `(index, identity, content_hash)` for the rows of a data frame read
+    from a data sheet. The identity is a hash of the cells that identify the deed
+    of the row, and the content hash a hash of all the cells of the row."""
+    identity_columns = [c for c in IDENTITY_COLUMNS if c in df.columns]
+    identities = df[identity_columns].itertuples(index=False, name=None)
+    contents = df.itertuples(index=False, name=None)
+
+    for index, identity, content in zip(df.index, identities, contents):
+        yield index, get_hash(identity), get_hash(content)
+
+
+def get_origin_keys(parties):
+    """Returns the keys, person, date and order, of the origins loaded for the
+    persons of the `parties` from their deeds, see `Origin.load_record`."""
+    keys = set()
+
+    for party in parties:
+        deed, person = party.deed, party.person
+        birth_date = Person.get_birth_date(deed.date, person.age)
+
+        keys.update(
+            [
+                (person.pk, birth_date, 1),
+                (person.pk, birth_date + (deed.date - birth_date) / 2, 3),
+                (person.pk, deed.date, 5),
+                (person.pk, deed.date, 8),
+            ]
+        )
+
+    return keys
+
+
+class DeltaImport:
+    """Imports only the rows of a data workbook that changed since it was last
+    imported. The rows are compared with the `RowFingerprint`s of the `Data`: the
+    deeds of the changed and vanished rows are removed, and the new and changed
+    rows are loaded with the `BulkLoader`, the unchanged rows are skipped."""
+
+    def __init__(self, data, batch_size=None):
+        self.data = data
+        self.batch_size = batch_size
+        self.report = Counter()
+        self.to_remove = []
+
+    def load(self, reader):
+        with self.data.stage("parse"):
+            changes = list(self.compare(reader))
+
+        # only the location names of the rows to load are resolved
+        names = set()
+        for _, df in changes:
+            names.update(get_location_names(df))
+
+        with self.data.stage("places"):
+            self.data.place_ids = None
+            self.data.resolved_places = None
+            self.data.places_report = self.data.resolve_names(names)
+
+        with self.data.stage("write"):
+            self.remove(self.to_remove)
+
+            loader = BulkLoader(self.data, batch_size=self.batch_size)
+            for sheet_name, df in changes:
+                fingerprints = list(fingerprint_rows(df))
+                df = self.data.convert_date_columns(df)
+                getattr(loader, f"load_{sheet_name}")(df)
+                self.data.save_fingerprints(sheet_name, fingerprints, loader.row_deeds)
+
+        return self.report
+
+    def compare(self, reader, chunksize=None):
+        """Reads the sheets once, compares the rows with the fingerprints and yields
+        `(sheet_name, df)` with the new and changed rows of each chunk of the
+        sheets. The fingerprints of the changed rows, and of the rows that are no
+        longer in the workbook, are kept in `to_remove`, see `remove`. When more
+        than one row has the same identity only the first one is compared, the
+        other rows are rejected."""
+        for sheet_name in DATA_SHEETS:
+            stored = {
+                fp.identity: fp
+                for fp in self.data.fingerprints.filter(sheet=sheet_name)
+            }
+            seen = set()
+
+            for df in reader.iter_chunks(sheet_name, chunksize=chunksize):
+                self.data.count_rows(read=len(df.index))
+
+                rows = []
+                for index, identity, content_hash in fingerprint_rows(df):
+                    if identity in seen:
+                        self.data.reject_row(
+                            sheet_name,
+                            index,
+                            "Another row of the sheet has the same deed identity",
+                        )
+                        continue
+
+                    seen.add(identity)
+                    fp = stored.get(identity)
+
+                    if fp is None:
+                        self.report["inserted"] += 1
+                    elif fp.content_hash != content_hash:
+                        self.report["updated"] += 1
+                        self.to_remove.append(fp)
+                    else:
+                        self.report["unchanged"] += 1
+                        continue
+
+                    rows.append(index)
+
+                if rows:
+                    yield sheet_name, df.loc[rows]
+
+            for identity in stored.keys() - seen:
+                self.report["deleted"] += 1
+                self.to_remove.append(stored[identity])
+
+    def remove(self, fingerprints):
+        """Removes the deeds of the `fingerprints`, with the origins their persons
+        got from them, and the persons that are no longer party to any deed, and
+        deletes the `fingerprints`, so that the rows that are loaded again are
+        fingerprinted when they are loaded, see `Data.save_fingerprints`."""
+        deed_ids = [fp.deed_id for fp in fingerprints if fp.deed_id]
+
+        with transaction.atomic():
+            for ids in chunks(deed_ids, 500):
+                parties = Party.objects.filter(deed_id__in=ids).select_related(
+                    "deed", "person"
+                )
+                person_ids = [party.person_id for party in parties]
+
+                self.remove_origins(parties, person_ids, ids)
+                Deed.objects.filter(pk__in=ids).delete()
+                Person.objects.filter(pk__in=person_ids, party_to__isnull=True).delete()
+
+            for pks in chunks([fp.pk for fp in fingerprints], 500):
+                RowFingerprint.objects.filter(pk__in=pks).delete()
+
+            self.data.sources.filter(deed__isnull=True).delete()
+
+    def remove_origins(self, parties, person_ids, deed_ids):
+        """Deletes the origins that the persons of the `parties` got from their
+        deeds, unless they also got them from a deed that is kept."""
+        keys = get_origin_keys(parties) - get_origin_keys(
+            Party.objects.filter(person_id__in=person_ids)
+            .exclude(deed_id__in=deed_ids)
+            .select_related("deed", "person")
+        )
+
+        origin_ids = [
+            pk
+            for pk, person_id, date, order in Origin.objects.filter(
+                person_id__in=person_ids
+            ).values_list("pk", "person_id", "date", "order")
+            if (person_id, date, order) in keys
+        ]
+        for pks in chunks(origin_ids, 500):
+            Origin.objects.filter(pk__in=pks).delete()
@@ -0,0 +1,186 @@
+"""Exports the origins of the persons as a GeoJSON FeatureCollection, one
+LineString feature per person. The features are built from one query over the
+origins, joined to their persons, places and origin types, and ordered by person,
+instead of querying the origins of each person. The origins are fetched in chunks,
+through a server-side cursor on PostgreSQL, and the FeatureCollection can be
+written one feature at a time."""
+import json
+from datetime import datetime
+from itertools import groupby
+from operator import itemgetter
+
+from django.conf import settings
+
+from etat_civil.deeds.models import Origin, Person
+
+ORIGIN_FIELDS = [
+    "id",
+    "person_id",
+    "person__name",
+    "person__surname",
+    "person__unknown",
+    "person__age",
+    "person__gender__title",
+    "origin_type__title",
+    "place_id",
+    "place__address",
+    "place__class_description__title",
+    "place__country__name",
+    "place__country__code",
+    "place__lat",
+    "place__lon",
+    "date",
+    "is_date_computed",
+]
+
+
+def get_origin_rows(origins=None):
+    """Returns the values of the `origins`, all the origins by default, with the
+    fields of their person, place and origin type, in the order of the persons
+    and, for each person, in the order of the origins."""
+    if origins is None:
+        origins = Origin.objects.all()
+
+    person_ordering = [f"person__{name}" for name in Person._meta.ordering]
+
+    return origins.values(*ORIGIN_FIELDS).order_by(
+        *person_ordering, "person_id", "order", "date", "id"
+    )
+
+
+def get_fullname(row):
+    fullname = ""
+
+    for n in [row["person__name"], row["person__surname"]]:
+        if n:
+            fullname = f"{fullname} {n}"
+
+    return fullname.strip()
+
+
+def get_place_name(row):
+    """Returns the place of the origin `row` as `str(place)`."""
+    country = None
+    if row["place__country__name"] is not None:
+        country = "{} ({})".format(
+            row["place__country__name"], row["place__country__code"]
+        )
+
+    return "{}, {} in {}".format(
+        row["place__address"], row["place__class_description__title"], country
+    )
+
+
+def get_origin_names(rows):
+    origins = ""
+
+    place_id = None
+    for row in rows:
+        if row["place_id"] != place_id:
+            place_id = row["place_id"]
+            origins = "{} -> {}: {}".format(
+                origins, row["origin_type__title"], get_place_name(row)
+            )
+
+    return origins.strip()
+
+
+def origin_to_geojson(row, label="origin"):
+    """Returns the properties of the origin `row`, as `Origin.to_geojson`."""
+    geojson = {}
+
+    geojson[f"{label}_type"] = row["origin_type__title"]
+    geojson[f"{label}_place"] = row["place__address"]
+    geojson[f"{label}_lat"] = float(row["place__lat"])
+    geojson[f"{label}_lon"] = float(row["place__lon"])
+    geojson[f"{label}_date"] = f"{row['date']} 00:00"
+    geojson[f"{label}_is_date_computed"] = row["is_date_computed"]
+
+    return geojson
+
+
+def to_feature(rows):
+    """Returns the feature of the person of the origin `rows`, as
+    `Person.to_geojson`."""
+    person = rows[0]
+
+    properties = {}
+    properties["id"] = person["person_id"]
+    properties["name"] = get_fullname(person)
+    properties["unknown"] = person["person__unknown"]
+    properties["origins"] = get_origin_names(rows)
+
+    if person["person__age"]:
+        properties["age"] = person["person__age"]
+
+    if person["person__gender__title"] is not None:
+        properties["gender"] = person["person__gender__title"]
+
+    located = [
+        row
+        for row in rows
+        if row["place__lat"] is not None and row["place__lon"] is not None
+    ]
+
+    coords = []
+    prev_place_id = None
+    for idx, row in enumerate(located):
+        if idx == 0 or idx == len(located) - 1:
+            pos = "first" if idx == 0 else "last"
+            properties.update(origin_to_geojson(row, label=f"origin_{pos}"))
+
+        if row["place_id"] != prev_place_id:
+            ts = datetime.fromordinal(row["date"].toordinal()).timestamp()
+            coords.append(
+                [float(row["place__lon"]), float(row["place__lat"]), 0, int(ts)]
+            )
+
+        prev_place_id = row["place_id"]
+
+    return {
+        "type": "Feature",
+        "properties": properties,
+        "geometry": {"type": "LineString", "coordinates": coords},
+    }
+
+
+def get_features(origins=None):
+    """Yields the feature of each person of the `origins`, all the origins by
+    default."""
+    rows = get_origin_rows(origins).iterator(
+        chunk_size=settings.DEEDS_EXPORT_CHUNK_SIZE
+    )
+
+    for _, person_rows in groupby(rows, key=itemgetter("person_id")):
+        yield to_feature(list(person_rows))
+
+
+def to_feature_collection(origins=None):
+    return {"type": "FeatureCollection", "features": list(get_features(origins))}
+
+
+def iter_feature_collection(origins=None, indent=None):
+    """Yields the FeatureCollection of the `origins`, all the origins by default,
+    as JSON text, one feature at a time. The text is the same as
+    `json.dumps(to_feature_collection(), indent=indent, sort_keys=True)`, without
+    any whitespace when `indent` is not set."""
+    if indent is None:
+        newline, pad, key_separator = "", "", ":"
+    else:
+        newline, pad, key_separator = "\n", " " * indent, ": "
+
+    yield f'{{{newline}{pad}"features"{key_separator}['
+
+    features = 0
+    for feature in get_features(origins):
+        text = json.dumps(
+            feature, indent=indent, separators=(",", key_separator), sort_keys=True
+        ).replace("\n", "\n" + pad * 2)
+
+        yield ("," if features else "") + newline + pad * 2 + text
+        features += 1
+
+    if features:
+        yield newline + pad
+
+    yield f'],{newline}{pad}"type"{key_separator}"FeatureCollection"{newline}}}'
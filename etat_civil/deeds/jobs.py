@@ -1,6 +1,58 @@
+import logging
+
 from django_rq import job
+from etat_civil.deeds.models import DATA_SHEETS
+
+logger = logging.getLogger(__name__)
+
+
+@job
+def import_data_async(data, delta=False, resume=False):
+    """Imports the data: the places are resolved by a chain of
+    `resolve_places_async` jobs, then the rows of each sheet by a chain of
+    `import_chunk_async` jobs. Each job queues the next one, the chains of the
+    sheets run concurrently. Incremental imports, `delta`, only resolve and load
+    the rows that changed."""
+    if not data.start_import(resume=resume, delta=delta):
+        return
+
+    if data.delta_report is not None:
+        logger.info(
+            "%s: %s",
+            data,
+            ", ".join(f"{count} {rows}" for rows, count in data.delta_report.items()),
+        )
+
+    resolve_places_async.delay(data)
 
 
 @job
-def import_data_async(data):
-    data.load_data()
+def resolve_places_async(data):
+    """Resolves the next chunk of location names, and queues the job for the chunk
+    after it, or the first job of the rows of each sheet when all the names are
+    resolved."""
+    if data.resolve_places_chunk():
+        for sheet_name in DATA_SHEETS:
+            import_chunk_async.delay(data, sheet_name)
+    else:
+        resolve_places_async.delay(data)
+
+
+@job
+def import_chunk_async(data, sheet_name=None):
+    """Loads the next chunk of rows of the sheet, and queues the job for the chunk
+    after it."""
+    if not data.load_chunk(sheet_name):
+        import_chunk_async.delay(data, sheet_name)
+
+
+@job
+def purge_data_async(data):
+    """Deletes the deeds imported from the data, see `Data.purge`."""
+    counts = data.purge()
+
+    logger.info(
+        "%s: deleted %s",
+        data,
+        ", ".join(f"{count} {table}" for table, count in counts.items()),
+    )
@@ -0,0 +1,124 @@
+"""Registry of the locations sheet of a data file, the place names used in the deed
+sheets, by display name, with the name to search in geonames and the geonames id
+or coordinates of the place, when they are known."""
+import pandas as pd
+
+LOCATION_COLUMNS = ["location", "geonames_id", "lat", "lon", "display_name"]
+
+
+class Location:
+    __slots__ = ["display_name", "location", "geonames_id", "lat", "lon"]
+
+    def __init__(
+        self, display_name, location=None, geonames_id=None, lat=None, lon=None
+    ):
+        self.display_name = display_name
+        self.location = location
+        self.geonames_id = geonames_id
+        self.lat = lat
+        self.lon = lon
+
+    def __repr__(self):
+        return "Location({!r}, {!r}, {!r})".format(
+            self.display_name, self.location, self.geonames_id
+        )
+
+    @property
+    def address(self):
+        """The name to search in geonames."""
+        return (self.location or self.display_name).strip()
+
+    @property
+    def has_coordinates(self):
+        return self.lat is not None and self.lon is not None
+
+
+def to_value(value, convert):
+    if pd.isnull(value):
+        return None
+
+    return convert(value)
+
+
+class LocationRegistry:
+    """Locations by display name. The lookups and updates do not copy the
+    registry, the names that are added, and the geonames ids learned while
+    resolving the places, are written back with `to_dataframe` or `to_csv`."""
+
+    def __init__(self, locations=None):
+        self.locations = {}
+        self.changed = set()
+
+        for location in locations or []:
+            self.locations.setdefault(location.display_name, location)
+
+    def __len__(self):
+        return len(self.locations)
+
+    def __iter__(self):
+        return iter(self.locations.values())
+
+    def __contains__(self, name):
+        return name in self.locations
+
+    @staticmethod
+    def from_dataframe(df):
+        """Returns the registry of a locations sheet, indexed or not by display
+        name, only the first location with a display name is kept."""
+        if df.index.name == "display_name":
+            df = df.reset_index()
+
+        columns = [df.get(column) for column in LOCATION_COLUMNS]
+        columns = [
+            column if column is not None else pd.Series(None, index=df.index)
+            for column in columns
+        ]
+
+        return LocationRegistry(
+            Location(
+                str(display_name).strip(),
+                location=to_value(location, str),
+                geonames_id=to_value(geonames_id, int),
+                lat=to_value(lat, float),
+                lon=to_value(lon, float),
+            )
+            for location, geonames_id, lat, lon, display_name in zip(*columns)
+            if pd.notnull(display_name)
+        )
+
+    def get(self, name):
+        return self.locations.get(name)
+
+    def add(self, name, location=None):
+        """Adds a location for the name, if the registry does not have one, and
+        returns the location for the name."""
+        if name not in self.locations:
+            self.locations[name] = Location(name, location=location or name)
+            self.changed.add(name)
+
+        return self.locations[name]
+
+    def set_geonames_id(self, name, geonames_id):
+        location = self.add(name)
+
+        if location.geonames_id != geonames_id:
+            location.geonames_id = geonames_id
+            self.changed.add(name)
+
+    def to_dataframe(self):
+        return pd.DataFrame(
+            [
+                [
+                    location.location,
+                    location.geonames_id,
+                    location.lat,
+                    location.lon,
+                    location.display_name,
+                ]
+                for location in self
+            ],
+            columns=LOCATION_COLUMNS,
+        ).astype({"geonames_id": "Int64"})
+
+    def to_csv(self, path, sep=","):
+        self.to_dataframe().to_csv(path, sep=sep, index=False)
@@ -0,0 +1,86 @@
+from pathlib import Path
+
+from django.core.files import File
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from etat_civil.deeds.models import Data, ImportRun
+
+MODES = [ImportRun.MODE_ROWS, ImportRun.MODE_BULK, ImportRun.MODE_COPY]
+
+
+class Command(BaseCommand):
+    help = (
+        "Imports a data file with each import mode, and reports the rows per "
+        "second of each mode on the current database backend"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "data_file",
+            nargs=1,
+            type=Path,
+            help="The data file to import, a workbook or a zip archive of tables",
+        )
+        parser.add_argument(
+            "--title",
+            default="Benchmark",
+            help="The title of the data the file is imported to, the data is "
+            "created for the benchmark and deleted after it",
+        )
+        parser.add_argument(
+            "--modes",
+            nargs="+",
+            choices=MODES,
+            default=MODES,
+            help="The import modes to benchmark",
+        )
+        parser.add_argument(
+            "--batch-size", type=int, help="Number of rows per batch",
+        )
+
+    def handle(self, *args, **options):
+        data_file = options["data_file"][0]
+
+        # the data is purged before each import, an existing data is never used
+        if Data.objects.filter(title=options["title"]).exists():
+            raise CommandError(
+                "A data titled {} already exists, use another --title".format(
+                    options["title"]
+                )
+            )
+
+        data = Data(title=options["title"])
+        data.data.save(data_file.name, File(open(data_file, "rb")))
+
+        try:
+            self.benchmark(data, options)
+        finally:
+            data.purge()
+            data.data.delete(save=False)
+            data.delete()
+
+    def benchmark(self, data, options):
+        self.stdout.write(f"Backend: {connection.vendor}")
+
+        for mode in options["modes"]:
+            # the places are resolved by the first import, and shared through the
+            # place aliases by the following ones
+            data.purge()
+            data.load_data(
+                bulk=mode == ImportRun.MODE_BULK,
+                copy=mode == ImportRun.MODE_COPY,
+                batch_size=options["batch_size"],
+            )
+
+            run = data.import_run
+            self.stdout.write(
+                "{}: {} rows in {:.1f} seconds, {:.1f} rows per second, "
+                "{:.1f} rows per second written, {} queries".format(
+                    mode,
+                    run.rows_read,
+                    run.duration,
+                    run.rows_per_second or 0,
+                    run.rows_read / run.write_time if run.write_time else 0,
+                    run.write_queries,
+                )
+            )
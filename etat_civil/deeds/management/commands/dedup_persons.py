@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand
+from etat_civil.deeds.models import Person
+
+
+class Command(BaseCommand):
+    help = (
+        "Finds the persons that are likely the same individual, with a surname "
+        "that sounds the same and a close birth year"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--window",
+            type=int,
+            help="Number of years the birth years of matching persons can differ by",
+        )
+        parser.add_argument(
+            "--merge",
+            action="store_true",
+            help="Merge each group of matching persons into the oldest person",
+        )
+
+    def handle(self, *args, **options):
+        groups = Person.find_duplicates(window=options["window"])
+
+        merged = 0
+        for group in groups:
+            self.stdout.write(
+                " | ".join(
+                    "{} ({}, {})".format(person, person.birth_year, person.pk)
+                    for person in group
+                )
+            )
+
+            if options["merge"]:
+                merged += Person.merge(group[0], group[1:])
+
+        self.stdout.write(
+            "{} groups of matching persons, {} persons merged".format(
+                len(groups), merged
+            )
+        )
@@ -1,7 +1,5 @@
-import json
-
 from django.core.management.base import BaseCommand
-from etat_civil.deeds.models import Person
+from etat_civil.deeds.geojson import iter_feature_collection
 
 
 class Command(BaseCommand):
@@ -15,9 +13,23 @@ class Command(BaseCommand):
             "--output",
             help="Specifies file to which the GeoJSON output is written.",
         )
+        parser.add_argument(
+            "--compact",
+            action="store_true",
+            help="Writes the GeoJSON without indentation or whitespace.",
+        )
 
     def handle(self, *args, **options):
         output = options["output"]
-        stream = open(output, "w") if output else self.stdout
+        indent = None if options["compact"] else 2
+
+        # the features are written as they are exported
+        chunks = iter_feature_collection(indent=indent)
 
-        json.dump(Person.persons_to_geojson(), stream, indent=2, sort_keys=True)
+        if output:
+            with open(output, "w") as f:
+                f.writelines(chunks)
+        else:
+            for chunk in chunks:
+                self.stdout.write(chunk, ending="")
+            self.stdout.write("")
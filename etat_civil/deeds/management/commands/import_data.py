@@ -1,8 +1,16 @@
+import csv
+import io
+import zipfile
+from collections import Counter
 from pathlib import Path
+from time import perf_counter
 
-from etat_civil.deeds.models import Data
+from etat_civil.deeds.models import Data, ImportReject
+from etat_civil.deeds.parallel import import_parallel
+from etat_civil.deeds.readers import TABLE_EXTENSIONS, open_reader
+from etat_civil.deeds.validation import validate_workbook
 from django.core.files import File
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
 
 
 class Command(BaseCommand):
@@ -11,21 +19,246 @@ class Command(BaseCommand):
     def add_arguments(self, parser):
         parser.add_argument("title", nargs=1, type=str, help="The title of the data")
         parser.add_argument(
-            "data_file", nargs=1, type=Path, help="The data file to import"
+            "data_file",
+            nargs="+",
+            type=Path,
+            help=(
+                "The data files to import, workbooks or directories of workbooks, "
+                "or directories or zip archives of TSV, CSV or Parquet files named "
+                "after the sheets. When there are several data files, each is "
+                "imported to the data titled with the title and the file name"
+            ),
         )
         parser.add_argument(
             "--delete",
             action="store_true",
             help="Delete existing data before importing",
         )
+        parser.add_argument(
+            "--delta",
+            action="store_true",
+            help="Only import the rows that changed since the last import",
+        )
+        parser.add_argument(
+            "--bulk",
+            action="store_true",
+            help="Write the rows in batches with bulk inserts",
+        )
+        parser.add_argument(
+            "--copy",
+            action="store_true",
+            help=(
+                "Write the rows in batches with COPY on PostgreSQL, and with bulk "
+                "inserts on the other databases"
+            ),
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            help="Number of rows per batch when importing with --bulk or --copy",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only validate the data file, without importing it",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=1,
+            help="Number of processes importing several data files concurrently",
+        )
+        parser.add_argument(
+            "--rejects",
+            type=Path,
+            help="Write the rows that failed to load to this CSV file",
+        )
+        parser.add_argument(
+            "--locations-out",
+            type=Path,
+            help=(
+                "Write the locations, with the geonames ids found during the import, "
+                "to this workbook, TSV or CSV file"
+            ),
+        )
 
     def handle(self, *args, **options):
         title = options["title"][0]
-        data_file = options["data_file"][0]
+        data_files = self.get_data_files(options["data_file"])
+
+        if options["dry_run"]:
+            for data_file in data_files:
+                self.validate(data_file)
+            return
 
-        data, _ = Data.objects.get_or_create(title=title)
-        data.data.save(data_file.name, File(open(data_file, "rb")))
-        data.save()
+        if len(data_files) > 1:
+            self.import_many(title, data_files, options)
+            return
+
+        data = self.get_data(title, data_files[0])
 
         self.stdout.write("Importing data...")
-        data.load_data(delete=options["delete"])
+        data.load_data(
+            delete=options["delete"],
+            bulk=options["bulk"],
+            batch_size=options["batch_size"],
+            delta=options["delta"],
+            copy=options["copy"],
+        )
+
+        if options["delete"]:
+            self.stdout.write(
+                "Deleted: "
+                + ", ".join(
+                    f"{count} {table}" for table, count in data.purge_report.items()
+                )
+            )
+
+        report = data.places_report or {}
+        self.stdout.write(
+            "Places: {} from the cache, {} by geonames id, {} by lat, lon, "
+            "{} by name, {} unresolved".format(
+                *[report.get(code, 0) for code in [0, 1, 3, 2, -1]]
+            )
+        )
+
+        if options["delta"]:
+            report = data.delta_report
+            self.stdout.write(
+                "Rows: {} inserted, {} updated, {} deleted, {} unchanged".format(
+                    *[
+                        report[key]
+                        for key in ["inserted", "updated", "deleted", "unchanged"]
+                    ]
+                )
+            )
+
+        rejects = data.rejects or []
+        self.stdout.write("Rejected rows: {}".format(len(rejects)))
+
+        if options["rejects"]:
+            with open(options["rejects"], "w", newline="") as f:
+                writer = csv.writer(f)
+                writer.writerow(["sheet", "row", "error"])
+                for reject in rejects:
+                    writer.writerow([reject.sheet, reject.row, reject.error])
+
+        if options["locations_out"]:
+            self.write_locations(data.locations, options["locations_out"])
+
+    def import_many(self, title, data_files, options):
+        if options["locations_out"]:
+            raise CommandError("--locations-out needs a single data file")
+
+        datas = [
+            self.get_data(f"{title}: {data_file.stem}", data_file)
+            for data_file in data_files
+        ]
+
+        self.stdout.write(f"Importing {len(datas)} data files...")
+        runs = import_parallel(
+            datas,
+            workers=options["workers"],
+            delete=options["delete"],
+            bulk=options["bulk"],
+            batch_size=options["batch_size"],
+            delta=options["delta"],
+            copy=options["copy"],
+        )
+
+        for run in runs:
+            self.stdout.write(
+                "{}: {}, {} rows read, {} rejected in {:.1f} seconds".format(
+                    run.data, run.status, run.rows_read, run.rows_failed, run.duration
+                )
+            )
+
+        if options["rejects"]:
+            rejects = ImportReject.objects.filter(import_run__in=runs).select_related(
+                "import_run__data"
+            )
+            with open(options["rejects"], "w", newline="") as f:
+                writer = csv.writer(f)
+                writer.writerow(["data", "sheet", "row", "error"])
+                for reject in rejects:
+                    writer.writerow(
+                        [reject.import_run.data, reject.sheet, reject.row, reject.error]
+                    )
+
+    def get_data_files(self, paths):
+        """Returns the data files to import, the workbooks of the directories of
+        workbooks, and the other paths."""
+        data_files = []
+
+        for path in paths:
+            workbooks = sorted(path.glob("*.xlsx")) if path.is_dir() else []
+            data_files.extend(workbooks or [path])
+
+        return data_files
+
+    def get_data(self, title, data_file):
+        """Returns the data with the title, saved with the data file."""
+        data = Data.objects.filter(title=title).first()
+        if data is None:
+            data = Data(title=title)
+
+        # saves the data with the file
+        data.data.save(*self.get_file(data_file))
+
+        return data
+
+    def get_file(self, data_file):
+        """Returns the name and file to save as the data file, the tables of a
+        directory are saved in a zip archive."""
+        if not data_file.is_dir():
+            return data_file.name, File(open(data_file, "rb"))
+
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+            for path in sorted(data_file.iterdir()):
+                if path.suffix.lower() in TABLE_EXTENSIONS:
+                    archive.write(path, path.name)
+
+        return f"{data_file.name}.zip", File(buffer)
+
+    def write_locations(self, locations, path):
+        """Writes the locations as a new locations sheet, or table."""
+        suffix = path.suffix.lower()
+
+        if suffix == ".xlsx":
+            locations.to_dataframe().to_excel(path, sheet_name="locations", index=False)
+        else:
+            locations.to_csv(path, sep="\t" if suffix == ".tsv" else ",")
+
+        self.stdout.write(
+            "Locations: {} written to {}, {} changed".format(
+                len(locations), path, len(locations.changed)
+            )
+        )
+
+    def validate(self, data_file):
+        started = perf_counter()
+        with open_reader(str(data_file)) as reader:
+            issues = validate_workbook(reader)
+
+        for issue in issues:
+            self.stdout.write(
+                "{}, row {}, {}: {} {}".format(
+                    issue.sheet,
+                    issue.row,
+                    issue.column,
+                    issue.message,
+                    "" if issue.value is None else repr(issue.value),
+                ).strip()
+            )
+
+        counts = Counter(issue.message for issue in issues)
+        self.stdout.write(
+            "{} issues found in {:.1f} seconds{}".format(
+                len(issues),
+                perf_counter() - started,
+                "".join(
+                    f", {count} {message.lower()}" for message, count in counts.items()
+                ),
+            )
+        )
@@ -0,0 +1,164 @@
+"""Matches the persons of the deeds that are likely the same individual, recorded
+with spelling variants of the surname or a drift of the birth year. The persons
+are grouped in blocks by the phonetic key of the surname and the gender, and are
+only compared with the persons of the same block born in a window of years."""
+import re
+from collections import defaultdict
+
+from unidecode import unidecode
+
+SOUNDEX_CODES = {
+    **dict.fromkeys("bfpv", "1"),
+    **dict.fromkeys("cgjkqsxz", "2"),
+    **dict.fromkeys("dt", "3"),
+    "l": "4",
+    **dict.fromkeys("mn", "5"),
+    "r": "6",
+}
+
+
+def normalize_name(name):
+    """Returns the name in lower case ASCII letters, with the words separated by
+    a single space."""
+    if not name:
+        return None
+
+    name = unidecode(name).lower()
+    name = re.sub(r"[^a-z]+", " ", name).strip()
+
+    return name or None
+
+
+def phonetic_key(name):
+    """Returns the Soundex code of the name, ignoring the spaces, so that
+    `Dupont`, `Du Pont` and `Dupond` have the same key."""
+    name = normalize_name(name)
+    if not name:
+        return None
+
+    letters = name.replace(" ", "")
+
+    key = letters[0].upper()
+    last = SOUNDEX_CODES.get(letters[0], "")
+    for letter in letters[1:]:
+        code = SOUNDEX_CODES.get(letter, "")
+        if code and code != last:
+            key += code
+        if letter not in "hw":
+            last = code
+
+    return (key + "000")[:4]
+
+
+def get_match_key(surname):
+    return phonetic_key(surname)
+
+
+class BlockingIndex:
+    """Index of persons by blocking key, the phonetic key of the surname and the
+    gender, and birth year. The persons without a surname, a name or that are
+    unknown are not indexed."""
+
+    def __init__(self, window=1):
+        self.window = window
+        self.blocks = defaultdict(lambda: defaultdict(list))
+
+    def __len__(self):
+        return sum(
+            len(persons) for block in self.blocks.values() for persons in block.values()
+        )
+
+    @staticmethod
+    def get_block_key(surname, gender_id):
+        key = get_match_key(surname)
+        if key is None:
+            return None
+
+        return (key, gender_id)
+
+    def add(self, person):
+        if person.unknown or not normalize_name(person.name):
+            return
+
+        block_key = self.get_block_key(person.surname, person.gender_id)
+        if block_key is not None:
+            self.blocks[block_key][person.birth_year].append(person)
+
+    def remove(self, person):
+        block_key = self.get_block_key(person.surname, person.gender_id)
+        persons = self.blocks.get(block_key, {}).get(person.birth_year, [])
+
+        if person in persons:
+            persons.remove(person)
+
+    def get_years(self, birth_year):
+        if birth_year is None:
+            return [None]
+
+        return range(birth_year - self.window, birth_year + self.window + 1)
+
+    def candidates(self, name, surname, gender_id, birth_year):
+        """Yields the indexed persons with the same name, the same surname key and
+        gender, and a birth year in the window around `birth_year`."""
+        block_key = self.get_block_key(surname, gender_id)
+        name = normalize_name(name)
+
+        if block_key is None or name is None or block_key not in self.blocks:
+            return
+
+        block = self.blocks[block_key]
+        for year in self.get_years(birth_year):
+            for person in block.get(year, []):
+                if normalize_name(person.name) == name:
+                    yield person
+
+    def match(self, name, surname, gender_id, birth_year):
+        """Returns the best candidate for the person, preferring the candidates
+        with the same surname, then the closest birth year, or None."""
+        surname = normalize_name(surname)
+
+        def rank(person):
+            return (
+                normalize_name(person.surname) != surname,
+                abs((person.birth_year or 0) - (birth_year or 0)),
+                person.pk or 0,
+            )
+
+        candidates = list(self.candidates(name, surname, gender_id, birth_year))
+        if not candidates:
+            return None
+
+        return min(candidates, key=rank)
+
+    def find_duplicates(self):
+        """Returns the groups of indexed persons that match each other, each group
+        ordered by primary key. Only the persons in the same block are compared.
+        Each group is centred on its first person by primary key, with the persons
+        that match that person and are not in another group, so that the matches
+        are not chained across the window from one person to the next."""
+        groups = []
+
+        for block in self.blocks.values():
+            persons = sorted(
+                (person for year in block for person in block[year]),
+                key=lambda p: p.pk or 0,
+            )
+            grouped = set()
+
+            for person in persons:
+                if id(person) in grouped:
+                    continue
+
+                group = [person] + [
+                    candidate
+                    for candidate in self.candidates(
+                        person.name, person.surname, person.gender_id, person.birth_year
+                    )
+                    if candidate is not person and id(candidate) not in grouped
+                ]
+                grouped.update(id(member) for member in group)
+
+                if len(group) > 1:
+                    groups.append(sorted(group, key=lambda p: p.pk or 0))
+
+        return sorted(groups, key=lambda group: group[0].pk or 0)
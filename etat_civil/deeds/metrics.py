@@ -0,0 +1,51 @@
+from collections import Counter
+from contextlib import contextmanager
+from time import perf_counter
+
+from django.db import connection
+
+STAGES = ["parse", "places", "geocoding", "write"]
+
+
+class ImportMetrics:
+    """Collects the time spent, and the number of SQL queries run, in each stage of
+    an import. Stages can be nested, the time and queries of a nested stage are
+    only counted for the nested stage. The queries are only counted inside
+    `record`."""
+
+    def __init__(self):
+        self.times = Counter()
+        self.queries = Counter()
+        self.rows_read = 0
+        self.rows_failed = 0
+        self.stack = []
+
+    @contextmanager
+    def stage(self, name):
+        now = perf_counter()
+        if self.stack:
+            parent, since = self.stack[-1]
+            self.times[parent] += now - since
+
+        self.stack.append([name, now])
+
+        try:
+            yield
+        finally:
+            now = perf_counter()
+            name, since = self.stack.pop()
+            self.times[name] += now - since
+
+            if self.stack:
+                self.stack[-1][1] = now
+
+    @contextmanager
+    def record(self):
+        with connection.execute_wrapper(self.count_query):
+            yield
+
+    def count_query(self, execute, sql, params, many, context):
+        stage = self.stack[-1][0] if self.stack else None
+        self.queries[stage] += 1
+
+        return execute(sql, params, many, context)
@@ -0,0 +1,32 @@
+# Generated by Django 2.2.28 on 2026-10-16 23:30
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+import model_utils.fields
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('deeds', '0004_person_unknown'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RowFingerprint',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', model_utils.fields.AutoCreatedField(default=django.utils.timezone.now, editable=False, verbose_name='created')),
+                ('modified', model_utils.fields.AutoLastModifiedField(default=django.utils.timezone.now, editable=False, verbose_name='modified')),
+                ('sheet', models.CharField(max_length=16)),
+                ('identity', models.CharField(max_length=40)),
+                ('content_hash', models.CharField(max_length=40)),
+                ('data', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='fingerprints', to='deeds.Data')),
+                ('deed', models.ForeignKey(blank=True, help_text='Deed loaded from the row', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='fingerprints', to='deeds.Deed')),
+            ],
+            options={
+                'unique_together': {('data', 'sheet', 'identity')},
+            },
+        ),
+    ]
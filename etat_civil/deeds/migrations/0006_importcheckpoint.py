@@ -0,0 +1,33 @@
+# Generated by Django 2.2.28 on 2026-10-16 23:37
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+import model_utils.fields
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('deeds', '0005_rowfingerprint'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportCheckpoint',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', model_utils.fields.AutoCreatedField(default=django.utils.timezone.now, editable=False, verbose_name='created')),
+                ('modified', model_utils.fields.AutoLastModifiedField(default=django.utils.timezone.now, editable=False, verbose_name='modified')),
+                ('sheet', models.CharField(max_length=16)),
+                ('row', models.PositiveIntegerField(default=0)),
+                ('loaded', models.PositiveIntegerField(default=0)),
+                ('completed', models.BooleanField(default=False)),
+                ('data', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='checkpoints', to='deeds.Data')),
+            ],
+            options={
+                'ordering': ['data', 'sheet'],
+                'unique_together': {('data', 'sheet')},
+            },
+        ),
+    ]
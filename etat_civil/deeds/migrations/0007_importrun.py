@@ -0,0 +1,48 @@
+# Generated by Django 2.2.28 on 2026-10-16 23:43
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+import model_utils.fields
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('deeds', '0006_importcheckpoint'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportRun',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', model_utils.fields.AutoCreatedField(default=django.utils.timezone.now, editable=False, verbose_name='created')),
+                ('modified', model_utils.fields.AutoLastModifiedField(default=django.utils.timezone.now, editable=False, verbose_name='modified')),
+                ('mode', models.CharField(choices=[('rows', 'Rows'), ('bulk', 'Bulk'), ('delta', 'Delta')], max_length=16)),
+                ('status', models.CharField(choices=[('running', 'Running'), ('completed', 'Completed'), ('failed', 'Failed')], default='running', max_length=16)),
+                ('finished', models.DateTimeField(blank=True, null=True)),
+                ('duration', models.FloatField(default=0, help_text='Duration in seconds')),
+                ('rows_read', models.PositiveIntegerField(default=0)),
+                ('rows_failed', models.PositiveIntegerField(default=0)),
+                ('parse_time', models.FloatField(default=0)),
+                ('places_time', models.FloatField(default=0)),
+                ('geocoding_time', models.FloatField(default=0)),
+                ('write_time', models.FloatField(default=0)),
+                ('parse_queries', models.PositiveIntegerField(default=0)),
+                ('places_queries', models.PositiveIntegerField(default=0)),
+                ('geocoding_queries', models.PositiveIntegerField(default=0)),
+                ('write_queries', models.PositiveIntegerField(default=0)),
+                ('queries', models.PositiveIntegerField(default=0)),
+                ('places_cache', models.PositiveIntegerField(default=0, help_text='Places found in the location cache, code 0')),
+                ('places_geonames_id', models.PositiveIntegerField(default=0, help_text='Places searched by geonames id, code 1')),
+                ('places_name', models.PositiveIntegerField(default=0, help_text='Places searched by name, code 2')),
+                ('places_lat_lon', models.PositiveIntegerField(default=0, help_text='Places searched by lat, lon, code 3')),
+                ('places_unresolved', models.PositiveIntegerField(default=0, help_text='Places not resolved, code -1')),
+                ('data', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='import_runs', to='deeds.Data')),
+            ],
+            options={
+                'ordering': ['-created'],
+            },
+        ),
+    ]
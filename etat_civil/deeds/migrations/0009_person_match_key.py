@@ -0,0 +1,64 @@
+# Generated by Django 2.2.28 on 2026-10-16 23:57
+
+import re
+
+from django.db import migrations, models
+from unidecode import unidecode
+
+# frozen copy of `etat_civil.deeds.matching.get_match_key`, the keys set by the
+# migration do not change with the code
+SOUNDEX_CODES = {
+    **dict.fromkeys('bfpv', '1'),
+    **dict.fromkeys('cgjkqsxz', '2'),
+    **dict.fromkeys('dt', '3'),
+    'l': '4',
+    **dict.fromkeys('mn', '5'),
+    'r': '6',
+}
+
+
+def get_match_key(surname):
+    if not surname:
+        return None
+
+    letters = re.sub(r'[^a-z]+', '', unidecode(surname).lower())
+    if not letters:
+        return None
+
+    key = letters[0].upper()
+    last = SOUNDEX_CODES.get(letters[0], '')
+    for letter in letters[1:]:
+        code = SOUNDEX_CODES.get(letter, '')
+        if code and code != last:
+            key += code
+        if letter not in 'hw':
+            last = code
+
+    return (key + '000')[:4]
+
+
+def set_match_keys(apps, schema_editor):
+    Person = apps.get_model('deeds', 'Person')
+
+    persons = []
+    for person in Person.objects.exclude(surname__isnull=True).iterator():
+        person.match_key = get_match_key(person.surname)
+        persons.append(person)
+
+    Person.objects.bulk_update(persons, ['match_key'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('deeds', '0008_sequence'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='person',
+            name='match_key',
+            field=models.CharField(blank=True, db_index=True, help_text='Phonetic key of the surname, used to match persons', max_length=8, null=True),
+        ),
+        migrations.RunPython(set_match_keys, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 2.2.28 on 2026-10-17 00:07
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+import model_utils.fields
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('deeds', '0009_person_match_key'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportReject',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', model_utils.fields.AutoCreatedField(default=django.utils.timezone.now, editable=False, verbose_name='created')),
+                ('modified', model_utils.fields.AutoLastModifiedField(default=django.utils.timezone.now, editable=False, verbose_name='modified')),
+                ('sheet', models.CharField(blank=True, max_length=16, null=True)),
+                ('row', models.PositiveIntegerField()),
+                ('error', models.TextField()),
+                ('import_run', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rejects', to='deeds.ImportRun')),
+            ],
+            options={
+                'ordering': ['import_run', 'sheet', 'row'],
+            },
+        ),
+    ]
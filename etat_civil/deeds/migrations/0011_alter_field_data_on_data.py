@@ -0,0 +1,19 @@
+# Generated by Django 2.2.28 on 2026-10-17 00:19
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('deeds', '0010_importreject'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='data',
+            name='data',
+            field=models.FileField(help_text='A workbook, or a zip archive of TSV, CSV or Parquet files named after the sheets', upload_to='uploads/data/', validators=[django.core.validators.FileExtensionValidator(allowed_extensions=['xlsx', 'zip'])]),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 2.2.28 on 2026-10-17 00:40
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+import model_utils.fields
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('geonames_place', '0007_alternatename'),
+        ('deeds', '0011_alter_field_data_on_data'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PlaceAlias',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', model_utils.fields.AutoCreatedField(default=django.utils.timezone.now, editable=False, verbose_name='created')),
+                ('modified', model_utils.fields.AutoLastModifiedField(default=django.utils.timezone.now, editable=False, verbose_name='modified')),
+                ('name', models.CharField(max_length=512, unique=True)),
+                ('place', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='aliases', to='geonames_place.Place')),
+                ('source', models.ForeignKey(blank=True, help_text='Data the alias was learned from', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='place_aliases', to='deeds.Data')),
+            ],
+            options={
+                'verbose_name_plural': 'Place aliases',
+                'ordering': ['name'],
+            },
+        ),
+    ]
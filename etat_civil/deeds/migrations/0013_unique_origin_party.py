@@ -0,0 +1,82 @@
+# Generated by Django 2.2.28 on 2026-10-17 00:53
+
+from django.db import migrations
+from django.db.models import Count
+
+
+def get_lookups(duplicate):
+    # NULL never equals NULL, the rows without a value, the origins without a date,
+    # are duplicates for the loaders although the constraint does not reject them
+    return {
+        (f'{name}__isnull' if value is None else name): (
+            True if value is None else value
+        )
+        for name, value in duplicate.items()
+    }
+
+
+def delete_duplicates(model, fields, get_kept):
+    """Deletes the duplicate rows of the `model` on the `fields`, but the row that
+    `get_kept` returns from the rows of each group of duplicates."""
+    duplicates = (
+        model.objects.values(*fields)
+        .annotate(count=Count('pk'))
+        .filter(count__gt=1)
+    )
+
+    for duplicate in duplicates.iterator():
+        duplicate.pop('count')
+        rows = list(model.objects.filter(**get_lookups(duplicate)).order_by('pk'))
+        kept = get_kept(rows)
+        model.objects.filter(pk__in=[row.pk for row in rows if row != kept]).delete()
+
+
+def get_kept_origin(origins):
+    # the origin of a known date is kept rather than the one of a computed date
+    return min(origins, key=lambda origin: origin.is_date_computed)
+
+
+def get_kept_party(parties):
+    professions = {party.profession_id for party in parties if party.profession_id}
+    if len(professions) > 1:
+        raise ValueError(
+            'The parties {} are the same party with different professions, '
+            'delete all of them but one before migrating'.format(
+                ', '.join(str(party.pk) for party in parties)
+            )
+        )
+
+    # the party with the profession is kept
+    return min(parties, key=lambda party: party.profession_id is None)
+
+
+def delete_duplicate_origins_and_parties(apps, schema_editor):
+    delete_duplicates(
+        apps.get_model('deeds', 'Origin'),
+        ['person', 'place', 'origin_type', 'date', 'order'],
+        get_kept_origin,
+    )
+    delete_duplicates(
+        apps.get_model('deeds', 'Party'), ['deed', 'person', 'role'], get_kept_party
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('geonames_place', '0007_alternatename'),
+        ('deeds', '0012_placealias'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            delete_duplicate_origins_and_parties, migrations.RunPython.noop
+        ),
+        migrations.AlterUniqueTogether(
+            name='origin',
+            unique_together={('person', 'place', 'origin_type', 'date', 'order')},
+        ),
+        migrations.AlterUniqueTogether(
+            name='party', unique_together={('deed', 'person', 'role')},
+        ),
+    ]
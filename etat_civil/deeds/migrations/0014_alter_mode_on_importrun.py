@@ -0,0 +1,18 @@
+# Generated by Django 2.2.28 on 2026-10-17 01:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('deeds', '0013_unique_origin_party'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='importrun',
+            name='mode',
+            field=models.CharField(choices=[('rows', 'Rows'), ('bulk', 'Bulk'), ('delta', 'Delta'), ('copy', 'Copy')], max_length=16),
+        ),
+    ]
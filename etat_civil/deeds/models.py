@@ -1,14 +1,116 @@
+import pickle
 from collections import Counter
+from contextlib import nullcontext
 from datetime import datetime, timedelta
+from itertools import islice
+from time import monotonic, perf_counter
 
 import pandas as pd
+from django.conf import settings
+from django.core.cache import cache as default_cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
 from django.core.validators import FileExtensionValidator
-from django.db import models
+from django.db import IntegrityError, models, transaction
+from django.db.models import F, Q
+from django.utils import timezone
 from django.utils.translation import gettext as _
+from etat_civil.deeds.matching import BlockingIndex, get_match_key
+from etat_civil.deeds.metrics import STAGES, ImportMetrics
+from etat_civil.deeds.dates import DateParser
+from etat_civil.deeds.locations import LocationRegistry
+from etat_civil.deeds.normalize import (
+    count_unknown_persons,
+    get_location_names,
+    is_location_column,
+    iter_records,
+    normalize_row,
+    normalize_sheet,
+    to_date,
+)
+from etat_civil.deeds.readers import open_reader
+from etat_civil.deeds.validation import SHEET_LABELS, validate_workbook
 from etat_civil.geonames_place.models import Place
 from model_utils.models import TimeStampedModel
 
 
+class Vocabulary:
+    """Process-local cache of the fixed vocabulary tables. The titles of each
+    table listed in `settings.DEEDS_INITIAL_DATA` are fetched with one query the
+    first time the table is used, any other title is fetched and cached when it is
+    first requested. When one of the rows of a table is saved or deleted, see
+    `etat_civil.deeds.signals`, the version of the table is incremented in the
+    `shared_cache`, the Redis cache by default, and the processes clear their cache
+    of the table when they see the new version. The version is checked at most
+    every `DEEDS_VOCABULARY_CHECK_INTERVAL` seconds."""
+
+    def __init__(self, shared_cache=default_cache, check_interval=None, clock=None):
+        self.cache = {}
+        self.versions = {}
+        self.checked = {}
+        self.shared_cache = shared_cache
+        self.check_interval = check_interval
+        self.clock = clock or monotonic
+
+    def get(self, model, title):
+        titles = self.cache.get(model)
+
+        if titles is None or self.is_stale(model):
+            titles = self.seed(model)
+            self.cache[model] = titles
+
+        if title not in titles:
+            titles[title] = model.objects.get(title=title)
+
+        return titles[title]
+
+    def seed(self, model):
+        self.versions[model] = self.get_version(model)
+        self.checked[model] = self.clock()
+
+        initial_titles = settings.DEEDS_INITIAL_DATA.get(model.__name__, [])
+        return {
+            obj.title: obj for obj in model.objects.filter(title__in=initial_titles)
+        }
+
+    def get_version_key(self, model):
+        return f"vocabulary:{model._meta.label_lower}"
+
+    def get_version(self, model):
+        return self.shared_cache.get(self.get_version_key(model))
+
+    def is_stale(self, model):
+        """Whether the table changed since it was cached, in any process."""
+        interval = self.check_interval
+        if interval is None:
+            interval = settings.DEEDS_VOCABULARY_CHECK_INTERVAL
+
+        now = self.clock()
+        if now - self.checked.get(model, now) < interval:
+            return False
+
+        self.checked[model] = now
+
+        return self.get_version(model) != self.versions.get(model)
+
+    def clear(self, model=None):
+        if model is None:
+            self.cache.clear()
+        else:
+            self.cache.pop(model, None)
+
+    def invalidate(self, model):
+        """Clears the cache of the table in every process."""
+        self.clear(model)
+
+        key = self.get_version_key(model)
+        if not self.shared_cache.add(key, 1, None):
+            self.shared_cache.incr(key)
+
+
+vocabulary = Vocabulary()
+
+
 class BaseAL(TimeStampedModel):
     title = models.CharField(max_length=128, unique=True)
 
@@ -19,15 +121,50 @@ class BaseAL(TimeStampedModel):
     def __str__(self):
         return self.title
 
+    @classmethod
+    def get_by_title(cls, title):
+        return vocabulary.get(cls, title)
+
+
+DATA_SHEETS = ["births", "marriages", "deaths"]
+
+# the checkpoint of the places resolved by a chunked import
+PLACES_CHECKPOINT = "places"
+
+PURGE_BATCH_SIZE = 500
+
+
+def raw_delete(queryset):
+    """Deletes the rows of the queryset with one DELETE statement, without
+    loading them, and returns the number of rows deleted. The related rows are
+    not deleted, they must be deleted first."""
+    return queryset._raw_delete(queryset.db)
+
 
 class Data(TimeStampedModel):
     title = models.CharField(max_length=64, unique=True)
     data = models.FileField(
         upload_to="uploads/data/",
-        validators=[FileExtensionValidator(allowed_extensions=["xlsx"])],
+        validators=[FileExtensionValidator(allowed_extensions=["xlsx", "zip"])],
+        help_text=_(
+            "A workbook, or a zip archive of TSV, CSV or Parquet files named after "
+            "the sheets"
+        ),
     )
 
-    locations_df = None
+    locations = None
+    metrics = None
+    import_run = None
+    place_ids = None
+    aliased_places = None
+    resolved_places = None
+    searched_places = None
+    places_report = None
+    delta_report = None
+    purge_report = None
+    rejects = None
+    date_parser = None
+    unknown_numbers = None
 
     class Meta:
         verbose_name_plural = "Data"
@@ -36,82 +173,792 @@ class Data(TimeStampedModel):
         return self.title
 
     def save(self, *args, **kwargs):
-        self.locations_df = self.get_data_sheet("locations").set_index("display_name")
+        with self.open_data() as reader:
+            self.locations = self.get_locations(reader)
+
         super().save(*args, **kwargs)
 
-    def load_data(self, delete=False):
+    @property
+    def locations_df(self):
+        """The `locations` as a data frame indexed by display name."""
+        if self.locations is None:
+            return None
+
+        return self.locations.to_dataframe().set_index("display_name")
+
+    @locations_df.setter
+    def locations_df(self, df):
+        self.locations = None if df is None else LocationRegistry.from_dataframe(df)
+
+    def open_data(self):
+        """Opens the data file, returns a reader for the data sheets."""
+        return open_reader(self.data)
+
+    def validate(self):
+        """Returns the issues found in the data sheets, without loading them, see
+        `etat_civil.deeds.validation`."""
+        if not self.data:
+            return []
+
+        with self.open_data() as reader:
+            return validate_workbook(reader)
+
+    def get_locations(self, reader):
+        return LocationRegistry.from_dataframe(
+            self.get_data_sheet("locations", reader=reader)
+        )
+
+    def load_data(
+        self, delete=False, bulk=False, batch_size=None, delta=False, copy=False
+    ):
+        """Loads the births, marriages and deaths sheets. The places of the sheets
+        are resolved before the rows are loaded, see `resolve_places`. When `bulk`
+        is set the rows are written in batches of `batch_size` rows with the
+        `etat_civil.deeds.bulk.BulkLoader`, when `copy` is set with the
+        `etat_civil.deeds.pgcopy.CopyLoader`. When `delta` is set only the rows that
+        changed since the last import are loaded, see
+        `etat_civil.deeds.delta.DeltaImport`. The metrics of the import are
+        recorded in an `ImportRun`."""
         if not self.data:
             return False
 
-        if self.delete:
-            self.sources.all().delete()
+        mode = ImportRun.MODE_DELTA if delta else ImportRun.MODE_ROWS
+        if bulk and not delta:
+            mode = ImportRun.MODE_BULK
+        if copy and not delta:
+            mode = ImportRun.MODE_COPY
 
-        births_df = self.get_data_sheet("births")
-        self.load_births(births_df)
+        self.import_run = ImportRun.objects.create(data=self, mode=mode)
+        self.metrics = ImportMetrics()
+        self.places_report = None
+        self.rejects = []
 
-        marriages_df = self.get_data_sheet("marriages")
-        self.load_marriages(marriages_df)
+        status = ImportRun.STATUS_FAILED
+        started = perf_counter()
 
-        deaths_df = self.get_data_sheet("deaths")
-        self.load_deaths(deaths_df)
+        try:
+            with self.metrics.record():
+                self.load_sheets(
+                    delete=delete,
+                    bulk=bulk,
+                    batch_size=batch_size,
+                    delta=delta,
+                    copy=copy,
+                )
+            status = ImportRun.STATUS_COMPLETED
+        finally:
+            self.release_unknown_numbers()
+            self.import_run.finish(
+                self.metrics,
+                self.places_report,
+                perf_counter() - started,
+                status,
+                rejects=self.rejects,
+            )
+            self.metrics = None
 
         return True
 
-    def get_data_sheet(self, sheet_name):
+    def load_sheets(
+        self, delete=False, bulk=False, batch_size=None, delta=False, copy=False
+    ):
+        if delete:
+            self.purge_report = self.purge()
+
+        loader = self
+        if copy:
+            from etat_civil.deeds.pgcopy import CopyLoader
+
+            loader = CopyLoader(self, batch_size=batch_size)
+        elif bulk:
+            from etat_civil.deeds.bulk import BulkLoader
+
+            loader = BulkLoader(self, batch_size=batch_size)
+
+        with self.open_data() as reader:
+            if self.locations is None:
+                with self.stage("parse"):
+                    self.locations = self.get_locations(reader)
+
+            if delta:
+                from etat_civil.deeds.delta import DeltaImport
+
+                self.delta_report = DeltaImport(self, batch_size=batch_size).load(
+                    reader
+                )
+                return
+
+            with self.stage("places"):
+                self.places_report = self.resolve_places(reader)
+
+            with self.stage("write"):
+                for births_df in self.iter_data_sheet("births", reader):
+                    loader.load_births(births_df)
+
+                for marriages_df in self.iter_data_sheet("marriages", reader):
+                    loader.load_marriages(marriages_df)
+
+                for deaths_df in self.iter_data_sheet("deaths", reader):
+                    loader.load_deaths(deaths_df)
+
+    def purge(self):
+        """Deletes the sources of the data with their deeds and parties, the row
+        fingerprints, and the persons, with their origins, that are not party to
+        the deeds of other data. Each table is deleted with set-based deletes, in
+        dependency order, in one transaction, instead of loading every related
+        object as `self.sources.all().delete()` does. Returns a dict with the
+        number of rows deleted per table."""
+        from etat_civil.deeds.bulk import chunks
+
+        deeds = Deed.objects.filter(source__data=self)
+        parties = Party.objects.filter(deed__source__data=self)
+        other_parties = Party.objects.exclude(deed__source__data=self)
+
+        counts = Counter()
+
+        with transaction.atomic():
+            person_ids = list(
+                Person.objects.filter(pk__in=parties.values("person_id"))
+                .exclude(pk__in=other_parties.values("person_id"))
+                .values_list("pk", flat=True)
+            )
+
+            counts["fingerprints"] = raw_delete(self.fingerprints.all())
+            RowFingerprint.objects.filter(deed__in=deeds).update(deed=None)
+
+            counts["parties"] = raw_delete(parties)
+            counts["deeds"] = raw_delete(deeds)
+            counts["sources"] = raw_delete(self.sources.all())
+
+            for pks in chunks(person_ids, PURGE_BATCH_SIZE):
+                counts["origins"] += raw_delete(
+                    Origin.objects.filter(person_id__in=pks)
+                )
+                counts["persons"] += raw_delete(Person.objects.filter(pk__in=pks))
+
+        return {
+            key: counts[key]
+            for key in [
+                "sources",
+                "deeds",
+                "parties",
+                "persons",
+                "origins",
+                "fingerprints",
+            ]
+        }
+
+    def stage(self, name):
+        """Returns a context manager that records the time and queries of a stage
+        of the import in the import `metrics`."""
+        if self.metrics is None:
+            return nullcontext()
+
+        return self.metrics.stage(name)
+
+    def count_rows(self, read=0, failed=0):
+        if self.metrics is None:
+            return
+
+        self.metrics.rows_read += read
+        self.metrics.rows_failed += failed
+
+    def reserve_unknown_numbers(self, count):
+        """Reserves the numbers for the surnames of `count` unknown persons, unless
+        they are left from the numbers reserved before. The numbers are reserved
+        before the rows are loaded, so that the sequence of the numbers is not
+        locked until the end of the transaction of the rows."""
+        if count <= len(self.unknown_numbers or []):
+            return
+
+        self.release_unknown_numbers()
+        self.unknown_numbers = Person.reserve_unknown_numbers(count)
+
+    def get_unknown_number(self):
+        """Returns the next number for the surname of an unknown person, from the
+        numbers reserved for the import, one more number is reserved when there
+        are none left."""
+        if not self.unknown_numbers:
+            self.unknown_numbers = Person.reserve_unknown_numbers()
+
+        number = self.unknown_numbers[0]
+        self.unknown_numbers = self.unknown_numbers[1:]
+
+        return number
+
+    def release_unknown_numbers(self):
+        if self.unknown_numbers:
+            Person.release_unknown_numbers(self.unknown_numbers)
+
+        self.unknown_numbers = None
+
+    def reject_row(self, sheet_name, index, error):
+        """Records a row of a sheet that failed to load in the `rejects`, with the
+        number of the row in the sheet."""
+        if self.rejects is None:
+            self.rejects = []
+
+        self.rejects.append(
+            ImportReject(sheet=sheet_name, row=int(index) + 2, error=str(error))
+        )
+        self.count_rows(failed=1)
+
+    def start_import(self, resume=False, delta=False):
+        """Prepares a chunked import of the data, run by `resolve_places_chunk` and
+        `load_chunk`, and returns its `ImportRun`. The rows of the sheets still to
+        load, from the `checkpoints` of the sheets when the import is resumed, are
+        split in one pass over the data file into files of
+        `DEEDS_IMPORT_JOB_CHUNK_SIZE` rows, so that each chunk is read without
+        reading the rows before it, and their location names are collected. An
+        incremental import, `delta`, only splits the rows that changed since the
+        data was last imported, see `etat_civil.deeds.delta`."""
+        if not self.data:
+            return None
+
+        run = None
+        if resume:
+            run = self.import_runs.exclude(status=ImportRun.STATUS_COMPLETED).first()
+            # the rows of an incremental import that are not loaded yet have no
+            # fingerprint, they are found again by comparing the rows
+            delta = delta or (run is not None and run.mode == ImportRun.MODE_DELTA)
+
+        if delta:
+            self.checkpoints.all().delete()
+        elif not resume:
+            self.checkpoints.all().delete()
+            self.fingerprints.all().delete()
+
+        if run is None:
+            mode = ImportRun.MODE_DELTA if delta else ImportRun.MODE_BULK
+            run = ImportRun.objects.create(data=self, mode=mode)
+        else:
+            run.status = ImportRun.STATUS_RUNNING
+            run.save()
+
+        self.delete_import_files()
+
+        places, _ = self.checkpoints.get_or_create(sheet=PLACES_CHECKPOINT)
+        if not places.completed:
+            # the names of the remaining rows are resolved again, the names that
+            # are already resolved are found in the place aliases
+            places.row = 0
+            places.save()
+
+        chunksize = settings.DEEDS_IMPORT_JOB_CHUNK_SIZE
+        names = set()
+
+        self.metrics = ImportMetrics()
+        self.rejects = []
+        started = perf_counter()
+
+        try:
+            with self.metrics.record(), self.open_data() as reader:
+                self.locations = self.get_locations(reader)
+
+                if delta:
+                    from etat_civil.deeds.delta import DeltaImport
+
+                    for sheet_name in DATA_SHEETS:
+                        self.checkpoints.get_or_create(sheet=sheet_name)
+
+                    delta_import = DeltaImport(self)
+                    chunks = delta_import.compare(reader, chunksize=chunksize)
+                else:
+                    chunks = self.iter_import_chunks(reader, chunksize)
+
+                with self.stage("parse"):
+                    for sheet_name, df in chunks:
+                        names.update(get_location_names(df))
+                        self.save_import_file(f"{sheet_name}/{df.index[0]:09d}", df)
+
+                    self.save_import_file("locations", self.locations)
+                    self.save_import_file("places", sorted(names))
+
+                if delta:
+                    with self.stage("write"):
+                        delta_import.remove(delta_import.to_remove)
+                    self.delta_report = delta_import.report
+
+            run.add(self.metrics, None, perf_counter() - started, self.rejects)
+        except Exception:
+            run.fail()
+            raise
+        finally:
+            self.metrics = None
+
+        return run
+
+    def iter_import_chunks(self, reader, chunksize):
+        """Yields `(sheet_name, df)` with the chunks of `chunksize` rows of the
+        sheets, from the `checkpoints` of the sheets that are not loaded."""
+        for sheet_name in DATA_SHEETS:
+            checkpoint, _ = self.checkpoints.get_or_create(sheet=sheet_name)
+            if checkpoint.completed:
+                continue
+
+            for df in reader.iter_chunks(
+                sheet_name, chunksize=chunksize, start=checkpoint.row
+            ):
+                yield sheet_name, df
+
+    def resolve_places_chunk(self, size=None):
+        """Resolves the next `size` location names of a chunked import, see
+        `start_import`, from the checkpoint of the places, the places are stored as
+        place aliases. Returns True when all the names are resolved."""
+        checkpoint = self.checkpoints.get(sheet=PLACES_CHECKPOINT)
+        if checkpoint.completed:
+            return True
+
+        size = size or settings.DEEDS_IMPORT_PLACES_CHUNK_SIZE
+        run = self.import_runs.first()
+
+        self.place_ids = None
+        self.resolved_places = None
+
+        self.locations = self.read_import_file("locations")
+        names = self.read_import_file("places")
+        batch = list(islice(names, checkpoint.row, checkpoint.row + size))
+
+        self.metrics = ImportMetrics()
+        started = perf_counter()
+
+        try:
+            with self.metrics.record(), self.stage("places"):
+                report = self.resolve_names(set(batch))
+
+            with transaction.atomic():
+                checkpoint.row += len(batch)
+                checkpoint.completed = checkpoint.row >= len(names)
+                checkpoint.save()
+
+                run.add(self.metrics, report, perf_counter() - started)
+        except Exception:
+            run.fail()
+            raise
+        finally:
+            self.metrics = None
+
+        return checkpoint.completed
+
+    def load_chunk(self, sheet_name=None):
+        """Loads the next chunk of rows of the sheet, or of the first sheet that is
+        not loaded, in one transaction with the update of the checkpoint of the
+        sheet, the fingerprints of the rows, the rejected rows and the metrics of
+        the chunk, so that an import that fails resumes from the last chunk
+        loaded. The places must be resolved first, see `resolve_places_chunk`.
+
+        The sheets can be loaded concurrently, each from its own checkpoint. The
+        chunks are read concurrently, but written one at a time, under a lock on
+        the data, because the sheets share their persons, that chunks written at
+        the same time would both create. Returns True when the sheet, or all the
+        sheets, are loaded, the import is completed when all the sheets are."""
+        from etat_civil.deeds.bulk import BulkLoader
+        from etat_civil.deeds.delta import fingerprint_rows
+
+        run = self.import_runs.first()
+        sheet_names = [sheet_name] if sheet_name else DATA_SHEETS
+        checkpoints = {
+            checkpoint.sheet: checkpoint
+            for checkpoint in self.checkpoints.filter(
+                sheet__in=sheet_names, completed=False
+            )
+        }
+
+        for sheet_name in sheet_names:
+            checkpoint = checkpoints.get(sheet_name)
+            if checkpoint is None:
+                continue
+
+            name = self.get_chunk_name(sheet_name, checkpoint.row)
+            if name is None:
+                checkpoint.completed = True
+                checkpoint.save()
+                continue
+
+            self.metrics = ImportMetrics()
+            self.rejects = []
+            started = perf_counter()
+
+            try:
+                with self.metrics.record():
+                    with self.stage("parse"):
+                        df = self.read_import_file(name)
+                        fingerprints = list(fingerprint_rows(df))
+                        df = self.convert_date_columns(df)
+                    if run.mode != ImportRun.MODE_DELTA:
+                        # the rows of an incremental import are counted when they
+                        # are compared, see `start_import`
+                        self.count_rows(read=len(df.index))
+
+                    self.reserve_unknown_numbers(
+                        count_unknown_persons(df, SHEET_LABELS[sheet_name])
+                    )
+
+                with self.metrics.record(), transaction.atomic():
+                    with self.stage("places"):
+                        self.use_place_aliases(get_location_names(df))
+
+                    with self.stage("write"):
+                        Data.objects.select_for_update().get(pk=self.pk)
+
+                        loader = BulkLoader(self)
+                        getattr(loader, f"load_{sheet_name}")(df)
+                        self.save_fingerprints(
+                            sheet_name, fingerprints, loader.row_deeds
+                        )
+
+                    checkpoint.row = int(df.index[-1]) + 1
+                    checkpoint.loaded += len(df.index)
+                    checkpoint.save()
+
+                    run.add(self.metrics, None, perf_counter() - started, self.rejects)
+            except Exception:
+                run.fail()
+                raise
+            finally:
+                self.release_unknown_numbers()
+                self.metrics = None
+
+            self.delete_import_file(name)
+
+            return False
+
+        # the checkpoints of the other sheets are read after the checkpoint of the
+        # sheet is saved, so that the last sheet loaded completes the import
+        sheets = self.checkpoints.filter(sheet__in=DATA_SHEETS, completed=False)
+        if not sheets.exists():
+            run.complete()
+            self.delete_import_files()
+
+        return True
+
+    def use_place_aliases(self, names):
+        """Looks the places of the `names` up in the place aliases, learnt by
+        `resolve_places_chunk`, the names without an alias are not resolved."""
+        self.aliased_places = PlaceAlias.get_places(names)
+        self.place_ids = {name: place.pk for name, place in self.aliased_places.items()}
+        self.place_ids.update(
+            {name: None for name in names if name not in self.place_ids}
+        )
+        self.resolved_places = {
+            place.pk: place for place in self.aliased_places.values()
+        }
+
+    def save_fingerprints(self, sheet_name, fingerprints, row_deeds):
+        """Saves the fingerprints of the rows loaded from a chunk of the sheet, see
+        `etat_civil.deeds.delta`, the rejected rows are not fingerprinted so that
+        the next incremental import loads them again. When more than one row has
+        the same identity only the first one is fingerprinted."""
+        fingerprints = [fp for fp in fingerprints if fp[0] in row_deeds]
+        existing = set(
+            self.fingerprints.filter(
+                sheet=sheet_name, identity__in=[fp[1] for fp in fingerprints]
+            ).values_list("identity", flat=True)
+        )
+
+        new_fingerprints = []
+        for index, identity, content_hash in fingerprints:
+            if identity in existing:
+                continue
+
+            existing.add(identity)
+            new_fingerprints.append(
+                RowFingerprint(
+                    data=self,
+                    sheet=sheet_name,
+                    identity=identity,
+                    content_hash=content_hash,
+                    deed=row_deeds[index],
+                )
+            )
+
+        RowFingerprint.objects.bulk_create(new_fingerprints)
+
+    def get_import_path(self, name=""):
+        """Returns the path of a file of the chunked import in the default
+        storage."""
+        return f"imports/{self.pk}/{name}"
+
+    def save_import_file(self, name, obj):
+        path = self.get_import_path(name)
+        default_storage.delete(path)
+        default_storage.save(path, ContentFile(pickle.dumps(obj)))
+
+    def read_import_file(self, name):
+        with default_storage.open(self.get_import_path(name)) as f:
+            return pickle.load(f)
+
+    def delete_import_file(self, name):
+        default_storage.delete(self.get_import_path(name))
+
+    def delete_import_files(self):
+        for sheet_name in DATA_SHEETS:
+            for name in self.get_chunk_names(sheet_name):
+                self.delete_import_file(name)
+
+        for name in ["locations", "places"]:
+            self.delete_import_file(name)
+
+    def get_chunk_names(self, sheet_name):
+        """Returns the names of the chunk files of the sheet, in the order of the
+        rows."""
+        path = self.get_import_path(sheet_name)
+        if not default_storage.exists(path):
+            return []
+
+        _, files = default_storage.listdir(path)
+        return [f"{sheet_name}/{name}" for name in sorted(files)]
+
+    def get_chunk_name(self, sheet_name, row):
+        """Returns the name of the chunk file of the sheet that starts at the
+        `row`, or after it, or None when there is no chunk left to load."""
+        for name in self.get_chunk_names(sheet_name):
+            if int(name.split("/")[-1]) >= row:
+                return name
+
+        return None
+
+    def get_data_sheet(self, sheet_name, reader=None):
         if not sheet_name:
             return None
 
-        df = pd.read_excel(self.data, engine="openpyxl", sheet_name=sheet_name)
-        df = df.dropna(how="all")
+        if reader is None:
+            with self.open_data() as reader:
+                return self.get_data_sheet(sheet_name, reader=reader)
 
+        df = reader.read_sheet(sheet_name)
         df = self.convert_date_columns(df)
 
         return df
 
+    def iter_data_sheet(self, sheet_name, reader, chunksize=None):
+        """Yields the rows of the sheet in data frames of up to `chunksize` rows,
+        so that large sheets do not need to be loaded in memory at once."""
+        chunks = reader.iter_chunks(sheet_name, chunksize=chunksize)
+
+        while True:
+            with self.stage("parse"):
+                df = next(chunks, None)
+                if df is None:
+                    return
+
+                df = self.convert_date_columns(df)
+
+            self.count_rows(read=len(df.index))
+            yield df
+
     def convert_date_columns(self, df):
+        """Parses the columns with "date" in their name, see
+        `etat_civil.deeds.dates.DateParser`, the values that are not dates are
+        converted to `NaT`."""
         if df is None:
             return None
 
+        if self.date_parser is None:
+            self.date_parser = DateParser()
+
         date_columns = filter(lambda x: "date" in x, df.columns)
         for c in date_columns:
-            df[c] = pd.to_datetime(df[c], errors="ignore")
+            df[c] = self.date_parser.parse_dates(df[c])
 
         return df
 
     def load_births(self, births_df):
-        return self.load_deed(births_df, Deed.load_birth_deed)
+        return self.load_deed(
+            births_df, DeedType.get_birth(), Deed.get_birth_parties(), "births"
+        )
 
-    def load_deed(self, df, load_func):
+    def load_deed(
+        self,
+        df,
+        deed_type,
+        parties,
+        sheet_name=None,
+        from_death_deed=False,
+        commit_size=None,
+    ):
+        """Loads the rows of the data frame with `Deed.load_record`, committing
+        every `commit_size` rows in one transaction. The rows of each chunk are
+        normalised with `normalize_sheet` before they are loaded. Each row is
+        loaded in a savepoint, a row that fails is rolled back and recorded in the
+        `rejects`."""
         if df is None:
             return False
 
-        for index, row in df.iterrows():
-            try:
-                source = Source.load_source(
-                    self, row["classmark"], row["classmark_microfilm"]
-                )
-                if source:
-                    load_func(self, source, row)
-            except Exception as e:  # noqa
-                print(load_func, index, e)
-                continue
+        commit_size = commit_size or settings.DEEDS_IMPORT_COMMIT_SIZE
+        labels = [label for label, _, _ in parties]
+
+        for start in range(0, len(df.index), commit_size):
+            chunk = df.iloc[start:][:commit_size]
+
+            # the places are created outside of the savepoints of the rows, so that
+            # a row that is rolled back does not leave places that do not exist in
+            # the place caches
+            names = get_location_names(chunk) - (self.place_ids or {}).keys()
+            if names:
+                self.resolve_names(names)
+
+            self.reserve_unknown_numbers(count_unknown_persons(chunk, labels))
+
+            with self.stage("parse"):
+                normalized = normalize_sheet(chunk, labels)
+
+            with transaction.atomic():
+                for index, deed_record, person_records in iter_records(
+                    normalized, labels
+                ):
+                    try:
+                        with transaction.atomic():
+                            source = Source.load_source(
+                                self, deed_record.classmark, deed_record.microfilm
+                            )
+                            if source:
+                                Deed.load_record(
+                                    self,
+                                    source,
+                                    deed_type,
+                                    parties,
+                                    deed_record,
+                                    person_records,
+                                    from_death_deed=from_death_deed,
+                                )
+                    except Exception as e:  # noqa
+                        self.reject_row(sheet_name, index, e)
 
         return True
 
     def load_marriages(self, marriages_df):
-        return self.load_deed(marriages_df, Deed.load_marriage_deed)
+        return self.load_deed(
+            marriages_df,
+            DeedType.get_marriage(),
+            Deed.get_marriage_parties(),
+            "marriages",
+        )
 
     def load_deaths(self, deaths_df):
-        return self.load_deed(deaths_df, Deed.load_death_deed)
+        return self.load_deed(
+            deaths_df,
+            DeedType.get_death(),
+            Deed.get_death_parties(),
+            "deaths",
+            from_death_deed=True,
+        )
+
+    def get_location_names(self, reader):
+        """Returns the distinct location names in the deed sheets."""
+        names = set()
+
+        for sheet_name in DATA_SHEETS:
+            columns = reader.get_columns(sheet_name) or []
+            positions = [
+                idx for idx, column in enumerate(columns) if is_location_column(column)
+            ]
+            if not positions:
+                continue
+
+            for index, record in reader.iter_rows(sheet_name):
+                for idx in positions:
+                    name = record[idx]
+                    if isinstance(name, str) and name.strip():
+                        names.add(name.strip())
+
+        return names
+
+    def resolve_places(self, reader):
+        """Resolves every distinct location name in the deed sheets once, before
+        the rows are loaded, so that `get_place` only needs to look the names up
+        in `place_ids`. Returns a counter with the number of places for each
+        `get_place` code, names that are not in the location cache but are found
+        in geonames are counted under code 2 and the names that could not be
+        resolved under code -1."""
+        self.place_ids = None
+        self.resolved_places = None
+
+        return self.resolve_names(self.get_location_names(reader))
+
+    def resolve_names(self, names):
+        """Resolves the location `names`, see `resolve_places`, and adds them to
+        the names already resolved."""
+        report = Counter()
+        resolved_ids = self.place_ids or {}
+        self.place_ids = None
+        place_ids = {}
+
+        self.aliased_places = PlaceAlias.get_places(names)
+        hydrated = self.query_geonames(names - self.aliased_places.keys())
+
+        for name in sorted(names):
+            place, code = self.get_place(name)
+
+            if place is None:
+                code = -1
+            elif code == -1:
+                code = 2
+            elif code == 0 and place.geonames_id in hydrated:
+                code = 1
+
+            place_ids[name] = place.pk if place else None
+            report[code] += 1
+
+        self.place_ids = {**resolved_ids, **place_ids}
+        self.resolved_places = {
+            **(self.resolved_places or {}),
+            **Place.objects.in_bulk([pk for pk in set(place_ids.values()) if pk]),
+        }
+
+        return report
+
+    def query_geonames(self, names):
+        """Queries geonames concurrently for the places that `get_place` would
+        otherwise query one at a time: the geonames ids in the location cache that
+        are not in the database, and the names that need a search by name. The
+        places found by name are kept in `searched_places`. Returns the geonames
+        ids of the places created."""
+        addresses = set()
+        geonames_ids = set()
+
+        for name in names:
+            location = self.locations.get(name)
+
+            if location is None:
+                addresses.add(name)
+            elif location.geonames_id is not None:
+                geonames_ids.add(location.geonames_id)
+            elif not location.has_coordinates:
+                addresses.add(location.address)
+
+        geonames_ids -= set(
+            Place.objects.filter(geonames_id__in=geonames_ids).values_list(
+                "geonames_id", flat=True
+            )
+        )
+        with self.stage("geocoding"):
+            hydrated = Place.hydrate_many_from_geonames(
+                [Place(geonames_id=geonames_id) for geonames_id in geonames_ids]
+            )
+
+            self.searched_places = Place.get_or_create_many_from_geonames(addresses)
+
+        return set(hydrated.keys())
+
+    def search_place(self, address):
+        """Returns the place found by searching geonames for the `address`."""
+        if self.searched_places is not None and address in self.searched_places:
+            return self.searched_places[address]
+
+        with self.stage("geocoding"):
+            return Place.get_or_create_from_geonames(address=address)
 
     def get_place(self, name):
         """Returns a geonames place and a return code, and updates the internal
-        place name cache, `locations_df`, when new places get a `geonames_id`.
+        place name cache, `locations`, when new places get a `geonames_id`.
         Code 0, the place was found in the location cache; code 1, the place was
         searched in geonames by geonames id; code 2, the place was searched in
         geonames by name; code 3, the place was searched in geonames by lat, lon;
         code -1, the place was not in the cache and was searched in geonames by
-        name."""
+        name. Names already resolved by `resolve_places` are returned from
+        `place_ids`, and names with a `PlaceAlias` with the place of the alias,
+        with code 0. The places of the other names are stored as aliases."""
         if not name:
             return None, -1
 
@@ -119,59 +966,77 @@ class Data(TimeStampedModel):
         name = name.strip()
         address = name
 
-        try:
-            location = self.locations_df.loc[name]
-            address = location["location"].strip()
-            geonames_id = location["geonames_id"]
-
-            if pd.notnull(geonames_id):
-                # get place by geonames id
-                place, created = Place.objects.get_or_create(
-                    geonames_id=int(geonames_id)
-                )
-                if created:
-                    code = 1
-            elif pd.notnull(location["lat"]) and pd.notnull(location["lon"]):
-                # get place by lat, lon
-                lat = location["lat"]
-                lon = location["lon"]
-                geonames_id = f"-{int(lat*10000)}{int(lon*10000)}"
-                place, created = Place.objects.get_or_create(
-                    geonames_id=int(geonames_id),
-                    update_from_geonames=False,
-                    lat=location["lat"],
-                    lon=location["lon"],
-                )
-                if created:
-                    code = 3
-                    place.address = address
-                    place.save()
-            else:
-                # get place by name
-                place = Place.get_or_create_from_geonames(address=address)
-                code = 2
-        except KeyError:
+        if self.place_ids is not None and name in self.place_ids:
+            place = self.resolved_places.get(self.place_ids[name])
+            return place, code if place else -1
+
+        place = self.get_alias(name)
+        if place:
+            return place, code
+
+        location = self.locations.get(name)
+
+        if location is None:
             code = -1
+            self.locations.add(name)
+
+            # get place by name
+            place = self.search_place(name)
+        elif location.geonames_id is not None:
+            address = location.address
 
-            new_location_df = pd.DataFrame(
-                [[name, name]], columns=["display_name", "location"], index=[name]
+            # get place by geonames id
+            place, created = Place.objects.get_or_create(
+                geonames_id=location.geonames_id
             )
-            self.locations_df = self.locations_df.append(new_location_df, sort=True)
-            self.locations_df.set_index("display_name")
+            if created:
+                code = 1
+        elif location.has_coordinates:
+            address = location.address
+
+            # get place by lat, lon
+            lat = location.lat
+            lon = location.lon
+            geonames_id = f"-{int(lat*10000)}{int(lon*10000)}"
+            place, created = Place.objects.get_or_create(
+                geonames_id=int(geonames_id),
+                update_from_geonames=False,
+                lat=lat,
+                lon=lon,
+            )
+            if created:
+                code = 3
+                place.address = address
+                place.save()
+        else:
+            address = location.address
 
             # get place by name
-            place = Place.get_or_create_from_geonames(address=name)
+            place = self.search_place(address)
+            code = 2
 
         # updates the locations cache
         if place:
-            self.locations_df.loc[name, "geonames_id"] = place.geonames_id
+            self.locations.set_geonames_id(name, place.geonames_id)
 
             place.address = address
             place.update_from_geonames = False
             place.save()
 
+            PlaceAlias.learn(name, place, source=self)
+            if self.aliased_places is not None:
+                self.aliased_places[name] = place
+
         return place, code
 
+    def get_alias(self, name):
+        """Returns the place of the `PlaceAlias` of the name, or None, from the
+        aliases loaded by `resolve_places` when they are loaded."""
+        if self.aliased_places is not None:
+            return self.aliased_places.get(name)
+
+        return PlaceAlias.get_place(name)
+
 
 class Source(TimeStampedModel):
     data = models.ForeignKey(Data, on_delete=models.CASCADE, related_name="sources")
@@ -206,15 +1071,15 @@ class Source(TimeStampedModel):
 class DeedType(BaseAL):
     @staticmethod
     def get_birth():
-        return DeedType.objects.get(title="birth")
+        return DeedType.get_by_title("birth")
 
     @staticmethod
     def get_death():
-        return DeedType.objects.get(title="death")
+        return DeedType.get_by_title("death")
 
     @staticmethod
     def get_marriage():
-        return DeedType.objects.get(title="marriage")
+        return DeedType.get_by_title("marriage")
 
 
 class Deed(TimeStampedModel):
@@ -241,34 +1106,110 @@ class Deed(TimeStampedModel):
 
     @property
     def is_birth(self):
-        return self.deed_type == DeedType.get_birth()
+        return self.deed_type_id == DeedType.get_birth().pk
 
     @property
     def is_birth_legitimate(self):
         return self.is_birth and "legitimate birth: true" in self.notes.lower()
 
+    @staticmethod
+    def get_birth_parties():
+        """Returns the label, gender and role of the parties of a birth deed."""
+        return [
+            ("father_", Gender.get_m(), Role.get_father()),
+            ("mother_", Gender.get_f(), Role.get_mother()),
+        ]
+
+    @staticmethod
+    def get_marriage_parties():
+        return [
+            ("groom_", Gender.get_m(), Role.get_groom()),
+            ("bride_", Gender.get_f(), Role.get_bride()),
+        ]
+
+    @staticmethod
+    def get_death_parties():
+        return [("", None, Role.get_deceased())]
+
     @staticmethod
     def load_birth_deed(data, source, row):
         if data is None or source is None or row is None:
             return None
 
-        deed_type = DeedType.get_birth()
-        deed_n = Deed.get_deed_n(row)
-        deed_date = Deed.get_deed_date(row)
-        deed_place, _ = data.get_place(row["deed_location"])
-        deed_notes = Deed.get_deed_notes(row)
+        return Deed.load_row(
+            data, source, row, DeedType.get_birth(), Deed.get_birth_parties()
+        )
+
+    @staticmethod
+    def load_row(data, source, row, deed_type, parties, from_death_deed=False):
+        """Loads a single row of a data sheet, see `load_record`."""
+        deed_record, person_records = normalize_row(
+            row, [label for label, _, _ in parties]
+        )
+
+        return Deed.load_record(
+            data,
+            source,
+            deed_type,
+            parties,
+            deed_record,
+            person_records,
+            from_death_deed=from_death_deed,
+        )
+
+    @staticmethod
+    def load_record(
+        data,
+        source,
+        deed_type,
+        parties,
+        deed_record,
+        person_records,
+        from_death_deed=False,
+    ):
+        """Loads the deed of a row normalised by `normalize_sheet`, and the
+        `parties` of the deed, a list of label, gender and role, from their
+        `person_records`."""
+        deed_place, _ = data.get_place(deed_record.deed_location)
+
+        deed = Deed.save_deed(
+            deed_type,
+            deed_record.n,
+            deed_record.date,
+            deed_place,
+            source,
+            deed_record.notes,
+        )
+
+        for (_, gender, role), record in zip(parties, person_records):
+            Person.load_record(
+                data, gender, role, deed, record, from_death_deed=from_death_deed
+            )
+
+        return deed
 
-        deed, _ = Deed.objects.get_or_create(
+    @staticmethod
+    def save_deed(deed_type, n, date, place, source, notes):
+        """Returns the deed with the natural key `(n, date, place)`, created, or
+        updated when its source or notes changed. A deed of another type, or of
+        another data file, with the same key raises an `IntegrityError`."""
+        deed, created = Deed.objects.get_or_create(
+            n=n,
+            date=date,
+            place=place,
             deed_type=deed_type,
-            n=deed_n,
-            date=deed_date,
-            place=deed_place,
-            source=source,
-            notes=deed_notes,
+            defaults={"source": source, "notes": notes},
         )
 
-        Person.load_father(data, deed, row)
-        Person.load_mother(data, deed, row)
+        if not created and deed.source.data_id != source.data_id:
+            raise IntegrityError(
+                f"A deed of another data file already exists for {(n, date, place.pk)}"
+            )
+
+        if not created and (deed.source_id, deed.notes) != (source.pk, notes):
+            deed.source = source
+            deed.notes = notes
+            deed.save()
 
         return deed
 
@@ -290,7 +1231,10 @@ class Deed(TimeStampedModel):
         deed_date = row["deed_date"]
 
         if isinstance(deed_date, str):
-            deed_date = pd.to_datetime(deed_date).date()
+            deed_date = to_date(deed_date)
+
+        if pd.isnull(deed_date):
+            return None
 
         return deed_date
 
@@ -314,64 +1258,48 @@ class Deed(TimeStampedModel):
         if data is None or source is None or row is None:
             return None
 
-        deed_type = DeedType.get_marriage()
-        deed_n = Deed.get_deed_n(row)
-        deed_date = Deed.get_deed_date(row)
-        deed_place, _ = data.get_place(row["deed_location"])
-        deed_notes = Deed.get_deed_notes(row)
-
-        deed, _ = Deed.objects.get_or_create(
-            deed_type=deed_type,
-            n=deed_n,
-            date=deed_date,
-            place=deed_place,
-            source=source,
-            notes=deed_notes,
+        return Deed.load_row(
+            data, source, row, DeedType.get_marriage(), Deed.get_marriage_parties()
         )
 
-        Person.load_groom(data, deed, row)
-        Person.load_bride(data, deed, row)
-
-        return deed
-
     @staticmethod
     def load_death_deed(data, source, row):
         if data is None or source is None or row is None:
             return None
 
-        deed_type = DeedType.get_death()
-        deed_n = Deed.get_deed_n(row)
-        deed_date = Deed.get_deed_date(row)
-        deed_place, _ = data.get_place(row["deed_location"])
-        deed_notes = Deed.get_deed_notes(row)
-
-        deed, _ = Deed.objects.get_or_create(
-            deed_type=deed_type,
-            n=deed_n,
-            date=deed_date,
-            place=deed_place,
-            source=source,
-            notes=deed_notes,
+        return Deed.load_row(
+            data,
+            source,
+            row,
+            DeedType.get_death(),
+            Deed.get_death_parties(),
+            from_death_deed=True,
         )
 
-        Person.load_deceased(data, deed, row)
-
-        return deed
-
 
 class Gender(BaseAL):
     @staticmethod
     def get_f():
-        return Gender.objects.get(title="f")
+        return Gender.get_by_title("f")
 
     @staticmethod
     def get_m():
-        return Gender.objects.get(title="m")
+        return Gender.get_by_title("m")
+
+
+UNKNOWN_PERSON_SEQUENCE = "unknown_person"
 
 
 class Person(TimeStampedModel):
     name = models.CharField(max_length=128, blank=True, null=True)
     surname = models.CharField(max_length=128, blank=True, null=True)
+    match_key = models.CharField(
+        max_length=8,
+        blank=True,
+        null=True,
+        db_index=True,
+        help_text=_("Phonetic key of the surname, used to match persons"),
+    )
     unknown = models.BooleanField(default=False)
     gender = models.ForeignKey(Gender, blank=True, null=True, on_delete=models.CASCADE)
     age = models.PositiveSmallIntegerField(blank=True, null=True)
@@ -388,10 +1316,27 @@ class Person(TimeStampedModel):
 
     def save(self, *args, **kwargs):
         if self.unknown and not self.surname:
-            self.surname = Person.objects.filter(unknown=True).count()
+            self.surname = str(Person.reserve_unknown_numbers()[0])
+
+        self.match_key = get_match_key(self.surname)
 
         super().save(*args, **kwargs)
 
+    @staticmethod
+    def reserve_unknown_numbers(count=1):
+        """Reserves `count` numbers for the surnames of unknown persons, returns
+        the range of numbers reserved. The numbers start at 0, the number of an
+        unknown person is the number of unknown persons before it."""
+        return Sequence.reserve(
+            UNKNOWN_PERSON_SEQUENCE,
+            count=count,
+            initial=lambda: Person.objects.filter(unknown=True).count() - 1,
+        )
+
+    @staticmethod
+    def release_unknown_numbers(numbers):
+        return Sequence.release(UNKNOWN_PERSON_SEQUENCE, numbers)
+
     @property
     def fullname(self):
         fullname = ""
@@ -404,7 +1349,7 @@ class Person(TimeStampedModel):
 
     @property
     def birthplace(self):
-        origin_type = OriginType.objects.get(title="birth")
+        origin_type = OriginType.get_birth()
         origins = self.origin_from.filter(origin_type=origin_type)
 
         if origins:
@@ -414,7 +1359,7 @@ class Person(TimeStampedModel):
 
     @property
     def domicile(self):
-        origin_type = OriginType.objects.get(title="domicile")
+        origin_type = OriginType.get_domicile()
         origins = self.origin_from.filter(origin_type=origin_type).order_by("order")
 
         if origins:
@@ -535,41 +1480,137 @@ class Person(TimeStampedModel):
 
     @staticmethod
     def load_person(data, label, gender, role, deed, row, from_death_deed=False):
-        unknown = False
-
-        name = Person.get_name_field(f"{label}name", row)
-        surname = Person.get_name_field(f"{label}surname", row)
-
-        if name == "Unknown":
-            unknown = True
+        _, (record,) = normalize_row(row, [label])
 
-        age = Person.get_age(label, row)
-        birth_year = None
-
-        if age:
-            birth_date = Person.get_birth_date(deed.date, age)
-            birth_year = birth_date.year
-
-        person, created = Person.objects.get_or_create(
-            name=name,
-            surname=surname,
-            unknown=unknown,
-            gender=gender,
-            birth_year=birth_year,
+        return Person.load_record(
+            data, gender, role, deed, record, from_death_deed=from_death_deed
         )
 
+    @staticmethod
+    def load_record(data, gender, role, deed, record, from_death_deed=False):
+        """Loads the person of a `PersonRecord`, with its origins and its party to
+        the `deed`."""
+        name = record.name
+        surname = record.surname
+        unknown = bool(record.unknown)
+        age = record.age
+        birth_year = record.birth_year
+
+        person = None
+        if settings.DEEDS_MATCH_PERSONS and not unknown:
+            person = Person.match_person(name, surname, gender, birth_year)
+
+        if unknown and not surname:
+            surname = str(data.get_unknown_number())
+
+        if person is None:
+            person, created = Person.objects.get_or_create(
+                name=name,
+                surname=surname,
+                unknown=unknown,
+                gender=gender,
+                birth_year=birth_year,
+            )
+        else:
+            created = False
+
         if created:
             person.age = age
             person.save()
 
-        Origin.load_origins(
-            data, person, label, deed, row, from_death_deed=from_death_deed
-        )
+        Origin.load_record(data, person, deed, record, from_death_deed=from_death_deed)
 
-        Party.load_party(person, label, role, deed, row)
+        Party.load_record(person, role, deed, record)
 
         return person
 
+    @staticmethod
+    def match_person(name, surname, gender, birth_year, window=None):
+        """Returns the person that best matches the fields, with a surname that
+        sounds the same and a birth year within `window` years, or None."""
+        match_key = get_match_key(surname)
+        if match_key is None:
+            return None
+
+        if window is None:
+            window = settings.DEEDS_MATCH_BIRTH_YEAR_WINDOW
+
+        query = Person.objects.filter(match_key=match_key, gender=gender, unknown=False)
+        if birth_year is None:
+            query = query.filter(birth_year__isnull=True)
+        else:
+            query = query.filter(
+                birth_year__range=(birth_year - window, birth_year + window)
+            )
+
+        index = BlockingIndex(window=window)
+        for person in query:
+            index.add(person)
+
+        return index.match(name, surname, gender.pk if gender else None, birth_year)
+
+    @staticmethod
+    def find_duplicates(window=None):
+        """Returns the groups of persons that match each other, see
+        `etat_civil.deeds.matching`."""
+        if window is None:
+            window = settings.DEEDS_MATCH_BIRTH_YEAR_WINDOW
+
+        index = BlockingIndex(window=window)
+        for person in Person.objects.filter(
+            unknown=False, match_key__isnull=False
+        ).iterator():
+            index.add(person)
+
+        return index.find_duplicates()
+
+    @staticmethod
+    def merge(person, duplicates):
+        """Moves the origins and parties of the `duplicates` to the `person`, and
+        deletes the `duplicates`."""
+        pks = [duplicate.pk for duplicate in duplicates if duplicate.pk != person.pk]
+
+        def get_duplicates(queryset, key):
+            """Returns the pks of the rows with the same key as a row of the
+            `person`, or of another of the `duplicates`."""
+            rows = sorted(
+                queryset.filter(Q(person=person) | Q(person_id__in=pks)),
+                key=lambda row: (row.person_id != person.pk, row.pk),
+            )
+
+            seen = set()
+            duplicate_pks = []
+            for row in rows:
+                if key(row) in seen:
+                    duplicate_pks.append(row.pk)
+                seen.add(key(row))
+
+            return duplicate_pks
+
+        with transaction.atomic():
+            Party.objects.filter(
+                pk__in=get_duplicates(
+                    Party.objects.all(), lambda party: (party.deed_id, party.role_id)
+                )
+            ).delete()
+            Party.objects.filter(person_id__in=pks).update(person=person)
+
+            Origin.objects.filter(
+                pk__in=get_duplicates(
+                    Origin.objects.all(),
+                    lambda origin: (
+                        origin.place_id,
+                        origin.origin_type_id,
+                        origin.date,
+                        origin.order,
+                    ),
+                )
+            ).delete()
+            Origin.objects.filter(person_id__in=pks).update(person=person)
+            Person.objects.filter(pk__in=pks).delete()
+
+        return len(pks)
+
     @staticmethod
     def get_name_field(field, row):
         name = row[field]
@@ -666,30 +1707,25 @@ class Person(TimeStampedModel):
 
     @staticmethod
     def persons_to_geojson():
-        geo = {}
-        geo["type"] = "FeatureCollection"
-        geo["features"] = []
-
-        for person in Person.objects.all():
-            feature = person.to_geojson()
-            if feature:
-                geo["features"].append(feature)
+        """Exports the origins of all the persons into a GeoJSON
+        FeatureCollection, see `etat_civil.deeds.geojson`."""
+        from etat_civil.deeds.geojson import to_feature_collection
 
-        return geo
+        return to_feature_collection()
 
 
 class OriginType(BaseAL):
     @staticmethod
     def get_birth():
-        return OriginType.objects.get(title="birth")
+        return OriginType.get_by_title("birth")
 
     @staticmethod
     def get_death():
-        return OriginType.objects.get(title="death")
+        return OriginType.get_by_title("death")
 
     @staticmethod
     def get_domicile():
-        return OriginType.objects.get(title="domicile")
+        return OriginType.get_by_title("domicile")
 
 
 class Origin(TimeStampedModel):
@@ -707,6 +1743,9 @@ class Origin(TimeStampedModel):
     )
     order = models.PositiveSmallIntegerField(default=0)
 
+    class Meta:
+        unique_together = ["person", "place", "origin_type", "date", "order"]
+
     def __str__(self):
         return "{}: {}".format(self.origin_type, self.place)
 
@@ -733,9 +1772,19 @@ class Origin(TimeStampedModel):
         ):
             return None
 
+        _, (record,) = normalize_row(row, [person_label])
+
+        return Origin.load_record(
+            data, person, deed, record, from_death_deed=from_death_deed
+        )
+
+    @staticmethod
+    def load_record(data, person, deed, record, from_death_deed=False):
+        """Loads the origins of the `person` from a `PersonRecord` of the
+        `deed`."""
         origins = []
 
-        address = row.get(f"{person_label}domicile")
+        address = record.domicile
         if pd.isnull(address):
             address = deed.place.address
 
@@ -750,13 +1799,20 @@ class Origin(TimeStampedModel):
             )
         )
 
-        birth_date = Person.get_birth_date(deed.date, person.age)
+        birth_date = record.birth_date
+        previous_domicile_date = record.previous_domicile_date
+
+        if person.age != record.age:
+            # the person was loaded from another row, the dates are computed from
+            # the age recorded for the person
+            birth_date = Person.get_birth_date(deed.date, person.age)
+            previous_domicile_date = birth_date + (deed.date - birth_date) / 2
 
         is_date_computed = False
         if not person.age:
             is_date_computed = True
 
-        address = row.get(f"{person_label}birth_location")
+        address = record.birth_location
         if pd.notnull(address):
             origins.append(
                 Origin.load_origin(
@@ -782,11 +1838,8 @@ class Origin(TimeStampedModel):
                 )
             )
         else:
-            address = row.get(f"{person_label}previous_domicile_location")
+            address = record.previous_domicile_location
             if pd.notnull(address):
-                previous_domicile_date = birth_date + (deed.date - birth_date) / 2
-                is_date_computed = True
-
                 origins.append(
                     Origin.load_origin(
                         data,
@@ -794,7 +1847,7 @@ class Origin(TimeStampedModel):
                         address,
                         OriginType.get_domicile(),
                         origin_date=previous_domicile_date,
-                        is_date_computed=is_date_computed,
+                        is_date_computed=True,
                         order=3,
                     )
                 )
@@ -818,15 +1871,19 @@ class Origin(TimeStampedModel):
         if place is None:
             return None
 
-        origin, _ = Origin.objects.get_or_create(
+        origin, created = Origin.objects.get_or_create(
             person=person,
             place=place,
             origin_type=origin_type,
             date=origin_date,
-            is_date_computed=is_date_computed,
             order=order,
+            defaults={"is_date_computed": is_date_computed},
         )
 
+        if not created and origin.is_date_computed != is_date_computed:
+            origin.is_date_computed = is_date_computed
+            origin.save()
+
         return origin
 
 
@@ -837,23 +1894,23 @@ class Profession(BaseAL):
 class Role(BaseAL):
     @staticmethod
     def get_father():
-        return Role.objects.get(title="father")
+        return Role.get_by_title("father")
 
     @staticmethod
     def get_mother():
-        return Role.objects.get(title="mother")
+        return Role.get_by_title("mother")
 
     @staticmethod
     def get_groom():
-        return Role.objects.get(title="groom")
+        return Role.get_by_title("groom")
 
     @staticmethod
     def get_bride():
-        return Role.objects.get(title="bride")
+        return Role.get_by_title("bride")
 
     @staticmethod
     def get_deceased():
-        return Role.objects.get(title="deceased")
+        return Role.get_by_title("deceased")
 
 
 class Party(TimeStampedModel):
@@ -867,6 +1924,7 @@ class Party(TimeStampedModel):
     )
 
     class Meta:
+        unique_together = ["deed", "person", "role"]
         verbose_name_plural = "Parties"
 
     @staticmethod
@@ -874,12 +1932,27 @@ class Party(TimeStampedModel):
         if person is None or label is None or role is None or deed is None:
             return None
 
-        profession = Party.get_profession(label, row)
+        _, (record,) = normalize_row(row, [label])
+
+        return Party.load_record(person, role, deed, record)
+
+    @staticmethod
+    def load_record(person, role, deed, record):
+        """Loads the party of the `person` to the `deed` from a `PersonRecord`."""
+        profession = None
+        if pd.notnull(record.profession):
+            profession, _ = Profession.objects.get_or_create(
+                title=record.profession.strip()
+            )
 
-        party, _ = Party.objects.get_or_create(
-            deed=deed, person=person, role=role, profession=profession
+        party, created = Party.objects.get_or_create(
+            deed=deed, person=person, role=role, defaults={"profession": profession}
         )
 
+        if not created and party.profession != profession:
+            party.profession = profession
+            party.save()
+
         return party
 
     @staticmethod
@@ -894,3 +1967,299 @@ class Party(TimeStampedModel):
 
         profession, _ = Profession.objects.get_or_create(title=title.strip())
         return profession
+
+
+class RowFingerprint(TimeStampedModel):
+    """Fingerprint of a row of a data sheet, the hash of the cells that identify the
+    deed of the row and the hash of all its cells, used to import only the rows
+    that changed, see `etat_civil.deeds.delta`."""
+
+    data = models.ForeignKey(
+        Data, on_delete=models.CASCADE, related_name="fingerprints"
+    )
+    sheet = models.CharField(max_length=16)
+    identity = models.CharField(max_length=40)
+    content_hash = models.CharField(max_length=40)
+    deed = models.ForeignKey(
+        Deed,
+        blank=True,
+        null=True,
+        on_delete=models.SET_NULL,
+        related_name="fingerprints",
+        help_text=_("Deed loaded from the row"),
+    )
+
+    class Meta:
+        unique_together = ["data", "sheet", "identity"]
+
+    def __str__(self):
+        return "{}: {} {}".format(self.data, self.sheet, self.identity)
+
+
+class ImportCheckpoint(TimeStampedModel):
+    """Progress of a chunked import of a data sheet, `row` is the position of the
+    next row to load. The checkpoint of the places, `PLACES_CHECKPOINT`, holds the
+    position of the next location name to resolve."""
+
+    data = models.ForeignKey(Data, on_delete=models.CASCADE, related_name="checkpoints")
+    sheet = models.CharField(max_length=16)
+    row = models.PositiveIntegerField(default=0)
+    loaded = models.PositiveIntegerField(default=0)
+    completed = models.BooleanField(default=False)
+
+    class Meta:
+        ordering = ["data", "sheet"]
+        unique_together = ["data", "sheet"]
+
+    def __str__(self):
+        return "{}: {} {}".format(self.data, self.sheet, self.row)
+
+
+class ImportRun(TimeStampedModel):
+    """Metrics of a `Data.load_data` run, or of a chunked import: the rows read,
+    the time spent and the queries run in each stage of the import, and the number
+    of places resolved for each `Data.get_place` code."""
+
+    MODE_ROWS = "rows"
+    MODE_BULK = "bulk"
+    MODE_DELTA = "delta"
+    MODE_COPY = "copy"
+    MODE_CHOICES = [
+        (MODE_ROWS, "Rows"),
+        (MODE_BULK, "Bulk"),
+        (MODE_DELTA, "Delta"),
+        (MODE_COPY, "Copy"),
+    ]
+
+    STATUS_RUNNING = "running"
+    STATUS_COMPLETED = "completed"
+    STATUS_FAILED = "failed"
+    STATUS_CHOICES = [
+        (STATUS_RUNNING, "Running"),
+        (STATUS_COMPLETED, "Completed"),
+        (STATUS_FAILED, "Failed"),
+    ]
+
+    data = models.ForeignKey(Data, on_delete=models.CASCADE, related_name="import_runs")
+    mode = models.CharField(max_length=16, choices=MODE_CHOICES)
+    status = models.CharField(
+        max_length=16, choices=STATUS_CHOICES, default=STATUS_RUNNING
+    )
+    finished = models.DateTimeField(blank=True, null=True)
+    duration = models.FloatField(default=0, help_text=_("Duration in seconds"))
+
+    rows_read = models.PositiveIntegerField(default=0)
+    rows_failed = models.PositiveIntegerField(default=0)
+
+    parse_time = models.FloatField(default=0)
+    places_time = models.FloatField(default=0)
+    geocoding_time = models.FloatField(default=0)
+    write_time = models.FloatField(default=0)
+
+    parse_queries = models.PositiveIntegerField(default=0)
+    places_queries = models.PositiveIntegerField(default=0)
+    geocoding_queries = models.PositiveIntegerField(default=0)
+    write_queries = models.PositiveIntegerField(default=0)
+    queries = models.PositiveIntegerField(default=0)
+
+    places_cache = models.PositiveIntegerField(
+        default=0, help_text=_("Places found in the location cache, code 0")
+    )
+    places_geonames_id = models.PositiveIntegerField(
+        default=0, help_text=_("Places searched by geonames id, code 1")
+    )
+    places_name = models.PositiveIntegerField(
+        default=0, help_text=_("Places searched by name, code 2")
+    )
+    places_lat_lon = models.PositiveIntegerField(
+        default=0, help_text=_("Places searched by lat, lon, code 3")
+    )
+    places_unresolved = models.PositiveIntegerField(
+        default=0, help_text=_("Places not resolved, code -1")
+    )
+
+    class Meta:
+        ordering = ["-created"]
+
+    def __str__(self):
+        return "{}: {} {}".format(self.data, self.mode, self.created)
+
+    @property
+    def rows_per_second(self):
+        if not self.duration:
+            return None
+
+        return self.rows_read / self.duration
+
+    def finish(self, metrics, places_report, duration, status, rejects=None):
+        self.status = status
+        self.finished = timezone.now()
+
+        for name, value in self.get_counts(metrics, places_report, duration).items():
+            setattr(self, name, value)
+
+        self.save()
+        self.add_rejects(rejects)
+
+    def add(self, metrics, places_report, duration, rejects=None):
+        """Adds the metrics of a job of a chunked import, see `Data.load_chunk`, to
+        the run."""
+        counts = self.get_counts(metrics, places_report, duration)
+
+        ImportRun.objects.filter(pk=self.pk).update(
+            **{name: F(name) + value for name, value in counts.items()}
+        )
+        self.add_rejects(rejects)
+
+    def complete(self):
+        self.set_status(ImportRun.STATUS_COMPLETED)
+
+    def fail(self):
+        self.set_status(ImportRun.STATUS_FAILED)
+
+    def set_status(self, status):
+        self.status = status
+        self.finished = timezone.now()
+        ImportRun.objects.filter(pk=self.pk).update(
+            status=self.status, finished=self.finished
+        )
+
+    @staticmethod
+    def get_counts(metrics, places_report, duration):
+        counts = {
+            "duration": duration,
+            "rows_read": metrics.rows_read,
+            "rows_failed": metrics.rows_failed,
+        }
+
+        for stage in STAGES:
+            counts[f"{stage}_time"] = metrics.times[stage]
+            counts[f"{stage}_queries"] = metrics.queries[stage]
+        counts["queries"] = sum(metrics.queries.values())
+
+        places_report = places_report or {}
+        counts["places_cache"] = places_report.get(0, 0)
+        counts["places_geonames_id"] = places_report.get(1, 0)
+        counts["places_name"] = places_report.get(2, 0)
+        counts["places_lat_lon"] = places_report.get(3, 0)
+        counts["places_unresolved"] = places_report.get(-1, 0)
+
+        return counts
+
+    def add_rejects(self, rejects):
+        for reject in rejects or []:
+            reject.import_run = self
+        ImportReject.objects.bulk_create(rejects or [])
+
+
+class ImportReject(TimeStampedModel):
+    """A row of a data sheet that failed to load in an `ImportRun`, `row` is the
+    number of the row in the sheet, the header being row 1."""
+
+    import_run = models.ForeignKey(
+        ImportRun, on_delete=models.CASCADE, related_name="rejects"
+    )
+    sheet = models.CharField(max_length=16, blank=True, null=True)
+    row = models.PositiveIntegerField()
+    error = models.TextField()
+
+    class Meta:
+        ordering = ["import_run", "sheet", "row"]
+
+    def __str__(self):
+        return "{}: {} {}".format(self.import_run, self.sheet, self.row)
+
+
+class Sequence(models.Model):
+    """Named counter, the numbers are handed out by incrementing the `value` of the
+    row, which is locked until the end of the transaction, so that concurrent
+    transactions get different numbers."""
+
+    name = models.CharField(max_length=64, unique=True)
+    value = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return "{}: {}".format(self.name, self.value)
+
+    @staticmethod
+    def reserve(name, count=1, initial=None):
+        """Reserves the next `count` numbers of the sequence, and returns them as a
+        range. When the sequence does not exist it is created, starting after the
+        value returned by the `initial` callable."""
+        with transaction.atomic():
+            updated = Sequence.objects.filter(name=name).update(
+                value=F("value") + count
+            )
+
+            if not updated:
+                try:
+                    with transaction.atomic():
+                        start = initial() if initial else 0
+                        Sequence.objects.create(name=name, value=start + count)
+                except IntegrityError:
+                    # created by a concurrent transaction
+                    Sequence.objects.filter(name=name).update(value=F("value") + count)
+
+            value = Sequence.objects.values_list("value", flat=True).get(name=name)
+
+        return range(value - count + 1, value + 1)
+
+    @staticmethod
+    def release(name, numbers):
+        """Returns the `numbers`, the end of a range returned by `reserve`, to the
+        sequence, if no other numbers were reserved after them."""
+        if not numbers:
+            return False
+
+        return (
+            Sequence.objects.filter(name=name, value=numbers[-1]).update(
+                value=numbers[0] - 1
+            )
+            > 0
+        )
+
+
+class PlaceAlias(TimeStampedModel):
+    """Place of a location name of the deed sheets, learned when the name is
+    resolved by `Data.get_place` and shared by the imports of all the data files.
+    The aliases are looked up before the locations sheet, so that a correction of
+    the place of an alias applies to the following imports."""
+
+    name = models.CharField(max_length=512, unique=True)
+    place = models.ForeignKey(Place, on_delete=models.CASCADE, related_name="aliases")
+    source = models.ForeignKey(
+        Data,
+        blank=True,
+        null=True,
+        on_delete=models.SET_NULL,
+        related_name="place_aliases",
+        help_text=_("Data the alias was learned from"),
+    )
+
+    class Meta:
+        ordering = ["name"]
+        verbose_name_plural = "Place aliases"
+
+    def __str__(self):
+        return self.name
+
+    @staticmethod
+    def get_places(names):
+        """Returns a dict with the place of each of the `names` that has an
+        alias."""
+        aliases = PlaceAlias.objects.filter(name__in=names).select_related("place")
+
+        return {alias.name: alias.place for alias in aliases}
+
+    @staticmethod
+    def get_place(name):
+        alias = PlaceAlias.objects.filter(name=name).select_related("place").first()
+
+        return alias.place if alias else None
+
+    @staticmethod
+    def learn(name, place, source=None):
+        """Stores the place of the name, unless the name already has an alias."""
+        PlaceAlias.objects.get_or_create(
+            name=name, defaults={"place": place, "source": source}
+        )
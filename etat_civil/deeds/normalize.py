@@ -0,0 +1,237 @@
+"""Normalises the rows of a data sheet, column by column, into the values used to
+load the deeds, so that the loaders do not need to process the rows one cell at a
+time. The values are the same as the ones returned, for a single row, by
+`Deed.get_deed_n`, `Deed.get_deed_date`, `Deed.get_deed_notes`,
+`Person.get_name_field`, `Person.get_age` and `Person.get_birth_date`."""
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from etat_civil.deeds.dates import DateParser
+
+DEED_FIELDS = [
+    "classmark",
+    "microfilm",
+    "deed_location",
+    "n",
+    "date",
+    "notes",
+]
+
+PERSON_FIELDS = [
+    "name",
+    "surname",
+    "unknown",
+    "age",
+    "birth_year",
+    "birth_date",
+    "previous_domicile_date",
+    "profession",
+    "domicile",
+    "birth_location",
+    "previous_domicile_location",
+]
+
+DeedRecord = namedtuple("DeedRecord", DEED_FIELDS)
+PersonRecord = namedtuple("PersonRecord", PERSON_FIELDS)
+
+INTEGER_PATTERN = r"^\s*[+-]?\d+\s*$"
+
+
+def normalize_sheet(df, labels):
+    """Returns a data frame with the normalised deed columns, and the normalised
+    person columns for each of the person `labels`, prefixed by the label."""
+    normalized = pd.DataFrame(index=df.index)
+
+    normalized["classmark"] = get_column(df, "classmark")
+    normalized["microfilm"] = get_column(df, "classmark_microfilm")
+    normalized["deed_location"] = get_column(df, "deed_location")
+    normalized["n"] = get_deed_n(df)
+    normalized["date"] = get_deed_date(df)
+    normalized["notes"] = get_deed_notes(df)
+
+    deed_days = to_days(normalized["date"])
+
+    for label in labels:
+        name = get_name_field(df, f"{label}name")
+        age = get_age(df, label)
+        birth_days = get_birth_days(deed_days, age)
+
+        normalized[f"{label}name"] = name
+        normalized[f"{label}surname"] = get_name_field(df, f"{label}surname")
+        normalized[f"{label}unknown"] = name == "Unknown"
+        normalized[f"{label}age"] = to_int(age)
+        normalized[f"{label}birth_year"] = get_birth_year(birth_days, age)
+        normalized[f"{label}birth_date"] = from_days(birth_days, df.index)
+        normalized[f"{label}previous_domicile_date"] = from_days(
+            birth_days + (deed_days - birth_days) // 2, df.index
+        )
+
+        for field in PERSON_FIELDS[-4:]:
+            normalized[f"{label}{field}"] = get_column(df, f"{label}{field}")
+
+    return normalized
+
+
+def iter_records(normalized, labels):
+    """Yields, for each row in a normalised data frame, the index of the row, a
+    `DeedRecord` and a list with one `PersonRecord` for each of the `labels`."""
+    deeds = zip(*[normalized[field] for field in DEED_FIELDS])
+    persons = [
+        zip(*[normalized[f"{label}{field}"] for field in PERSON_FIELDS])
+        for label in labels
+    ]
+
+    for index, deed, *parties in zip(normalized.index, deeds, *persons):
+        yield index, DeedRecord._make(deed), [PersonRecord._make(p) for p in parties]
+
+
+def normalize_row(row, labels):
+    """Returns the `DeedRecord`, and the list of `PersonRecord` for the `labels`, of
+    a single row of a data sheet."""
+    _, deed, persons = next(
+        iter_records(normalize_sheet(pd.DataFrame([row]), labels), labels)
+    )
+
+    return deed, persons
+
+
+def is_location_column(column):
+    """Whether the column of a data sheet holds location names, that are looked up
+    in the locations sheet."""
+    return (
+        column == "deed_location"
+        or column.endswith("domicile")
+        or column.endswith("_location")
+    )
+
+
+def get_location_names(df):
+    """Returns the distinct location names in the location columns of a data frame
+    read from a data sheet."""
+    names = set()
+
+    for column in filter(is_location_column, df.columns):
+        for name in df[column]:
+            if isinstance(name, str) and name.strip():
+                names.add(name.strip())
+
+    return names
+
+
+def get_column(df, column):
+    if column not in df:
+        return pd.Series(None, index=df.index, dtype=object)
+
+    return df[column]
+
+
+def get_deed_n(df):
+    return to_int(to_numbers(get_column(df, "deed_number")), default=0)
+
+
+def get_deed_date(df, parser=None):
+    dates = (parser or DateParser()).parse_dates(get_column(df, "deed_date"))
+
+    return to_object(dates.dt.date, df.index)
+
+
+def get_deed_notes(df):
+    notes = get_column(df, "comments")
+
+    if "birth_legitimate" in df:
+        legitimate = df["birth_legitimate"].astype(str)
+        notes = (
+            "Legitimate birth: " + legitimate + "; " + notes.astype(str)
+        ).str.strip()
+
+    return notes.map(lambda value: value if value is None else str(value))
+
+
+def get_name_field(df, column):
+    # the column is not read as strings when all its cells are empty
+    names = get_column(df, column).astype(object)
+    names = names.where(names.isnull(), names.astype(str).str.strip())
+
+    unknown = names.str.contains("inconnu", regex=False, na=False)
+
+    return names.where(~unknown, "Unknown").map(
+        lambda name: None if pd.isnull(name) else name
+    )
+
+
+def count_unknown_persons(df, labels):
+    """Returns the number of unknown persons without a surname in the rows, the
+    persons that get a number for surname, for the person `labels`."""
+    count = 0
+
+    for label in labels:
+        unknown = get_name_field(df, f"{label}name") == "Unknown"
+        count += int((unknown & get_name_field(df, f"{label}surname").isnull()).sum())
+
+    return count
+
+
+def get_age(df, label):
+    return to_numbers(get_column(df, f"{label}age"))
+
+
+def get_birth_days(deed_days, age):
+    years = np.trunc(age.fillna(0).values).astype(np.int64)
+
+    return deed_days - (years * 365).astype("timedelta64[D]")
+
+
+def get_birth_year(birth_days, age):
+    years = birth_days.astype("datetime64[Y]").astype(np.int64) + 1970
+    has_year = (np.trunc(age.fillna(0).values) != 0) & ~np.isnat(birth_days)
+
+    return to_int(pd.Series(np.where(has_year, years, np.nan), index=age.index))
+
+
+def to_numbers(values):
+    """Converts the values to floats, strings that are not integers are converted
+    to NaN, as `int` would not convert them."""
+    numbers = pd.to_numeric(values, errors="coerce")
+
+    if values.dtype == object:
+        strings = values[values.map(lambda value: isinstance(value, str))]
+        is_integer = strings.str.match(INTEGER_PATTERN).astype(bool)
+
+        numbers = numbers.astype(float)
+        numbers[strings.index[~is_integer.values]] = np.nan
+
+    return numbers
+
+
+def to_int(numbers, default=None):
+    return pd.Series(
+        [int(n) if pd.notnull(n) else default for n in numbers],
+        index=numbers.index,
+        dtype=object,
+    )
+
+
+def to_date(value, parser=None):
+    timestamp = (parser or DateParser()).parse(value).date
+    if timestamp is None:
+        return None
+
+    return timestamp.date()
+
+
+def to_days(dates):
+    return np.array(list(dates), dtype="datetime64[D]")
+
+
+def from_days(days, index):
+    return to_object(days.astype(object), index)
+
+
+def to_object(values, index):
+    return pd.Series(
+        [None if pd.isnull(value) else value for value in values],
+        index=index,
+        dtype=object,
+    )
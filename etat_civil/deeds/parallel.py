@@ -0,0 +1,172 @@
+"""Imports several data files concurrently, in a pool of processes. The rows
+that the imports share, the places and place aliases, the professions and the
+lookup tables, are created first, one data file after the other, so that the
+imports running in parallel only read them and never race to create the same
+row, and the numbers of the unknown persons of each data file are reserved. The
+sources and deeds of each data file are written by its own import, the data files
+with deeds of the data files before them are imported after the others, one
+after the other, so that their deeds are rejected instead of racing to create
+the same deeds."""
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
+import django
+from django.db import connection, connections
+
+from etat_civil.deeds.models import Data, ImportRun, Profession
+from etat_civil.deeds.normalize import (
+    count_unknown_persons,
+    get_column,
+    get_deed_date,
+    get_deed_n,
+)
+from etat_civil.deeds.validation import SHEET_LABELS
+
+
+def get_professions(reader):
+    """Returns the distinct profession titles in the deed sheets."""
+    titles = set()
+
+    for sheet_name, labels in SHEET_LABELS.items():
+        columns = reader.get_columns(sheet_name) or []
+        profession_columns = [
+            f"{label}profession" for label in labels if f"{label}profession" in columns
+        ]
+        if not profession_columns:
+            continue
+
+        df = reader.read_sheet(sheet_name)
+        for column in profession_columns:
+            titles.update(
+                title.strip()
+                for title in df[column].dropna()
+                if isinstance(title, str) and title.strip()
+            )
+
+    return titles
+
+
+def scan_deeds(data, reader):
+    """Returns the keys, number, date and place, of the deeds of the data file,
+    and the number of its unknown persons that get a number for surname. The
+    places are looked up in the places resolved by `Data.resolve_places`."""
+    keys = set()
+    unknown = 0
+
+    for sheet_name, labels in SHEET_LABELS.items():
+        for df in reader.iter_chunks(sheet_name):
+            unknown += count_unknown_persons(df, labels)
+
+            locations = get_column(df, "deed_location")
+            for n, date, location in zip(get_deed_n(df), get_deed_date(df), locations):
+                if not isinstance(location, str) or date is None:
+                    continue
+
+                place_id = data.place_ids.get(location.strip())
+                if place_id:
+                    keys.add((n, date, place_id))
+
+    return keys, unknown
+
+
+def split_datas(datas, deed_keys):
+    """Splits the `datas` into the data files that can be imported in parallel,
+    and the data files with deeds with the same key as a deed of a data file
+    before them, given the `deed_keys` by data primary key."""
+    parallel = []
+    sequential = []
+    seen = set()
+
+    for data in datas:
+        keys = deed_keys[data.pk]
+
+        if keys & seen:
+            sequential.append(data)
+        else:
+            parallel.append(data)
+
+        seen |= keys
+
+    return parallel, sequential
+
+
+def prepare_imports(datas, delete=False):
+    """Runs the shared phase of the imports of the `datas`: deletes the rows of
+    the previous imports when `delete` is set, resolves the places of all the
+    data files, which stores them as place aliases, creates the professions of
+    all the data files, and reserves the numbers of the unknown persons of each
+    data file. Returns the keys of the deeds by data primary key, see
+    `scan_deeds`."""
+    professions = set()
+    deed_keys = {}
+
+    for data in datas:
+        if delete:
+            data.purge_report = data.purge()
+
+        with data.open_data() as reader:
+            data.locations = data.get_locations(reader)
+            data.places_report = data.resolve_places(reader)
+            professions.update(get_professions(reader))
+
+            deed_keys[data.pk], unknown = scan_deeds(data, reader)
+            data.reserve_unknown_numbers(unknown)
+
+    professions -= set(
+        Profession.objects.filter(title__in=professions).values_list("title", flat=True)
+    )
+    Profession.objects.bulk_create(
+        [Profession(title=title) for title in sorted(professions)]
+    )
+
+    return deed_keys
+
+
+def init_worker():
+    django.setup()
+
+
+def load_data(pk, unknown_numbers, options):
+    """Imports the data with the primary key `pk` in a worker process, with the
+    `unknown_numbers` reserved for it, returns the primary key of the import
+    run."""
+    data = Data.objects.get(pk=pk)
+    data.unknown_numbers = unknown_numbers
+    data.load_data(**options)
+
+    return data.import_run.pk
+
+
+def import_parallel(datas, workers=None, delete=False, **options):
+    """Imports the `datas` in a pool of `workers` processes, after the shared
+    phase, see `prepare_imports`. The `options` are passed to `Data.load_data`.
+    SQLite does not support concurrent writes, the data files are imported one
+    after the other. Returns the import runs, in the order of the `datas`."""
+    deed_keys = prepare_imports(datas, delete=delete)
+
+    parallel, sequential = split_datas(datas, deed_keys)
+    if not workers or workers < 2 or connection.vendor == "sqlite":
+        parallel, sequential = [], datas
+
+    runs = {}
+
+    if parallel:
+        # the worker processes open their own connections
+        connections.close_all()
+
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_worker) as pool:
+            run_pks = pool.map(
+                load_data,
+                [data.pk for data in parallel],
+                [data.unknown_numbers for data in parallel],
+                repeat(options),
+            )
+            runs.update(zip([data.pk for data in parallel], run_pks))
+
+    for data in sequential:
+        data.load_data(**options)
+        runs[data.pk] = data.import_run.pk
+
+    import_runs = ImportRun.objects.in_bulk(runs.values())
+
+    return [import_runs[runs[data.pk]] for data in datas]
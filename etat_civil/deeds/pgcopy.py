@@ -0,0 +1,178 @@
+"""Loads the deed sheets of very large data files on PostgreSQL by streaming the
+staged rows of each batch into a temporary staging table with `COPY`, and merging
+the staging table into the table of the model with set-based SQL. On the other
+databases the rows are written as by the `BulkLoader`."""
+import csv
+import io
+from functools import partial
+
+from django.db import connection
+
+from etat_civil.deeds.bulk import KEEP_FIELDS, BulkLoader
+from etat_civil.deeds.upsert import get_conflict_fields, get_groups
+
+COPY_NULL = "\\N"
+
+ROW_COLUMN = "staging_row"
+
+
+def supports_copy(connection):
+    return connection.vendor == "postgresql"
+
+
+def to_copy_value(value):
+    if value is None:
+        return COPY_NULL
+
+    return value
+
+
+def copy_expert(cursor, sql, buffer):
+    """Runs the `COPY ... FROM STDIN` statement with the rows in the `buffer`,
+    through the execute wrappers of the connection, as `cursor.execute` does, so
+    that the statement is counted in the queries of the import, see
+    `etat_civil.deeds.metrics.ImportMetrics.record`."""
+
+    def execute(sql, params, many, context):
+        return context["cursor"].cursor.copy_expert(sql, buffer)
+
+    executor = execute
+    for wrapper in reversed(connection.execute_wrappers):
+        executor = partial(wrapper, executor)
+
+    return executor(sql, None, False, {"connection": connection, "cursor": cursor})
+
+
+class CopyLoader(BulkLoader):
+    """Bulk loader that writes the batches with `COPY` on PostgreSQL. The ids of
+    the new rows are reserved from the sequence of the table before they are
+    copied, the rows of the staging table that match a row of the table on its
+    natural key get the id of that row, and the staging table is merged with one
+    `INSERT ... ON CONFLICT (id) DO UPDATE`."""
+
+    def create(self, model, objs):
+        if not objs or not supports_copy(connection):
+            return super().create(model, objs)
+
+        meta = model._meta
+        fields = list(meta.concrete_fields)
+        conflict_fields = get_conflict_fields(model)
+
+        for obj in objs:
+            for field in fields:
+                field.pre_save(obj, True)
+
+        groups = get_groups(model, objs, conflict_fields)
+
+        with connection.cursor() as cursor:
+            self.reserve_ids(cursor, model, [group[-1] for group in groups])
+            staging = self.create_staging_table(cursor, model)
+            self.copy_rows(cursor, staging, fields, groups)
+
+            if conflict_fields:
+                self.match_rows(cursor, model, staging, conflict_fields)
+
+            self.merge_rows(cursor, model, staging, fields)
+
+            cursor.execute(
+                f"SELECT {ROW_COLUMN}, {self.qn(meta.pk.column)} FROM {staging}"
+            )
+            for row, pk in cursor.fetchall():
+                for obj in groups[row]:
+                    obj.pk = pk
+                    obj._state.adding = False
+                    obj._state.db = connection.alias
+
+    def qn(self, name):
+        return connection.ops.quote_name(name)
+
+    def reserve_ids(self, cursor, model, objs):
+        """Sets the ids of the new `objs` from the sequence of the table."""
+        new_objs = [obj for obj in objs if obj.pk is None]
+        if not new_objs:
+            return
+
+        meta = model._meta
+        cursor.execute(
+            "SELECT nextval(pg_get_serial_sequence(%s, %s)) "
+            "FROM generate_series(1, %s)",
+            [meta.db_table, meta.pk.column, len(new_objs)],
+        )
+        for obj, (pk,) in zip(new_objs, cursor.fetchall()):
+            obj.pk = pk
+
+    def create_staging_table(self, cursor, model):
+        """Creates, or empties, the staging table of the model for the current
+        transaction, and returns its name."""
+        table = model._meta.db_table
+        staging = self.qn(f"staging_{table}")
+
+        cursor.execute(
+            f"CREATE TEMPORARY TABLE IF NOT EXISTS {staging} "
+            f"(LIKE {self.qn(table)} INCLUDING DEFAULTS) ON COMMIT DROP"
+        )
+        cursor.execute(
+            f"ALTER TABLE {staging} ADD COLUMN IF NOT EXISTS {ROW_COLUMN} integer"
+        )
+        cursor.execute(f"TRUNCATE {staging}")
+
+        return staging
+
+    def copy_rows(self, cursor, staging, fields, groups):
+        """Streams the last object of each group of `groups` to the staging
+        table, with the position of the group."""
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+
+        for row, group in enumerate(groups):
+            obj = group[-1]
+            writer.writerow(
+                [
+                    to_copy_value(
+                        field.get_db_prep_save(getattr(obj, field.attname), connection)
+                    )
+                    for field in fields
+                ]
+                + [row]
+            )
+
+        buffer.seek(0)
+        columns = ", ".join(self.qn(field.column) for field in fields)
+        copy_expert(
+            cursor,
+            f"COPY {staging} ({columns}, {ROW_COLUMN}) FROM STDIN "
+            f"WITH (FORMAT csv, NULL '{COPY_NULL}')",
+            buffer,
+        )
+
+    def match_rows(self, cursor, model, staging, conflict_fields):
+        """Sets the id of the staged rows that match a row of the table on the
+        natural key to the id of that row."""
+        meta = model._meta
+        pk = self.qn(meta.pk.column)
+        columns = [self.qn(meta.get_field(name).column) for name in conflict_fields]
+
+        cursor.execute(
+            f"UPDATE {staging} AS s SET {pk} = t.{pk} FROM {self.qn(meta.db_table)} "
+            "AS t WHERE "
+            + " AND ".join(f"s.{column} = t.{column}" for column in columns)
+        )
+
+    def merge_rows(self, cursor, model, staging, fields):
+        """Inserts the staged rows in the table, the rows with the id of a row of
+        the table update that row."""
+        meta = model._meta
+        columns = [self.qn(field.column) for field in fields]
+        keep_fields = ["created", *KEEP_FIELDS.get(model, [])]
+        update_columns = [
+            self.qn(field.column)
+            for field in fields
+            if not field.primary_key and field.name not in keep_fields
+        ]
+
+        cursor.execute(
+            f"INSERT INTO {self.qn(meta.db_table)} ({', '.join(columns)}) "
+            f"SELECT {', '.join(columns)} FROM {staging} "
+            f"ON CONFLICT ({self.qn(meta.pk.column)}) DO UPDATE SET "
+            + ", ".join(f"{column} = EXCLUDED.{column}" for column in update_columns)
+        )
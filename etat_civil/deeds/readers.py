@@ -0,0 +1,266 @@
+import os
+import zipfile
+from collections import namedtuple
+from itertools import islice
+from pathlib import PurePosixPath
+
+import numpy as np
+import pandas as pd
+from django.conf import settings
+from openpyxl import load_workbook
+
+
+# the separators of the table files by extension
+TABLE_SEPARATORS = {".tsv": "\t", ".csv": ","}
+
+TABLE_EXTENSIONS = list(TABLE_SEPARATORS.keys()) + [".parquet"]
+
+# the columns read as strings from the table files, that would otherwise be read
+# as numbers when all their values are numeric
+TABLE_TEXT_COLUMNS = ["classmark", "classmark_microfilm"]
+
+
+def open_reader(f):
+    """Returns a `WorkbookReader` for a workbook, and a `TableReader` for a
+    directory or zip archive of tables."""
+    name = str(getattr(f, "name", f))
+
+    if name.lower().endswith(".xlsx"):
+        return WorkbookReader(f)
+
+    return TableReader(f)
+
+
+class SheetReader:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        pass
+
+    def read_sheet(self, sheet_name):
+        """Returns all the rows of the sheet as a data frame, or None if the
+        workbook does not have the sheet."""
+        columns = self.get_columns(sheet_name)
+        if columns is None:
+            return None
+
+        chunks = list(self.iter_chunks(sheet_name))
+        if not chunks:
+            return pd.DataFrame(columns=columns)
+
+        return pd.concat(chunks)
+
+
+class WorkbookReader(SheetReader):
+    """Reads the sheets of a data collection workbook. The workbook is opened only
+    once, in openpyxl read-only mode, and the rows of each sheet are streamed from
+    it as records, named tuples with one field per column, so that the memory used
+    does not depend on the size of the workbook."""
+
+    def __init__(self, f):
+        self.workbook = load_workbook(f, read_only=True, data_only=True)
+
+    def close(self):
+        self.workbook.close()
+
+    @property
+    def sheet_names(self):
+        return self.workbook.sheetnames
+
+    def get_columns(self, sheet_name):
+        """Returns the column names of the sheet, or None if the workbook does not
+        have the sheet."""
+        if sheet_name not in self.sheet_names:
+            return None
+
+        header = list(next(self.iter_values(sheet_name), ()))
+        while header and header[-1] is None:
+            header.pop()
+
+        return [
+            str(name) if name is not None else f"Unnamed: {idx}"
+            for idx, name in enumerate(header)
+        ]
+
+    def iter_values(self, sheet_name):
+        worksheet = self.workbook[sheet_name]
+        worksheet.reset_dimensions()
+
+        return worksheet.iter_rows(values_only=True)
+
+    def iter_rows(self, sheet_name, start=0):
+        """Yields `(index, record)` for the non-empty rows of the sheet, from the
+        row at position `start`, the index is the position of the row in the
+        sheet, not counting the header."""
+        columns = self.get_columns(sheet_name)
+        if not columns:
+            return
+
+        Record = namedtuple("Record", columns, rename=True)
+        width = len(columns)
+
+        values = self.iter_values(sheet_name)
+        next(values, None)
+
+        for index, row in enumerate(values):
+            if index < start:
+                continue
+
+            row = tuple(row[:width])
+            if all(value is None for value in row):
+                continue
+
+            if len(row) < width:
+                row = row + (None,) * (width - len(row))
+
+            yield index, Record._make(row)
+
+    def iter_chunks(self, sheet_name, chunksize=None, start=0):
+        """Yields the rows of the sheet, from the row at position `start`, as data
+        frames of up to `chunksize` rows."""
+        columns = self.get_columns(sheet_name)
+        if not columns:
+            return
+
+        chunksize = chunksize or settings.DEEDS_IMPORT_CHUNK_SIZE
+        rows = self.iter_rows(sheet_name, start=start)
+
+        chunk = list(islice(rows, chunksize))
+        while chunk:
+            index, records = zip(*chunk)
+            df = pd.DataFrame.from_records(records, columns=columns, index=index)
+
+            # empty cells are read as None, pandas reads them as NaN
+            yield df.fillna(np.nan)
+
+            chunk = list(islice(rows, chunksize))
+
+
+class TableReader(SheetReader):
+    """Reads the sheets of a data collection from a directory, or a zip archive,
+    of TSV, CSV or Parquet files, one file per sheet named after the sheet, for
+    example `births.tsv`. The text files are parsed in chunks by the pandas C
+    parser, which is much faster than reading a workbook, and the rows are indexed
+    by their position in the file, not counting the header and the empty rows
+    that are skipped."""
+
+    def __init__(self, f):
+        self.archive = None
+        self.files = {}
+        self.tables = {}
+
+        if isinstance(f, (str, os.PathLike)) and os.path.isdir(f):
+            names = [os.path.join(f, name) for name in sorted(os.listdir(f))]
+        else:
+            self.archive = zipfile.ZipFile(f)
+            names = [
+                info.filename for info in self.archive.infolist() if not info.is_dir()
+            ]
+
+        for name in names:
+            path = PurePosixPath(name.replace(os.sep, "/"))
+            if path.suffix.lower() in TABLE_EXTENSIONS and not path.name.startswith(
+                "."
+            ):
+                self.files.setdefault(path.stem, (name, path.suffix.lower()))
+
+    def close(self):
+        if self.archive is not None:
+            self.archive.close()
+
+    @property
+    def sheet_names(self):
+        return list(self.files.keys())
+
+    def open(self, sheet_name):
+        name, _ = self.files[sheet_name]
+
+        if self.archive is not None:
+            return self.archive.open(name)
+
+        return open(name, "rb")
+
+    def get_columns(self, sheet_name):
+        """Returns the column names of the sheet, or None if there is no file for
+        the sheet."""
+        if sheet_name not in self.files:
+            return None
+
+        _, extension = self.files[sheet_name]
+        if extension == ".parquet":
+            return [str(column) for column in self.read_table(sheet_name).columns]
+
+        with self.open(sheet_name) as f:
+            df = pd.read_csv(f, sep=TABLE_SEPARATORS[extension], nrows=0)
+
+        return [str(column) for column in df.columns]
+
+    def read_table(self, sheet_name):
+        """Reads a Parquet file, the whole table is read at once."""
+        if sheet_name not in self.tables:
+            with self.open(sheet_name) as f:
+                df = pd.read_parquet(f)
+
+            self.tables[sheet_name] = df.reset_index(drop=True)
+
+        return self.tables[sheet_name]
+
+    def iter_frames(self, sheet_name, chunksize):
+        _, extension = self.files[sheet_name]
+
+        if extension == ".parquet":
+            df = self.read_table(sheet_name)
+            for start in range(0, len(df.index), chunksize):
+                yield df.iloc[start:][:chunksize]
+            return
+
+        columns = self.get_columns(sheet_name)
+        with self.open(sheet_name) as f:
+            yield from pd.read_csv(
+                f,
+                sep=TABLE_SEPARATORS[extension],
+                chunksize=chunksize,
+                dtype={c: str for c in TABLE_TEXT_COLUMNS if c in columns},
+            )
+
+    def iter_chunks(self, sheet_name, chunksize=None, start=0):
+        """Yields the rows of the sheet, from the row at position `start`, as data
+        frames of up to `chunksize` rows."""
+        if sheet_name not in self.files:
+            return
+
+        chunksize = chunksize or settings.DEEDS_IMPORT_CHUNK_SIZE
+        buffered = []
+
+        for df in self.iter_frames(sheet_name, chunksize):
+            df = df[df.index >= start].dropna(how="all")
+            if df.empty:
+                continue
+
+            buffered.append(df)
+            if sum(len(frame.index) for frame in buffered) < chunksize:
+                continue
+
+            df = pd.concat(buffered)
+            yield df.iloc[:chunksize]
+            buffered = [df.iloc[chunksize:]]
+
+        if sum(len(frame.index) for frame in buffered):
+            yield pd.concat(buffered)
+
+    def iter_rows(self, sheet_name, start=0):
+        """Yields `(index, record)` for the non-empty rows of the sheet, from the
+        row at position `start`."""
+        columns = self.get_columns(sheet_name)
+        if not columns:
+            return
+
+        Record = namedtuple("Record", columns, rename=True)
+
+        for df in self.iter_chunks(sheet_name, start=start):
+            for index, *values in df.itertuples(name=None):
+                yield index, Record._make(values)
@@ -0,0 +1,16 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from etat_civil.deeds.models import DeedType, Gender, OriginType, Role, vocabulary
+
+
+@receiver(post_delete, sender=DeedType)
+@receiver(post_delete, sender=Gender)
+@receiver(post_delete, sender=OriginType)
+@receiver(post_delete, sender=Role)
+@receiver(post_save, sender=DeedType)
+@receiver(post_save, sender=Gender)
+@receiver(post_save, sender=OriginType)
+@receiver(post_save, sender=Role)
+def clear_vocabulary(sender, **kwargs):
+    vocabulary.invalidate(sender)
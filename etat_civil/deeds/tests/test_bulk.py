@@ -0,0 +1,195 @@
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+import pytest
+from django.db.models import Q
+
+from etat_civil.deeds.bulk import BulkLoader
+from etat_civil.deeds.models import (
+    Deed,
+    DeedType,
+    Origin,
+    Party,
+    Person,
+    Sequence,
+)
+
+pytestmark = [pytest.mark.django_db, pytest.mark.usefixtures("geonames")]
+
+
+def person_values(person):
+    return (
+        person.name,
+        person.surname,
+        person.match_key,
+        person.unknown,
+        str(person.gender),
+        person.age,
+        person.birth_year,
+    )
+
+
+def deed_values(deed):
+    return (
+        deed.deed_type.title,
+        deed.n,
+        deed.date,
+        deed.place.geonames_id,
+        str(deed.source),
+        deed.notes,
+    )
+
+
+def snapshot():
+    return {
+        "deeds": Counter(deed_values(d) for d in Deed.objects.all()),
+        "persons": Counter(person_values(p) for p in Person.objects.all()),
+        "origins": Counter(
+            (
+                person_values(o.person),
+                o.place.geonames_id,
+                o.origin_type.title,
+                o.date,
+                o.is_date_computed,
+                o.order,
+            )
+            for o in Origin.objects.all()
+        ),
+        "parties": Counter(
+            (
+                deed_values(p.deed),
+                person_values(p.person),
+                p.role.title,
+                str(p.profession),
+            )
+            for p in Party.objects.all()
+        ),
+    }
+
+
+def load_sheets(data, loader):
+    loader.load_births(data.get_data_sheet("births"))
+    loader.load_marriages(data.get_data_sheet("marriages"))
+    loader.load_deaths(data.get_data_sheet("deaths"))
+
+
+def delete_all(data):
+    data.sources.all().delete()
+    Person.objects.all().delete()
+    Sequence.objects.all().delete()
+
+
+@pytest.mark.usefixtures("data")
+class TestBulkLoader:
+    def test_load_data(self, data):
+        data.load_data()
+        expected = snapshot()
+        assert sum(expected["deeds"].values()) > 0
+
+        delete_all(data)
+
+        loaded = data.load_data(bulk=True, batch_size=4)
+        assert loaded
+        assert snapshot() == expected
+
+    def test_load_data_twice(self, data):
+        load_sheets(data, data)
+        load_sheets(data, data)
+        expected = snapshot()
+
+        delete_all(data)
+
+        load_sheets(data, BulkLoader(data))
+        load_sheets(data, BulkLoader(data, batch_size=3))
+        assert snapshot() == expected
+
+    @pytest.mark.parametrize("upsert", [True, False])
+    def test_load_changed_rows(self, data, monkeypatch, upsert):
+        if not upsert:
+            monkeypatch.setattr(
+                "etat_civil.deeds.bulk.supports_upsert", lambda c: False
+            )
+
+        load_sheets(data, BulkLoader(data))
+        load_sheets(data, BulkLoader(data))
+        expected = snapshot()
+
+        delete_all(data)
+
+        load_sheets(data, BulkLoader(data))
+        # the rows that are not part of the natural keys changed since the import
+        Party.objects.update(profession=None)
+        # the unknown persons are created again by each import
+        Origin.objects.filter(person__unknown=False).update(
+            is_date_computed=Q(is_date_computed=False)
+        )
+
+        data.rejects = []
+        load_sheets(data, BulkLoader(data, batch_size=3))
+        assert not data.rejects
+        assert snapshot() == expected
+
+    def test_prefetch(self, data):
+        for name, surname in [
+            ("Jean", "Martin"),
+            ("Jean", "Dupont"),
+            ("Pierre", "Martin"),
+            ("Marie", None),
+            ("Marie", "Martin"),
+        ]:
+            Person.objects.create(name=name, surname=surname)
+
+        normalized = pd.DataFrame(
+            {
+                "n": [1, 2],
+                "father_name": ["Jean", "Marie"],
+                "father_surname": ["Martin", np.nan],
+            }
+        )
+
+        # the persons are fetched by name and surname together
+        loader = BulkLoader(data)
+        loader.prefetch(normalized, ["father_"])
+        assert {
+            (person.name, person.surname) for person in loader.persons.values()
+        } == {("Jean", "Martin"), ("Marie", None)}
+
+    def test_load_births(self, data):
+        loader = BulkLoader(data)
+        assert loader.load_births(None) is False
+
+        assert loader.load_births(data.get_data_sheet("births")) is True
+
+        deed_type = DeedType.get_birth()
+        assert Deed.objects.filter(deed_type=deed_type).count() == 9
+
+    def test_load_births_rejects(self, data, monkeypatch):
+        load_record = Person.load_record
+
+        def fail_on_marie(data, gender, role, deed, record, from_death_deed=False):
+            if record.name == "Marie":
+                raise ValueError("Failed to load the mother")
+            return load_record(data, gender, role, deed, record, from_death_deed)
+
+        monkeypatch.setattr(Person, "load_record", fail_on_marie)
+        data.load_births(data.get_data_sheet("births"))
+        monkeypatch.undo()
+        expected = snapshot()
+        assert sum(expected["deeds"].values()) == 8
+
+        delete_all(data)
+
+        loader = BulkLoader(data, batch_size=2)
+        load_person = loader.load_person
+
+        def fail_on_marie(gender, role, deed, record, from_death_deed=False):
+            if record.name == "Marie":
+                raise ValueError("Failed to load the mother")
+            return load_person(gender, role, deed, record, from_death_deed)
+
+        loader.load_person = fail_on_marie
+        loader.load_births(data.get_data_sheet("births"))
+        assert snapshot() == expected
+
+        assert [(r.sheet, r.row) for r in data.rejects] == [("births", 5)] * 2
@@ -0,0 +1,63 @@
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from etat_civil.deeds.dates import (
+    PRECISION_DAY,
+    PRECISION_MONTH,
+    PRECISION_YEAR,
+    DateParser,
+)
+
+
+class TestDateParser:
+    def test_parse(self):
+        parser = DateParser()
+
+        assert parser.parse("03/05/1818") == (pd.Timestamp(1818, 5, 3), PRECISION_DAY)
+        assert parser.parse(" 1818-05-03 ").date == pd.Timestamp(1818, 5, 3)
+        assert parser.parse("1818-05-03 00:00:00").date == pd.Timestamp(1818, 5, 3)
+        assert parser.parse(datetime(1818, 5, 3)).date == pd.Timestamp(1818, 5, 3)
+
+        assert parser.parse("05/1818") == (pd.Timestamp(1818, 5, 1), PRECISION_MONTH)
+        assert parser.parse("1818") == (pd.Timestamp(1818, 1, 1), PRECISION_YEAR)
+        assert parser.parse(1818) == (pd.Timestamp(1818, 1, 1), PRECISION_YEAR)
+
+        assert parser.parse("3 mai 1818") == (None, None)
+        assert parser.parse("23/06/0154") == (None, None)
+        assert parser.parse(18.5) == (None, None)
+        assert parser.parse(np.nan) == (None, None)
+        assert parser.parse(None) == (None, None)
+
+    def test_parse_formats(self):
+        parser = DateParser(formats=["%m/%d/%Y"], partial_formats=[])
+
+        assert parser.parse("03/05/1818").date == pd.Timestamp(1818, 3, 5)
+        assert parser.parse("1818") == (None, None)
+
+    def test_parse_dates(self):
+        parser = DateParser()
+        values = pd.Series(["03/05/1818", "1818-05-03", "x", None, "03/05/1818"])
+
+        dates = parser.parse_dates(values)
+        assert dates.dtype == "datetime64[ns]"
+        assert dates.tolist()[:2] == [pd.Timestamp(1818, 5, 3)] * 2
+        assert dates[2:4].isnull().all()
+        assert dates[4] == dates[0]
+
+        # each distinct value is parsed once
+        assert len(parser.lookup) == 3
+        assert parser.parse_dates(dates) is dates
+
+    def test_parse_precisions(self):
+        parser = DateParser()
+        values = pd.Series(["03/05/1818", "05/1818", "1818", "x", None])
+
+        assert parser.parse_precisions(values).tolist() == [
+            PRECISION_DAY,
+            PRECISION_MONTH,
+            PRECISION_YEAR,
+            None,
+            None,
+        ]
@@ -0,0 +1,181 @@
+import pandas as pd
+import pytest
+from django.core.files import File
+from openpyxl import load_workbook
+
+from etat_civil.deeds.bulk import BulkLoader
+from etat_civil.deeds.delta import DeltaImport, fingerprint_rows
+from etat_civil.deeds.models import (
+    Deed,
+    ImportRun,
+    Origin,
+    Party,
+    Person,
+    RowFingerprint,
+)
+from etat_civil.deeds.normalize import get_location_names
+from etat_civil.deeds.tests.test_bulk import delete_all, snapshot
+
+pytestmark = [pytest.mark.django_db, pytest.mark.usefixtures("geonames")]
+
+
+@pytest.fixture
+def changed_data_file(tmpdir):
+    """A copy of the test data with a birth changed and a marriage removed."""
+    workbook = load_workbook("data/raw/test.xlsx")
+    workbook["births"].cell(row=2, column=6).value = "Louis Joseph"
+    workbook["marriages"].delete_rows(3)
+
+    path = str(tmpdir.join("changed.xlsx"))
+    workbook.save(path)
+
+    return path
+
+
+def replace_data_file(data, path):
+    with open(path, "rb") as f:
+        data.data.save("changed.xlsx", File(f), save=False)
+
+
+@pytest.mark.usefixtures("data")
+class TestDeltaImport:
+    def test_load_data(self, data):
+        assert data.load_data(delta=True)
+        assert data.delta_report["inserted"] == 27
+        assert data.fingerprints.count() == 27
+        assert RowFingerprint.objects.filter(deed__isnull=True).count() == 0
+
+        expected = snapshot()
+
+        data.load_data(delta=True)
+        assert data.delta_report == {"unchanged": 27}
+        assert snapshot() == expected
+
+    def test_load_data_changed(self, data, changed_data_file):
+        data.load_data(delta=True)
+
+        replace_data_file(data, changed_data_file)
+        data.load_data(delta=True)
+        assert data.delta_report == {"unchanged": 25, "updated": 1, "deleted": 1}
+        assert data.fingerprints.count() == 26
+        assert Person.objects.filter(name="Louis Joseph").count() == 1
+
+        changed = snapshot()
+
+        delete_all(data)
+        data.fingerprints.all().delete()
+        data.load_data(bulk=True)
+        assert snapshot() == changed
+
+    def test_start_import(self, data, changed_data_file):
+        data.load_data(delta=True)
+        replace_data_file(data, changed_data_file)
+
+        run = data.start_import(delta=True)
+        assert run.mode == ImportRun.MODE_DELTA
+        assert data.delta_report == {"unchanged": 25, "updated": 1, "deleted": 1}
+        assert data.fingerprints.count() == 25
+
+        # only the changed row is split and its places resolved
+        assert data.get_chunk_names("births") == ["births/000000000"]
+        assert not data.get_chunk_names("marriages")
+        df = data.read_import_file("births/000000000")
+        assert len(df.index) == 1
+        assert data.read_import_file("places") == sorted(get_location_names(df))
+
+        while not data.resolve_places_chunk():
+            pass
+        while not data.load_chunk():
+            pass
+
+        run.refresh_from_db()
+        assert run.status == ImportRun.STATUS_COMPLETED
+        assert run.rows_read == 26
+        assert data.fingerprints.count() == 26
+        assert Person.objects.filter(name="Louis Joseph").count() == 1
+
+        changed = snapshot()
+
+        delete_all(data)
+        data.fingerprints.all().delete()
+        data.load_data(bulk=True)
+        assert snapshot() == changed
+
+    def test_load_data_duplicate_rows(self, data, tmpdir):
+        workbook = load_workbook("data/raw/test.xlsx")
+        sheet = workbook["births"]
+        sheet.append([cell.value for cell in sheet[2]])
+
+        path = str(tmpdir.join("duplicate.xlsx"))
+        workbook.save(path)
+        replace_data_file(data, path)
+
+        data.load_data(delta=True)
+        assert data.delta_report["inserted"] == 27
+        assert [(r.sheet, r.row) for r in data.rejects] == [("births", 11)]
+
+    def test_load_data_rejected(self, data, monkeypatch):
+        load_person = BulkLoader.load_person
+
+        def fail_on_louis(loader, gender, role, deed, record, from_death_deed=False):
+            if role.title == "father" and record.name == "Louis":
+                raise ValueError("Failed to load the father")
+            return load_person(loader, gender, role, deed, record, from_death_deed)
+
+        monkeypatch.setattr(BulkLoader, "load_person", fail_on_louis)
+        data.load_data(delta=True)
+        assert [(r.sheet, r.row) for r in data.rejects] == [("births", 2)]
+        assert data.fingerprints.count() == 26
+
+        # the rejected row is loaded once the cause of the reject is fixed
+        monkeypatch.undo()
+        data.load_data(delta=True)
+        assert data.delta_report == {"unchanged": 26, "inserted": 1}
+        assert data.fingerprints.count() == 27
+        assert Person.objects.filter(name="Louis", party_to__role__title="father")
+
+    def test_remove(self, data):
+        data.load_data(delta=True)
+
+        fp = data.fingerprints.filter(sheet="births").first()
+        party = Party.objects.filter(deed=fp.deed).first()
+        person = party.person
+        deed_date = fp.deed.date
+
+        # the person is also party to a deed of another row, that is kept
+        other = data.fingerprints.exclude(deed=fp.deed).first().deed
+        Party.objects.create(deed=other, person=person, role=party.role)
+        assert person.origin_from.filter(date=deed_date).exists()
+
+        DeltaImport(data).remove([fp])
+
+        assert Person.objects.filter(pk=person.pk).exists()
+        assert not Origin.objects.filter(person=person, date=deed_date).exists()
+
+    def test_load_data_after_full_import(self, data):
+        data.load_data()
+        deeds = Deed.objects.count()
+
+        data.load_data(delta=True)
+        assert Deed.objects.count() == deeds
+        assert data.fingerprints.filter(deed__isnull=False).count() == 27
+
+
+def test_fingerprint_rows():
+    df = pd.DataFrame(
+        {
+            "deed_number": [1, 1, 2],
+            "deed_date": ["1818-05-03", "1818-05-03", "1818-05-03"],
+            "comments": ["a", "b", "a"],
+        }
+    )
+    fingerprints = list(fingerprint_rows(df))
+
+    assert [index for index, _, _ in fingerprints] == [0, 1, 2]
+    assert fingerprints[0][1] == fingerprints[1][1]
+    assert fingerprints[0][2] != fingerprints[1][2]
+    assert fingerprints[0][1] != fingerprints[2][1]
+
+    # the same rows read in a chunk where the numbers are floats
+    df["deed_number"] = df["deed_number"].astype(float)
+    assert list(fingerprint_rows(df)) == fingerprints
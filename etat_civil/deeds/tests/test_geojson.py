@@ -0,0 +1,115 @@
+import datetime
+import json
+
+import pytest
+from django.core.management import call_command
+
+from etat_civil.deeds.geojson import iter_feature_collection, to_feature_collection
+from etat_civil.deeds.models import Gender, Origin, OriginType, Person
+from etat_civil.geonames_place.models import ClassDescription, Country, Place
+
+pytestmark = pytest.mark.django_db
+
+
+def persons_to_geojson():
+    """The export of the persons one by one, with the queries of each person."""
+    features = [person.to_geojson() for person in Person.objects.all()]
+
+    return {"type": "FeatureCollection", "features": [f for f in features if f]}
+
+
+def create_place(geonames_id, address, lat=None, lon=None, located=True):
+    place = Place(geonames_id=geonames_id, address=address, lat=lat, lon=lon)
+    place.update_from_geonames = False
+
+    if located:
+        place.class_description, _ = ClassDescription.objects.get_or_create(
+            title="city"
+        )
+        place.country, _ = Country.objects.get_or_create(name="France", code="FR")
+
+    place.save()
+
+    return place
+
+
+def create_origins(count):
+    marseille = create_place(1, "Marseille", lat=43.296482, lon=5.369780)
+    toulon = create_place(2, "Toulon", lat=43.124228, lon=5.928)
+    nowhere = create_place(3, "Nowhere", located=False)
+
+    birth = OriginType.get_birth()
+    domicile = OriginType.get_domicile()
+
+    for idx in range(count):
+        person = Person.objects.create(
+            name="Marie",
+            surname=f"Martin {idx % 3}",
+            age=30 if idx % 2 else None,
+            gender=Gender.get_f() if idx % 2 else None,
+        )
+        # a person without origins has no feature
+        if idx % 4 == 3:
+            continue
+
+        places = [
+            (birth, marseille),
+            (domicile, nowhere),
+            (domicile, marseille),
+            (domicile, toulon),
+        ]
+        for order, (origin_type, place) in enumerate(places[: idx % 4 + 1]):
+            Origin.objects.create(
+                person=person,
+                place=place,
+                origin_type=origin_type,
+                date=datetime.date(1800 + idx, 1, 1),
+                is_date_computed=bool(order),
+                order=order,
+            )
+
+
+class TestGeoJSON:
+    def test_to_feature_collection(self):
+        create_origins(12)
+
+        expected = json.dumps(persons_to_geojson(), indent=2, sort_keys=True)
+        assert json.dumps(to_feature_collection(), indent=2, sort_keys=True) == expected
+
+    @pytest.mark.parametrize("count", [0, 4, 12])
+    def test_query_count(self, count, django_assert_num_queries):
+        create_origins(count)
+
+        with django_assert_num_queries(1):
+            features = to_feature_collection()["features"]
+
+        assert len(features) == count - count // 4
+
+    @pytest.mark.parametrize("count", [0, 1, 12])
+    @pytest.mark.parametrize("indent", [None, 2])
+    def test_iter_feature_collection(self, count, indent):
+        create_origins(count)
+
+        expected = json.dumps(
+            to_feature_collection(),
+            indent=indent,
+            separators=(",", ":") if indent is None else None,
+            sort_keys=True,
+        )
+        assert "".join(iter_feature_collection(indent=indent)) == expected
+
+
+def test_export_geojson(tmpdir, capsys):
+    create_origins(12)
+    expected = to_feature_collection()
+
+    output = tmpdir.join("geojson.json")
+    call_command("export_geojson", "--output", output.strpath)
+    assert output.read() == json.dumps(expected, indent=2, sort_keys=True)
+
+    call_command("export_geojson", "--output", output.strpath, "--compact")
+    assert "\n" not in output.read()
+    assert json.loads(output.read()) == expected
+
+    call_command("export_geojson", "--compact")
+    assert json.loads(capsys.readouterr().out) == expected
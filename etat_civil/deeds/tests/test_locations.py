@@ -0,0 +1,76 @@
+import pandas as pd
+
+from etat_civil.deeds.locations import LocationRegistry
+
+
+def get_locations_df():
+    return pd.DataFrame(
+        {
+            "location": ["Paris", "Alexandria", "Abouzabel", "Paris, France"],
+            "geonames_id": [2988507, None, None, 1],
+            "lat": [48.853, None, 30.242, None],
+            "lon": [2.349, None, 31.411, None],
+            "display_name": ["1: Paris", "2: Alexandria ", "3: Abouzabel", "1: Paris"],
+        }
+    )
+
+
+class TestLocationRegistry:
+    def test_from_dataframe(self):
+        locations = LocationRegistry.from_dataframe(get_locations_df())
+        assert len(locations) == 3
+
+        location = locations.get("1: Paris")
+        assert location.address == "Paris"
+        assert location.geonames_id == 2988507
+        assert location.has_coordinates
+
+        location = locations.get("2: Alexandria")
+        assert location.geonames_id is None
+        assert not location.has_coordinates
+
+        assert locations.get("Port Said") is None
+        assert not locations.changed
+
+        df = get_locations_df().set_index("display_name")
+        assert len(LocationRegistry.from_dataframe(df)) == 3
+
+    def test_add(self):
+        locations = LocationRegistry.from_dataframe(get_locations_df())
+
+        location = locations.add("Port Said")
+        assert location.address == "Port Said"
+        assert "Port Said" in locations
+        assert locations.changed == {"Port Said"}
+
+        assert locations.add("1: Paris").geonames_id == 2988507
+        assert locations.changed == {"Port Said"}
+
+    def test_set_geonames_id(self):
+        locations = LocationRegistry.from_dataframe(get_locations_df())
+
+        locations.set_geonames_id("1: Paris", 2988507)
+        assert not locations.changed
+
+        locations.set_geonames_id("2: Alexandria", 361058)
+        assert locations.get("2: Alexandria").geonames_id == 361058
+        assert locations.changed == {"2: Alexandria"}
+
+    def test_to_csv(self, tmpdir):
+        locations = LocationRegistry.from_dataframe(get_locations_df())
+        locations.set_geonames_id("Port Said", 358619)
+
+        path = tmpdir.join("locations.tsv").strpath
+        locations.to_csv(path, sep="\t")
+
+        df = pd.read_csv(path, sep="\t")
+        assert df["display_name"].tolist() == [
+            "1: Paris",
+            "2: Alexandria",
+            "3: Abouzabel",
+            "Port Said",
+        ]
+
+        written = LocationRegistry.from_dataframe(df)
+        assert written.get("Port Said").geonames_id == 358619
+        assert written.get("3: Abouzabel").lat == 30.242
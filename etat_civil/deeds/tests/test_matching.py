@@ -0,0 +1,124 @@
+import pytest
+from django.core.management import call_command
+
+from etat_civil.deeds.matching import BlockingIndex, normalize_name, phonetic_key
+from etat_civil.deeds.models import Gender, Origin, Party, Person
+from etat_civil.deeds.tests.test_bulk import delete_all, snapshot
+
+pytestmark = [pytest.mark.django_db, pytest.mark.usefixtures("geonames")]
+
+
+def test_normalize_name():
+    assert normalize_name(None) is None
+    assert normalize_name(" Léon-Marie ") == "leon marie"
+    assert normalize_name("--") is None
+
+
+def test_phonetic_key():
+    assert phonetic_key(None) is None
+    assert phonetic_key("Dupont") == "D153"
+    assert phonetic_key("Dupond") == "D153"
+    assert phonetic_key("Du Pont") == "D153"
+    assert phonetic_key("Lefèvre") == phonetic_key("Lefebvre")
+    assert phonetic_key("Martin") != phonetic_key("Moreau")
+
+
+class TestBlockingIndex:
+    def test_match(self):
+        index = BlockingIndex(window=1)
+
+        dupont = Person(name="Jean", surname="Dupont", birth_year=1800)
+        dupond = Person(name="Jean", surname="Dupond", birth_year=1801)
+        index.add(dupont)
+        index.add(dupond)
+        index.add(Person(name="Jean", surname="Dupont", unknown=True))
+        index.add(Person(name=None, surname="Dupont", birth_year=1800))
+        assert len(index) == 2
+
+        assert index.match("Jean", "Dupont", None, 1801) is dupont
+        assert index.match("jean", "Dupond", None, 1802) is dupond
+        assert index.match("Jean", "Du Pont", None, 1799) is dupont
+        assert index.match("Jean", "Dupont", None, 1803) is None
+        assert index.match("Jean", "Dupont", None, None) is None
+        assert index.match("Pierre", "Dupont", None, 1800) is None
+        assert index.match("Jean", "Dupont", 1, 1800) is None
+
+    def test_find_duplicates(self):
+        index = BlockingIndex(window=1)
+
+        persons = [
+            Person(pk=1, name="Jean", surname="Dupont", birth_year=1800),
+            Person(pk=2, name="Jean", surname="Dupond", birth_year=1801),
+            Person(pk=3, name="Jean", surname="Dupont", birth_year=1802),
+            Person(pk=4, name="Jean", surname="Dupont", birth_year=1810),
+            Person(pk=5, name="Marie", surname="Martin", birth_year=None),
+            Person(pk=6, name="Marie", surname="Martain", birth_year=None),
+        ]
+        for person in persons:
+            index.add(person)
+
+        # 3 matches 2 but not 1, the centre of the group of 2
+        groups = index.find_duplicates()
+        assert [[p.pk for p in group] for group in groups] == [[1, 2], [5, 6]]
+
+
+class TestPerson:
+    def test_match_person(self):
+        gender = Gender.get_m()
+        person = Person.objects.create(
+            name="Jean", surname="Dupont", gender=gender, birth_year=1800
+        )
+        assert person.match_key == "D153"
+
+        assert Person.match_person("Jean", "Dupond", gender, 1801) == person
+        assert Person.match_person("Jean", "Dupond", gender, 1802) is None
+        assert Person.match_person("Jean", "Dupond", gender, 1802, window=2) == person
+        assert Person.match_person("Jean", "Dupond", None, 1800) is None
+        assert Person.match_person("Jean", None, gender, 1800) is None
+
+    def test_merge(self, deed):
+        person = Person.objects.create(name="Jean", surname="Dupont", birth_year=1800)
+        duplicate = Person.objects.create(
+            name="Jean", surname="Dupond", birth_year=1801
+        )
+
+        place = deed.place
+        for p in [person, duplicate]:
+            Origin.objects.create(
+                person=p, place=place, origin_type_id=1, is_date_computed=False,
+            )
+            Party.objects.create(person=p, deed=deed, role_id=1)
+
+        assert Person.merge(person, [person, duplicate]) == 1
+        assert not Person.objects.filter(pk=duplicate.pk).exists()
+        assert person.origin_from.count() == 1
+        # the duplicate was party to the same deed with the same role
+        assert person.party_to.count() == 1
+
+
+@pytest.mark.usefixtures("data")
+class TestMatchPersons:
+    def test_load_data(self, data, settings):
+        settings.DEEDS_MATCH_PERSONS = True
+
+        data.load_data()
+        expected = snapshot()
+        assert sum(expected["persons"].values()) > 0
+
+        delete_all(data)
+        data.load_data(bulk=True, batch_size=4)
+        assert snapshot() == expected
+
+    def test_dedup_persons(self, data, capsys):
+        Person.objects.create(name="Jean", surname="Dupont", birth_year=1800)
+        Person.objects.create(name="Jean", surname="Dupond", birth_year=1801)
+
+        call_command("dedup_persons")
+        assert (
+            "1 groups of matching persons, 0 persons merged" in capsys.readouterr().out
+        )
+        assert Person.objects.filter(name="Jean").count() == 2
+
+        call_command("dedup_persons", "--merge")
+        assert "1 persons merged" in capsys.readouterr().out
+        assert Person.objects.filter(name="Jean").count() == 1
@@ -0,0 +1,27 @@
+import pytest
+from django.db import connection
+
+from etat_civil.deeds.metrics import ImportMetrics
+
+pytestmark = pytest.mark.django_db
+
+
+class TestImportMetrics:
+    def test_stage(self):
+        metrics = ImportMetrics()
+
+        with metrics.record():
+            with metrics.stage("write"):
+                with metrics.stage("parse"):
+                    connection.cursor().execute("SELECT 1")
+
+                connection.cursor().execute("SELECT 1")
+                connection.cursor().execute("SELECT 1")
+
+            connection.cursor().execute("SELECT 1")
+
+        connection.cursor().execute("SELECT 1")
+
+        assert metrics.queries == {"parse": 1, "write": 2, None: 1}
+        assert set(metrics.times.keys()) == {"parse", "write"}
+        assert metrics.stack == []
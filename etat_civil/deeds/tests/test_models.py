@@ -1,5 +1,8 @@
+from unittest.mock import patch
+
 import pandas as pd
 import pytest
+from django.core.cache.backends.locmem import LocMemCache
 from django.utils.dateparse import parse_date
 
 from etat_civil.deeds.models import (
@@ -7,18 +10,63 @@ from etat_civil.deeds.models import (
     Deed,
     DeedType,
     Gender,
+    ImportRun,
     Person,
+    PlaceAlias,
     Role,
     Source,
     Origin,
     OriginType,
     Party,
+    Sequence,
+    Vocabulary,
+    vocabulary,
 )
+from etat_civil.geonames_place.models import Place
 
 pytestmark = pytest.mark.django_db
 
 
-@pytest.mark.usefixtures("data")
+class TestVocabulary:
+    def test_get(self, django_assert_num_queries):
+        vocabulary.clear()
+
+        with django_assert_num_queries(1):
+            assert Role.get_father().title == "father"
+            assert Role.get_mother().title == "mother"
+            assert Role.get_father() is Role.get_father()
+
+        with pytest.raises(Role.DoesNotExist):
+            vocabulary.get(Role, "witness")
+
+    def test_clear(self):
+        role = Role.get_father()
+        assert Role in vocabulary.cache
+
+        role.save()
+        assert Role not in vocabulary.cache
+        assert Role.get_father() is not role
+
+    def test_invalidate(self):
+        shared_cache = LocMemCache("vocabulary", {})
+        shared_cache.clear()
+        now = [0]
+
+        # the vocabularies of two processes
+        first, second = [
+            Vocabulary(shared_cache, check_interval=5, clock=lambda: now[0])
+            for _ in range(2)
+        ]
+        role = second.get(Role, "father")
+
+        first.invalidate(Role)
+        assert second.get(Role, "father") is role
+
+        now[0] = 5
+        assert second.get(Role, "father") is not role
+
+
+@pytest.mark.usefixtures("data", "geonames")
 class TestData:
     def test_load_data(self, data):
         no_data = Data(title="No data")
@@ -31,6 +79,54 @@ class TestData:
         deed_type = DeedType.get_birth()
         assert Deed.objects.filter(deed_type=deed_type).count() == 9
 
+        run = data.import_runs.get()
+        assert run.status == ImportRun.STATUS_COMPLETED
+        assert run.mode == ImportRun.MODE_ROWS
+        assert run.rows_read == 27
+        assert run.rows_per_second > 0
+        assert run.write_queries > 0
+        assert run.queries >= run.write_queries + run.places_queries
+        assert sum(data.places_report.values()) == (
+            run.places_cache
+            + run.places_geonames_id
+            + run.places_name
+            + run.places_lat_lon
+            + run.places_unresolved
+        )
+        assert run.rejects.count() == run.rows_failed
+
+    def test_load_deed(self, data, births_df, monkeypatch):
+        load_record = Deed.load_record
+
+        def fail_on_row(data, source, deed_type, parties, deed_record, *args, **kw):
+            deed = load_record(
+                data, source, deed_type, parties, deed_record, *args, **kw
+            )
+            if deed_record.n == int(births_df.iloc[3]["deed_number"]):
+                raise ValueError("Invalid row")
+            return deed
+
+        monkeypatch.setattr(Deed, "load_record", fail_on_row)
+
+        parties = Deed.get_birth_parties()
+        data.locations_df = data.get_data_sheet("locations").set_index("display_name")
+        assert data.load_deed(None, DeedType.get_birth(), parties) is False
+        assert data.load_deed(
+            births_df, DeedType.get_birth(), parties, "births", commit_size=2
+        )
+
+        assert Deed.objects.count() == 8
+        assert not Deed.objects.filter(n=births_df.iloc[3]["deed_number"]).exists()
+
+        reject = data.rejects[0]
+        assert (reject.sheet, reject.row, reject.error) == ("births", 5, "Invalid row")
+
+        # the places of the rejected row are kept with their aliases
+        place_ids = [pk for pk in data.place_ids.values() if pk]
+        assert place_ids
+        assert Place.objects.filter(pk__in=place_ids).count() == len(set(place_ids))
+        assert PlaceAlias.objects.filter(name__in=data.place_ids.keys()).exists()
+
     def test_get_data_sheet(self, data):
         df = data.get_data_sheet(None)
         assert df is None
@@ -49,6 +145,162 @@ class TestData:
         df = data.convert_date_columns(df)
         assert df is not None
         assert df["date"].dtype == "datetime64[ns]"
+        assert df["date"][0] == df["date"][1]
+
+        df = pd.DataFrame({"deed_date": ["03/05/1818", "not a date"]})
+        df = data.convert_date_columns(df)
+        assert df["deed_date"].dtype == "datetime64[ns]"
+        assert df["deed_date"][0] == pd.Timestamp(1818, 5, 3)
+        assert pd.isnull(df["deed_date"][1])
+
+    def test_resolve_places(self, data, django_assert_num_queries):
+        with data.open_data() as reader:
+            names = data.get_location_names(reader)
+            report = data.resolve_places(reader)
+
+        assert "0051: Alexandrie" in names
+        assert set(data.place_ids.keys()) == names
+        assert sum(report.values()) == len(names)
+        assert set(report.keys()) <= {0, 1, 2, 3, -1}
+
+        with django_assert_num_queries(0):
+            for name in names:
+                place, code = data.get_place(f" {name} ")
+                assert code in (0, -1)
+                if place:
+                    assert place.pk == data.place_ids[name]
+
+    def test_purge(self, data, django_assert_max_num_queries):
+        data.load_data(bulk=True, delta=True)
+        deeds = Deed.objects.filter(source__data=data)
+        person = deeds[0].parties.first()
+
+        expected = {
+            "sources": data.sources.count(),
+            "deeds": deeds.count(),
+            "parties": Party.objects.count(),
+            "persons": Person.objects.count() - 1,
+            "origins": Origin.objects.exclude(person=person).count(),
+            "fingerprints": data.fingerprints.count(),
+        }
+
+        # a person that is party to a deed of other data is kept
+        other = Data.objects.create(title="Other data", data=data.data)
+        deed = Deed.objects.create(
+            deed_type=deeds[0].deed_type,
+            date=deeds[0].date,
+            place=deeds[0].place,
+            source=Source.objects.create(data=other, classmark="A", microfilm="B"),
+        )
+        Party.objects.create(deed=deed, person=person, role=Role.get_father())
+
+        with django_assert_max_num_queries(12):
+            assert data.purge() == expected
+
+        assert not data.sources.exists()
+        assert not data.fingerprints.exists()
+        assert list(Person.objects.all()) == [person]
+        assert Party.objects.get().deed == deed
+
+    def test_load_chunk(self, data, settings):
+        from etat_civil.deeds.tests.test_bulk import delete_all, snapshot
+
+        data.load_data(bulk=True)
+        expected = snapshot()
+        delete_all(data)
+        PlaceAlias.objects.all().delete()
+
+        settings.DEEDS_IMPORT_JOB_CHUNK_SIZE = 4
+        run = data.start_import()
+        assert run.mode == ImportRun.MODE_BULK
+        assert data.get_chunk_names("births") == [
+            "births/000000000",
+            "births/000000004",
+            "births/000000008",
+        ]
+
+        assert data.resolve_places_chunk(size=10) is False
+        assert data.checkpoints.get(sheet="places").row == 10
+        while not data.resolve_places_chunk(size=10):
+            pass
+        assert PlaceAlias.objects.exists()
+
+        # the places of the rows are the aliases, they are not geocoded again
+        with patch.object(Data, "query_geonames", side_effect=ValueError):
+            assert data.load_chunk() is False
+
+        checkpoint = data.checkpoints.get(sheet="births")
+        assert checkpoint.row == 4
+        assert checkpoint.loaded == 4
+        assert Deed.objects.count() == 4
+        assert data.fingerprints.count() == 4
+
+        # resumes from the checkpoints
+        assert data.start_import(resume=True) == run
+        assert data.get_chunk_names("births") == [
+            "births/000000004",
+            "births/000000008",
+        ]
+        while not data.resolve_places_chunk():
+            pass
+
+        # the sheets are loaded one after the other
+        def get_loaded():
+            return dict(data.checkpoints.values_list("sheet", "loaded"))
+
+        loaded = []
+        while True:
+            before = get_loaded()
+            if data.load_chunk():
+                break
+            after = get_loaded()
+            loaded.extend(sheet for sheet in after if after[sheet] != before[sheet])
+        assert loaded == ["births"] * 2 + ["marriages"] * 3 + ["deaths"] * 3
+
+        assert data.checkpoints.get(sheet="births").loaded == 9
+        assert not data.get_chunk_names("deaths")
+        assert snapshot() == expected
+
+        run.refresh_from_db()
+        assert run.status == ImportRun.STATUS_COMPLETED
+        assert run.rows_read == 27
+        assert run.write_queries > 0
+        assert run.places_cache + run.places_unresolved > 0
+        assert run.rejects.count() == run.rows_failed
+
+        # the rows are not loaded again by an incremental import
+        data.load_data(delta=True)
+        assert data.delta_report["unchanged"] == data.fingerprints.count()
+        assert not data.delta_report["inserted"]
+        assert snapshot() == expected
+
+    def test_load_chunk_sheets(self, data, settings):
+        from etat_civil.deeds.tests.test_bulk import delete_all, snapshot
+
+        data.load_data(bulk=True)
+        expected = snapshot()
+        delete_all(data)
+
+        settings.DEEDS_IMPORT_JOB_CHUNK_SIZE = 4
+        run = data.start_import()
+        while not data.resolve_places_chunk():
+            pass
+
+        # the chunks of the sheets are loaded in turn, as concurrent jobs would
+        sheet_names = ["deaths", "marriages", "births"]
+        while sheet_names:
+            for sheet_name in list(sheet_names):
+                if data.load_chunk(sheet_name):
+                    sheet_names.remove(sheet_name)
+
+            run.refresh_from_db()
+            if sheet_names:
+                assert run.status == ImportRun.STATUS_RUNNING
+
+        assert run.status == ImportRun.STATUS_COMPLETED
+        assert not data.get_chunk_names("births")
+        assert data.fingerprints.count() == 27
+        assert snapshot() == expected
 
     def test_load_births(self, data):
         loaded = data.load_births(None)
@@ -131,6 +383,42 @@ class TestData:
         assert p.geonames_id == -302420314110
         assert r == 3
 
+    def test_get_place_alias(self, data, django_assert_num_queries):
+        data.locations_df = pd.DataFrame(
+            {
+                "location": ["Abouzabel", "Alexandria"],
+                "geonames_id": [None, None],
+                "lat": [30.242, 31.2],
+                "lon": [31.411, 29.9],
+                "display_name": ["3: Abouzabel", "2: Alexandria"],
+            }
+        ).set_index("display_name")
+
+        p, r = data.get_place("3: Abouzabel")
+        assert r == 3
+
+        alias = PlaceAlias.objects.get(name="3: Abouzabel")
+        assert alias.place == p
+        assert alias.source == data
+
+        other = Place.objects.create(
+            geonames_id=-1, address="Abu Zaabal", update_from_geonames=False
+        )
+        alias.place = other
+        alias.save()
+
+        with django_assert_num_queries(1):
+            p, r = data.get_place("3: Abouzabel")
+        assert p == other
+        assert r == 0
+
+        PlaceAlias.objects.create(name="2: Alexandria", place=other)
+        data.aliased_places = PlaceAlias.get_places(["2: Alexandria"])
+        with django_assert_num_queries(0):
+            p, r = data.get_place("2: Alexandria")
+        assert p == other
+        assert r == 0
+
 
 @pytest.mark.usefixtures("data")
 class TestSource:
@@ -365,6 +653,10 @@ class TestPerson:
         assert person is not None
         assert person.name == "Unknown"
         assert person.unknown
+        assert person.surname == "0"
+
+        person = Person.load_person(data, label, gender, role, deed, row)
+        assert person.surname == "1"
 
     def test_get_name_field(self, births_df):
         row = births_df.iloc[0]
@@ -568,3 +860,21 @@ class TestParty:
         assert Party.get_profession(None, None) is None
         assert Party.get_profession("mother_", births_df.iloc[0]) is None
         assert Party.get_profession("father_", births_df.iloc[7]).title == "Cafetier"
+
+
+class TestSequence:
+    def test_reserve(self):
+        assert list(Sequence.reserve("test")) == [1]
+        assert list(Sequence.reserve("test", count=3)) == [2, 3, 4]
+        assert list(Sequence.reserve("other", initial=lambda: 10)) == [11]
+
+    def test_release(self):
+        numbers = Sequence.reserve("test", count=5)
+        assert Sequence.release("test", numbers[2:])
+        assert list(Sequence.reserve("test")) == [3]
+
+        numbers = Sequence.reserve("test", count=2)
+        Sequence.reserve("test")
+        assert not Sequence.release("test", numbers)
+        assert not Sequence.release("test", range(0))
+        assert list(Sequence.reserve("test")) == [7]
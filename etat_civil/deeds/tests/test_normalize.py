@@ -0,0 +1,103 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from etat_civil.deeds.models import Deed, Person
+from etat_civil.deeds.normalize import (
+    get_name_field,
+    iter_records,
+    normalize_row,
+    normalize_sheet,
+    to_date,
+    to_numbers,
+)
+
+pytestmark = pytest.mark.django_db
+
+
+def as_date(value):
+    return value.date() if hasattr(value, "date") else value
+
+
+def as_values(record):
+    return [None if pd.isnull(value) else value for value in record]
+
+
+@pytest.mark.usefixtures("data")
+class TestNormalize:
+    @pytest.mark.parametrize(
+        "sheet_name, labels",
+        [
+            ("births", ["father_", "mother_"]),
+            ("marriages", ["groom_", "bride_"]),
+            ("deaths", [""]),
+        ],
+    )
+    def test_normalize_sheet(self, data, sheet_name, labels):
+        df = data.get_data_sheet(sheet_name)
+        normalized = normalize_sheet(df, labels)
+
+        assert len(normalized.index) == len(df.index)
+
+        for (index, deed, persons), (_, row) in zip(
+            iter_records(normalized, labels), df.iterrows()
+        ):
+            deed_date = as_date(Deed.get_deed_date(row))
+
+            assert deed.n == Deed.get_deed_n(row)
+            assert deed.date == deed_date
+            assert deed.notes == str(Deed.get_deed_notes(row))
+
+            for label, person in zip(labels, persons):
+                name = Person.get_name_field(f"{label}name", row)
+                age = Person.get_age(label, row)
+                birth_date = as_date(Person.get_birth_date(deed_date, age))
+
+                assert person.name == name
+                assert person.surname == Person.get_name_field(f"{label}surname", row)
+                assert person.unknown == (name == "Unknown")
+                assert person.age == age
+                assert person.birth_date == birth_date
+                assert person.previous_domicile_date == as_date(
+                    birth_date + (deed_date - birth_date) / 2
+                )
+
+                if age:
+                    assert person.birth_year == birth_date.year
+                else:
+                    assert person.birth_year is None
+
+    def test_normalize_row(self, data):
+        labels = ["father_", "mother_"]
+        df = data.get_data_sheet("births")
+
+        for (_, deed, persons), (_, row) in zip(
+            iter_records(normalize_sheet(df, labels), labels), df.iterrows()
+        ):
+            row_deed, row_persons = normalize_row(row, labels)
+
+            assert as_values(row_deed) == as_values(deed)
+            assert list(map(as_values, row_persons)) == list(map(as_values, persons))
+
+    def test_to_numbers(self):
+        values = pd.Series(["35", " 36 ", "3.5", "x", 12.7, np.nan], dtype=object)
+        numbers = to_numbers(values)
+
+        assert numbers.tolist()[:2] == [35, 36]
+        assert numbers[2:4].isnull().all()
+        assert numbers[4] == 12.7
+        assert pd.isnull(numbers[5])
+
+    def test_get_name_field(self):
+        df = pd.DataFrame({"name": [" Louis ", "inconnu", np.nan], "surname": np.nan})
+
+        assert get_name_field(df, "name").tolist() == ["Louis", "Unknown", None]
+        assert get_name_field(df, "surname").tolist() == [None, None, None]
+
+    def test_to_date(self):
+        assert to_date(None) is None
+        assert to_date(np.nan) is None
+        assert to_date("not a date") is None
+        assert to_date("1818-05-03").year == 1818
+        assert to_date("03/05/1818").month == 5
+        assert to_date(pd.Timestamp("1818-05-03")).day == 3
@@ -0,0 +1,82 @@
+import shutil
+
+import pytest
+from django.core.management import call_command
+
+from etat_civil.deeds.models import (
+    UNKNOWN_PERSON_SEQUENCE,
+    Data,
+    Deed,
+    ImportRun,
+    Person,
+    PlaceAlias,
+    Profession,
+    Sequence,
+)
+from etat_civil.deeds.parallel import get_professions, prepare_imports, split_datas
+from etat_civil.deeds.readers import open_reader
+
+pytestmark = [pytest.mark.django_db, pytest.mark.usefixtures("geonames")]
+
+
+def test_get_professions():
+    with open_reader("data/raw/test.xlsx") as reader:
+        professions = get_professions(reader)
+
+    assert professions
+    assert all(title == title.strip() for title in professions)
+
+
+@pytest.mark.usefixtures("data")
+def test_prepare_imports(data):
+    deed_keys = prepare_imports([data])
+
+    assert PlaceAlias.objects.filter(source=data).exists()
+
+    with data.open_data() as reader:
+        professions = get_professions(reader)
+    assert Profession.objects.filter(title__in=professions).count() == len(professions)
+
+    # the numbers of the unknown persons are reserved before the import
+    numbers = data.unknown_numbers
+    assert len(numbers) > 0
+    sequence = Sequence.objects.get(name=UNKNOWN_PERSON_SEQUENCE)
+
+    data.load_data(bulk=True)
+    unknown = Person.objects.filter(unknown=True, surname__regex=r"^\d+$")
+    assert unknown.count() == len(numbers)
+    assert {int(p.surname) for p in unknown} == set(numbers)
+    assert Sequence.objects.get(pk=sequence.pk).value == sequence.value
+
+    assert len(deed_keys[data.pk]) == Deed.objects.count()
+
+
+def test_split_datas():
+    datas = [Data(pk=pk) for pk in range(4)]
+    deed_keys = {0: {1, 2}, 1: {3}, 2: {2, 4}, 3: {4}}
+
+    parallel, sequential = split_datas(datas, deed_keys)
+    assert parallel == datas[:2]
+    assert sequential == datas[2:]
+
+
+def test_import_data(tmpdir, capsys):
+    for name in ["a.xlsx", "b.xlsx"]:
+        shutil.copy("data/raw/test.xlsx", tmpdir.join(name).strpath)
+
+    call_command("import_data", "Cities", tmpdir.strpath, "--bulk", "--workers", "2")
+
+    out = capsys.readouterr().out
+    assert "Importing 2 data files..." in out
+    assert "Cities: a: completed, 27 rows read, 0 rejected" in out
+    assert "Cities: b: completed, 27 rows read, 27 rejected" in out
+
+    assert Data.objects.filter(title__startswith="Cities: ").count() == 2
+    assert ImportRun.objects.filter(status=ImportRun.STATUS_COMPLETED).count() == 2
+
+    # the deeds of b are the deeds of a, they are rejected and stay with a
+    assert Deed.objects.count() > 0
+    assert (
+        Deed.objects.count()
+        == Deed.objects.filter(source__data__title="Cities: a").count()
+    )
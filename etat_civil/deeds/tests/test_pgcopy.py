@@ -0,0 +1,167 @@
+import csv
+import io
+
+import pytest
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.db.backends.utils import CursorWrapper
+
+from etat_civil.deeds import pgcopy
+from etat_civil.deeds.bulk import BulkLoader
+from etat_civil.deeds.metrics import ImportMetrics
+from etat_civil.deeds.models import Data, Deed, ImportRun, Source
+from etat_civil.deeds.pgcopy import CopyLoader, supports_copy
+from etat_civil.deeds.tests.test_bulk import delete_all, load_sheets, snapshot
+
+pytestmark = [pytest.mark.django_db, pytest.mark.usefixtures("geonames")]
+
+
+class RecordingCursor:
+    """Database cursor that records the statements of the `CopyLoader` and the
+    rows it copies, and answers its queries from `results`, so that the SQL can be
+    checked without PostgreSQL."""
+
+    def __init__(self, results):
+        self.results = results
+        self.statements = []
+        self.rows = []
+        self.result = []
+
+    def execute(self, sql, params=None):
+        self.statements.append((sql, params))
+        self.result = self.results.pop(0) if sql.startswith("SELECT") else []
+
+    def copy_expert(self, sql, buffer):
+        self.statements.append((sql, None))
+        self.rows = list(csv.reader(io.StringIO(buffer.read())))
+
+    def fetchall(self):
+        return self.result
+
+    def close(self):
+        pass
+
+
+@pytest.mark.usefixtures("data")
+class TestCopyLoader:
+    def test_create_sql(self, data, monkeypatch):
+        recording = RecordingCursor([[(11,), (12,)], [(0, 11), (1, 5)]])
+        monkeypatch.setattr(pgcopy, "supports_copy", lambda connection: True)
+        monkeypatch.setattr(
+            connection, "cursor", lambda: CursorWrapper(recording, connection)
+        )
+
+        sources = [
+            Source(data=data, classmark="a", microfilm="1"),
+            Source(data=data, classmark="b", microfilm="2"),
+            Source(data=data, classmark="a", microfilm="1"),
+        ]
+
+        metrics = ImportMetrics()
+        with metrics.record(), metrics.stage("write"):
+            CopyLoader(data).create(Source, sources)
+
+        staging = '"staging_deeds_source"'
+        columns = '"id", "created", "modified", "data_id", "classmark", "microfilm"'
+        assert recording.statements == [
+            (
+                "SELECT nextval(pg_get_serial_sequence(%s, %s)) "
+                "FROM generate_series(1, %s)",
+                ["deeds_source", "id", 2],
+            ),
+            (
+                f"CREATE TEMPORARY TABLE IF NOT EXISTS {staging} "
+                '(LIKE "deeds_source" INCLUDING DEFAULTS) ON COMMIT DROP',
+                None,
+            ),
+            (
+                f"ALTER TABLE {staging} ADD COLUMN IF NOT EXISTS staging_row "
+                "integer",
+                None,
+            ),
+            (f"TRUNCATE {staging}", None),
+            (
+                f"COPY {staging} ({columns}, staging_row) FROM STDIN "
+                "WITH (FORMAT csv, NULL '\\N')",
+                None,
+            ),
+            (
+                f'UPDATE {staging} AS s SET "id" = t."id" FROM "deeds_source" AS t '
+                'WHERE s."data_id" = t."data_id" AND s."classmark" = t."classmark" '
+                'AND s."microfilm" = t."microfilm"',
+                None,
+            ),
+            (
+                f'INSERT INTO "deeds_source" ({columns}) SELECT {columns} FROM '
+                f'{staging} ON CONFLICT ("id") DO UPDATE SET "modified" = '
+                'EXCLUDED."modified", "data_id" = EXCLUDED."data_id", '
+                '"classmark" = EXCLUDED."classmark", "microfilm" = '
+                'EXCLUDED."microfilm"',
+                None,
+            ),
+            (f'SELECT staging_row, "id" FROM {staging}', None),
+        ]
+
+        # one row per natural key, with the reserved id and the position of the
+        # group
+        assert [(row[0], row[3:]) for row in recording.rows] == [
+            ("11", [str(data.pk), "a", "1", "0"]),
+            ("12", [str(data.pk), "b", "2", "1"]),
+        ]
+
+        # the objects get the id of their staged row
+        assert [source.pk for source in sources] == [11, 5, 11]
+
+        # the COPY is counted with the other statements
+        assert metrics.queries["write"] == len(recording.statements)
+
+    def test_load_data(self, data):
+        load_sheets(data, BulkLoader(data))
+        expected = snapshot()
+
+        delete_all(data)
+
+        data.load_data(copy=True, batch_size=4)
+        assert data.import_run.mode == ImportRun.MODE_COPY
+        assert snapshot() == expected
+
+    @pytest.mark.skipif(not supports_copy(connection), reason="PostgreSQL only")
+    def test_load_changed_deeds(self, data):
+        load_sheets(data, BulkLoader(data))
+        load_sheets(data, BulkLoader(data))
+        expected = snapshot()
+
+        delete_all(data)
+
+        load_sheets(data, CopyLoader(data, batch_size=4))
+        Deed.objects.update(notes="Old")
+
+        data.rejects = []
+        load_sheets(data, CopyLoader(data, batch_size=4))
+        assert not data.rejects
+        assert snapshot() == expected
+
+
+def test_benchmark_import(capsys):
+    call_command("benchmark_import", "data/raw/test.xlsx", "--modes", "bulk", "copy")
+
+    out = capsys.readouterr().out
+    assert f"Backend: {connection.vendor}" in out
+    assert "bulk: 27 rows in" in out
+    assert "copy: 27 rows in" in out
+
+    # the benchmark data is deleted with its deeds
+    assert not Data.objects.filter(title="Benchmark").exists()
+    assert not Deed.objects.exists()
+
+
+@pytest.mark.usefixtures("data")
+def test_benchmark_import_existing_data(data):
+    load_sheets(data, BulkLoader(data))
+    expected = snapshot()
+
+    with pytest.raises(CommandError):
+        call_command("benchmark_import", "data/raw/test.xlsx", "--title", data.title)
+
+    assert snapshot() == expected
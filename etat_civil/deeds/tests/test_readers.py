@@ -0,0 +1,163 @@
+import zipfile
+
+import pandas as pd
+import pytest
+from django.core.files import File
+from django.core.management import call_command
+
+from etat_civil.deeds.readers import TableReader, WorkbookReader, open_reader
+from etat_civil.deeds.tests.test_bulk import delete_all, snapshot
+
+TEST_WORKBOOK = "data/raw/test.xlsx"
+
+SHEET_NAMES = ["births", "marriages", "deaths", "locations"]
+
+
+@pytest.fixture
+def reader():
+    with WorkbookReader(open(TEST_WORKBOOK, "rb")) as reader:
+        yield reader
+
+
+class TestWorkbookReader:
+    def test_get_columns(self, reader):
+        assert reader.get_columns("missing") is None
+
+        columns = reader.get_columns("births")
+        assert columns[0] == "deed_number"
+        assert "mother_previous_domicile_location" in columns
+
+    def test_iter_rows(self, reader):
+        assert list(reader.iter_rows("missing")) == []
+
+        rows = list(reader.iter_rows("births"))
+        assert len(rows) == 9
+
+        index, record = rows[1]
+        assert index == 1
+        assert record.deed_number == 1045
+        assert record.deed_location == "0051: Alexandrie"
+
+    def test_iter_chunks(self, reader):
+        chunks = list(reader.iter_chunks("births", chunksize=4))
+        assert [len(df.index) for df in chunks] == [4, 4, 1]
+        assert list(chunks[-1].index) == [8]
+
+        chunks = list(reader.iter_chunks("births", chunksize=4, start=6))
+        assert [list(df.index) for df in chunks] == [[6, 7, 8]]
+
+    def test_read_sheet(self, reader):
+        assert reader.read_sheet("missing") is None
+
+        for sheet_name in ["births", "marriages", "deaths", "locations"]:
+            df = reader.read_sheet(sheet_name)
+            expected = pd.read_excel(
+                TEST_WORKBOOK, engine="openpyxl", sheet_name=sheet_name
+            ).dropna(how="all")
+
+            assert list(df.columns) == list(expected.columns)
+            assert list(df.index) == list(expected.index)
+            assert df.fillna("").astype(str).equals(expected.fillna("").astype(str))
+
+
+@pytest.fixture
+def tables_dir(tmpdir):
+    """The sheets of the test workbook as TSV files, and the deaths as CSV."""
+    with WorkbookReader(TEST_WORKBOOK) as reader:
+        for sheet_name in SHEET_NAMES:
+            df = reader.read_sheet(sheet_name)
+            if sheet_name == "deaths":
+                df.to_csv(str(tmpdir.join("deaths.csv")), index=False)
+            else:
+                df.to_csv(str(tmpdir.join(f"{sheet_name}.tsv")), sep="\t", index=False)
+
+    return tmpdir
+
+
+@pytest.fixture
+def tables_zip(tables_dir, tmpdir_factory):
+    path = str(tmpdir_factory.mktemp("zip").join("tables.zip"))
+    with zipfile.ZipFile(path, "w") as archive:
+        for sheet_path in tables_dir.listdir():
+            archive.write(str(sheet_path), f"tables/{sheet_path.basename}")
+
+    return path
+
+
+def assert_same_sheets(reader):
+    with WorkbookReader(TEST_WORKBOOK) as workbook_reader:
+        for sheet_name in SHEET_NAMES:
+            df = reader.read_sheet(sheet_name)
+            expected = workbook_reader.read_sheet(sheet_name)
+
+            assert reader.get_columns(sheet_name) == list(expected.columns)
+            assert list(df.index) == list(expected.index)
+            assert df.fillna("").astype(str).equals(expected.fillna("").astype(str))
+
+
+class TestTableReader:
+    def test_open_reader(self, tables_dir):
+        assert isinstance(open_reader(TEST_WORKBOOK), WorkbookReader)
+        assert isinstance(open_reader(str(tables_dir)), TableReader)
+
+    def test_read_sheet(self, tables_dir, tables_zip):
+        with TableReader(str(tables_dir)) as reader:
+            assert sorted(reader.sheet_names) == sorted(SHEET_NAMES)
+            assert reader.read_sheet("missing") is None
+            assert_same_sheets(reader)
+
+        with TableReader(tables_zip) as reader:
+            assert_same_sheets(reader)
+
+    def test_read_parquet(self, tables_dir, tmpdir_factory):
+        pytest.importorskip("pyarrow")
+
+        parquet_dir = tmpdir_factory.mktemp("parquet")
+        with TableReader(str(tables_dir)) as reader:
+            for sheet_name in SHEET_NAMES:
+                df = reader.read_sheet(sheet_name)
+                df.to_parquet(str(parquet_dir.join(f"{sheet_name}.parquet")))
+
+        with TableReader(str(parquet_dir)) as reader:
+            assert_same_sheets(reader)
+
+    def test_iter_chunks(self, tables_dir):
+        with TableReader(str(tables_dir)) as reader:
+            chunks = list(reader.iter_chunks("births", chunksize=4))
+            assert [list(df.index) for df in chunks] == [
+                [0, 1, 2, 3],
+                [4, 5, 6, 7],
+                [8],
+            ]
+
+            chunks = list(reader.iter_chunks("births", chunksize=4, start=6))
+            assert [list(df.index) for df in chunks] == [[6, 7, 8]]
+
+            index, record = list(reader.iter_rows("births"))[1]
+            assert index == 1
+            assert record.deed_number == 1045
+            assert record.deed_location == "0051: Alexandrie"
+
+    def test_iter_chunks_empty_rows(self, tmpdir):
+        tmpdir.join("births.tsv").write("deed_number\tdeed_date\n1\t\n\t\n2\t\n3\t\n")
+
+        with TableReader(str(tmpdir)) as reader:
+            chunks = list(reader.iter_chunks("births", chunksize=2))
+            assert [list(df.index) for df in chunks] == [[0, 2], [3]]
+
+    def test_dry_run(self, tables_dir, capsys):
+        call_command("import_data", "Tables", str(tables_dir), "--dry-run")
+        assert "9 issues found" in capsys.readouterr().out
+
+    @pytest.mark.django_db
+    @pytest.mark.usefixtures("geonames")
+    def test_load_data(self, data, tables_zip):
+        data.load_data(bulk=True)
+        expected = snapshot()
+
+        delete_all(data)
+        with open(tables_zip, "rb") as f:
+            data.data.save("tables.zip", File(f))
+
+        data.load_data(bulk=True)
+        assert snapshot() == expected
@@ -0,0 +1,133 @@
+import pytest
+from django.db import connection
+from django.db.backends.utils import CursorWrapper
+
+from etat_civil.deeds.bulk import BulkLoader
+from etat_civil.deeds.models import Data, Deed, DeedType, Party, Person, Role
+from etat_civil.deeds.tests.test_bulk import delete_all, load_sheets, snapshot
+from etat_civil.deeds.upsert import supports_upsert, upsert
+
+pytestmark = [
+    pytest.mark.django_db,
+    pytest.mark.usefixtures("geonames"),
+    pytest.mark.skipif(
+        not supports_upsert(connection), reason="The database does not upsert"
+    ),
+]
+
+
+def copy_deed(deed, **kwargs):
+    values = {
+        "deed_type": deed.deed_type,
+        "n": deed.n,
+        "date": deed.date,
+        "place": deed.place,
+        "source": deed.source,
+        "notes": deed.notes,
+    }
+    values.update(kwargs)
+
+    return Deed(**values)
+
+
+class TestUpsert:
+    def test_upsert(self, deed, django_assert_num_queries):
+        deeds = [copy_deed(deed, notes="Updated"), copy_deed(deed, n=2)]
+
+        with django_assert_num_queries(1):
+            assert upsert(Deed, deeds) == 2
+
+        assert deeds[0].pk == deed.pk
+        assert Deed.objects.get(pk=deed.pk).notes == "Updated"
+        assert Deed.objects.get(pk=deeds[1].pk).n == 2
+        assert Deed.objects.count() == 2
+
+    def test_upsert_returning_order(self, deed, monkeypatch):
+        deeds = [copy_deed(deed, n=2), copy_deed(deed, notes="Updated")]
+
+        # the rows are matched on the natural key, not on the order they are
+        # returned in
+        monkeypatch.setattr(
+            CursorWrapper,
+            "fetchall",
+            lambda wrapper: wrapper.cursor.fetchall()[::-1],
+            raising=False,
+        )
+        upsert(Deed, deeds)
+        monkeypatch.undo()
+
+        assert deeds[1].pk == deed.pk
+        assert Deed.objects.get(pk=deeds[0].pk).n == 2
+
+    def test_upsert_same_key(self, deed):
+        deeds = [copy_deed(deed, notes="First"), copy_deed(deed, notes="Last")]
+
+        assert upsert(Deed, deeds) == 1
+        assert deeds[0].pk == deeds[1].pk == deed.pk
+        assert Deed.objects.get().notes == "Last"
+
+    def test_upsert_keep_fields(self, deed):
+        marriage = DeedType.get_marriage()
+        deeds = [copy_deed(deed, deed_type=marriage, notes="Updated")]
+
+        upsert(Deed, deeds, keep_fields=["deed_type"])
+
+        deed.refresh_from_db()
+        assert deed.deed_type != marriage
+        assert deed.notes == "Updated"
+
+    def test_upsert_batches(self, deed, django_assert_num_queries):
+        persons = [Person(name="Jean", surname=f"Dupont {i}") for i in range(5)]
+
+        with django_assert_num_queries(3):
+            assert upsert(Person, persons, batch_size=2) == 5
+
+        assert len({person.pk for person in persons}) == 5
+        assert Person.objects.count() == 5
+
+        father = Role.get_father()
+        party = Party(deed=deed, person=persons[0], role=father)
+        upsert(Party, [party])
+        upsert(Party, [Party(deed=deed, person=persons[0], role=father)])
+        assert Party.objects.get().pk == party.pk
+
+
+@pytest.mark.usefixtures("data")
+class TestBulkLoaderUpsert:
+    @pytest.mark.parametrize("bulk", [True, False])
+    def test_load_changed_deeds(self, data, bulk):
+        def get_loader():
+            return BulkLoader(data, batch_size=4) if bulk else data
+
+        load_sheets(data, get_loader())
+        load_sheets(data, get_loader())
+        expected = snapshot()
+
+        delete_all(data)
+
+        load_sheets(data, get_loader())
+        deeds = Deed.objects.all()[:3]
+        Deed.objects.filter(pk__in=[deed.pk for deed in deeds]).update(notes="Old")
+
+        data.rejects = []
+        load_sheets(data, get_loader())
+        assert not data.rejects
+        assert snapshot() == expected
+
+    @pytest.mark.parametrize("bulk", [True, False])
+    def test_load_deeds_of_another_data(self, data, bulk):
+        load_sheets(data, BulkLoader(data))
+        expected = snapshot()
+
+        other = Data.objects.get(pk=data.pk)
+        other.pk = None
+        other.title = "Other"
+        other.save()
+
+        other.rejects = []
+        load_sheets(other, BulkLoader(other) if bulk else other)
+        assert other.rejects
+        assert "another data file" in str(other.rejects[0].error)
+
+        assert not Deed.objects.filter(source__data=other).exists()
+        assert snapshot()["deeds"] == expected["deeds"]
@@ -0,0 +1,151 @@
+import pandas as pd
+import pytest
+from django.contrib import admin
+from django.core.management import call_command
+from django.urls import reverse
+from openpyxl import load_workbook
+
+from etat_civil.deeds.admin import DataAdmin
+from etat_civil.deeds.dates import DateParser
+from etat_civil.deeds.models import Data, Deed
+from etat_civil.deeds.readers import WorkbookReader
+from etat_civil.deeds.validation import (
+    check_columns,
+    check_dates,
+    check_deed_keys,
+    check_integers,
+    check_locations,
+    get_deed_keys,
+    validate_workbook,
+)
+
+
+def test_check_columns():
+    assert check_columns("deaths", None)[0].message == "Missing sheet"
+
+    issues = check_columns("deaths", ["deed_number", "deed_date", "name"])
+    assert [issue.column for issue in issues] == [
+        "deed_location",
+        "classmark",
+        "classmark_microfilm",
+        "surname",
+        "age",
+    ]
+
+
+def test_check_dates():
+    df = pd.DataFrame(
+        {"deed_date": ["1818-05-03", "3 mai", None, "1818"], "n": [1, 2, 3, 4]}
+    )
+
+    issues = check_dates("births", df, DateParser())
+    assert [(issue.row, issue.value, issue.message) for issue in issues] == [
+        (3, "3 mai", "Invalid date"),
+        (5, "1818", "Partial date"),
+    ]
+
+
+def test_check_integers():
+    df = pd.DataFrame({"deed_number": [1, "12", "/", 2.5, None]})
+
+    issues = check_integers("births", df, ["deed_number", "age"])
+    assert [(issue.row, issue.value) for issue in issues] == [(4, "/"), (5, 2.5)]
+
+
+def test_check_locations():
+    df = pd.DataFrame(
+        {
+            "deed_location": ["Alexandrie ", "Paris", None],
+            "mother_domicile": ["", 1, "Le Caire"],
+        }
+    )
+
+    issues = check_locations("births", df, {"Alexandrie", "Le Caire"})
+    assert [(issue.row, issue.column) for issue in issues] == [(3, "deed_location")]
+
+
+def test_check_deed_keys():
+    births = pd.DataFrame(
+        {
+            "deed_number": [1, 1, 2],
+            "deed_date": ["1818-05-03", "1818-05-03", "1818-05-03"],
+            "deed_location": ["Alexandrie", "Alexandrie ", "Alexandrie"],
+        }
+    )
+    deaths = pd.DataFrame(
+        {
+            "deed_number": ["2"],
+            "deed_date": ["1818-05-03"],
+            "deed_location": ["Le Caire"],
+        }
+    )
+
+    parser = DateParser()
+    keys = [
+        get_deed_keys("births", births, parser),
+        get_deed_keys("deaths", deaths, parser),
+    ]
+    issues = check_deed_keys(keys)
+    assert [(issue.sheet, issue.row) for issue in issues] == [
+        ("births", 2),
+        ("births", 3),
+    ]
+    assert issues[0].value == "1, 1818-05-03, Alexandrie"
+
+
+@pytest.fixture
+def invalid_data_file(tmpdir):
+    """A copy of the test data with an invalid date, an invalid age and a missing
+    column."""
+    workbook = load_workbook("data/raw/test.xlsx", data_only=True)
+    workbook["births"].cell(row=3, column=2).value = "Mai 1818"
+    workbook["births"].cell(row=4, column=8).value = "vingt"
+    workbook["marriages"].delete_cols(20)
+
+    path = str(tmpdir.join("invalid.xlsx"))
+    workbook.save(path)
+
+    return path
+
+
+def test_validate_workbook(invalid_data_file):
+    with WorkbookReader("data/raw/test.xlsx") as reader:
+        issues = validate_workbook(reader)
+
+    assert {issue.message for issue in issues} == {
+        "Invalid integer",
+        "Unknown location",
+    }
+
+    with WorkbookReader(invalid_data_file) as reader:
+        new_issues = set(validate_workbook(reader)) - set(issues)
+
+    assert {(i.sheet, i.row, i.column, i.message) for i in new_issues} == {
+        ("births", 3, "deed_date", "Invalid date"),
+        ("births", 4, "father_age", "Invalid integer"),
+        ("marriages", 1, "classmark", "Missing column"),
+    }
+
+
+@pytest.mark.django_db
+def test_dry_run(invalid_data_file, capsys, django_assert_num_queries):
+    with django_assert_num_queries(0):
+        call_command("import_data", "Invalid", invalid_data_file, "--dry-run")
+
+    out = capsys.readouterr().out
+    assert "births, row 3, deed_date: Invalid date 'Mai 1818'" in out
+    assert "12 issues found" in out
+
+    assert not Data.objects.exists()
+    assert not Deed.objects.exists()
+
+
+@pytest.mark.django_db
+def test_validate_view(admin_user, request_factory, data):
+    request = request_factory.get(reverse("admin:deeds_data_validate", args=[data.pk]))
+    request.user = admin_user
+
+    response = DataAdmin(Data, admin.site).validate_view(request, str(data.pk))
+
+    assert response.status_code == 200
+    assert "Unknown location" in response.rendered_content
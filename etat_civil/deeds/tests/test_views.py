@@ -47,7 +47,8 @@ class TestGeoJSONView:
         request = request_factory.get("/fake-url/")
 
         response = view.get(request)
-        content = response.content
+        assert response.streaming
+        content = b"".join(response.streaming_content)
 
         assert (
             response.get("Content-Disposition") == 'attachment; filename="geojson.json"'
@@ -0,0 +1,162 @@
+"""Writes batches of model instances with one `INSERT ... ON CONFLICT DO UPDATE`
+statement per batch, on the natural key of the model, its `unique_together`
+fields, and sets the ids of the instances from the `RETURNING` clause, matched on
+the natural key. Rows that already exist are updated instead of failing on the
+unique constraint, so that an import can be run again. The statement is supported
+by PostgreSQL, and by SQLite from version 3.35."""
+from django.db import connections
+
+
+def supports_upsert(connection):
+    if connection.vendor == "postgresql":
+        return True
+
+    if connection.vendor == "sqlite":
+        return connection.Database.sqlite_version_info >= (3, 35, 0)
+
+    return False
+
+
+def get_conflict_fields(model):
+    """Returns the names of the fields of the natural key of the model, or None if
+    the model does not have one."""
+    unique_together = model._meta.unique_together
+    if not unique_together:
+        return None
+
+    return list(unique_together[0])
+
+
+def get_key(model, conflict_fields, values):
+    """Returns the natural key of a row from the `values` of its `conflict_fields`
+    as python values, the database may return them as another type than the one
+    they are written as, SQLite returns the dates as text."""
+    meta = model._meta
+
+    return tuple(
+        meta.get_field(name).to_python(value)
+        for name, value in zip(conflict_fields, values)
+    )
+
+
+def get_obj_key(model, conflict_fields, obj):
+    meta = model._meta
+
+    return get_key(
+        model,
+        conflict_fields,
+        [getattr(obj, meta.get_field(name).attname) for name in conflict_fields],
+    )
+
+
+def get_groups(model, objs, conflict_fields):
+    """Returns the `objs` grouped by natural key, in order, the same row can not be
+    written twice by one statement."""
+    groups = {}
+    for obj in objs:
+        key = get_obj_key(model, conflict_fields, obj) if conflict_fields else id(obj)
+        groups.setdefault(key, []).append(obj)
+
+    return list(groups.values())
+
+
+def get_upsert_sql(model, fields, conflict_fields, rows, connection, keep_fields=None):
+    qn = connection.ops.quote_name
+    meta = model._meta
+
+    placeholders = "({})".format(", ".join(["%s"] * len(fields)))
+    sql = "INSERT INTO {} ({}) VALUES {}".format(
+        qn(meta.db_table),
+        ", ".join(qn(field.column) for field in fields),
+        ", ".join([placeholders] * rows),
+    )
+
+    conflict_columns = [meta.get_field(name).column for name in conflict_fields or []]
+
+    if conflict_fields:
+        keep_fields = ["created", *(keep_fields or [])]
+        update_columns = [
+            field.column
+            for field in fields
+            if field.column not in conflict_columns and field.name not in keep_fields
+        ]
+        sql += " ON CONFLICT ({}) DO UPDATE SET {}".format(
+            ", ".join(qn(column) for column in conflict_columns),
+            ", ".join(
+                f"{qn(column)} = EXCLUDED.{qn(column)}" for column in update_columns
+            ),
+        )
+
+    # the natural key of the rows is returned to match the rows with the objects
+    return sql + " RETURNING {}".format(
+        ", ".join(qn(column) for column in [meta.pk.column, *conflict_columns])
+    )
+
+
+def upsert(model, objs, batch_size=None, using="default", keep_fields=None):
+    """Inserts or updates the `objs` on the natural key of the `model`, and sets
+    their primary keys. When several of the `objs` have the same natural key the
+    last one is written, and all of them get the id of the row. The fields in
+    `keep_fields` are not updated in the rows that already exist. Returns the
+    number of rows written."""
+    connection = connections[using]
+    meta = model._meta
+    fields = [field for field in meta.concrete_fields if not field.primary_key]
+    conflict_fields = get_conflict_fields(model)
+
+    groups = get_groups(model, objs, conflict_fields)
+
+    batch_size = min(
+        batch_size or len(groups),
+        connection.ops.bulk_batch_size(fields, groups) or len(groups),
+    )
+
+    written = 0
+    with connection.cursor() as cursor:
+        for start in range(0, len(groups), batch_size):
+            batch = groups[start:][:batch_size]
+
+            params = []
+            for group in batch:
+                obj = group[-1]
+                params.extend(
+                    field.get_db_prep_save(field.pre_save(obj, True), connection)
+                    for field in fields
+                )
+
+            cursor.execute(
+                get_upsert_sql(
+                    model,
+                    fields,
+                    conflict_fields,
+                    len(batch),
+                    connection,
+                    keep_fields=keep_fields,
+                ),
+                params,
+            )
+
+            rows = cursor.fetchall()
+
+            if conflict_fields:
+                pks = {
+                    get_key(model, conflict_fields, values): pk for pk, *values in rows
+                }
+                pks = [
+                    pks[get_obj_key(model, conflict_fields, group[-1])]
+                    for group in batch
+                ]
+            else:
+                # without a natural key the rows are only inserted, and their ids
+                # are returned in the order of the rows, as `bulk_create` expects
+                pks = [pk for pk, in rows]
+
+            for group, pk in zip(batch, pks):
+                for obj in group:
+                    obj.pk = pk
+                    obj._state.adding = False
+                    obj._state.db = using
+
+            written += len(batch)
+
+    return written
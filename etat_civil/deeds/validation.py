@@ -0,0 +1,196 @@
+"""Validates the sheets of a data workbook before it is imported, without writing
+to the database or searching geonames. The checks are run on whole columns, and
+return an `Issue` for each cell that would fail to load, or load differently
+than expected."""
+from collections import namedtuple
+
+import pandas as pd
+
+from etat_civil.deeds.dates import PRECISION_MONTH, PRECISION_YEAR, DateParser
+from etat_civil.deeds.normalize import is_location_column, to_numbers
+
+Issue = namedtuple("Issue", ["sheet", "row", "column", "value", "message"])
+
+DEED_COLUMNS = [
+    "deed_number",
+    "deed_date",
+    "deed_location",
+    "classmark",
+    "classmark_microfilm",
+]
+
+PERSON_COLUMNS = ["name", "surname", "age"]
+
+SHEET_LABELS = {
+    "births": ["father_", "mother_"],
+    "marriages": ["groom_", "bride_"],
+    "deaths": [""],
+}
+
+LOCATION_COLUMNS = ["location", "geonames_id", "lat", "lon", "display_name"]
+
+
+def get_required_columns(sheet_name):
+    if sheet_name == "locations":
+        return LOCATION_COLUMNS
+
+    return DEED_COLUMNS + [
+        f"{label}{column}"
+        for label in SHEET_LABELS[sheet_name]
+        for column in PERSON_COLUMNS
+    ]
+
+
+def get_row(index):
+    """Returns the number of the row in the sheet, the header being row 1."""
+    return int(index) + 2
+
+
+def get_issues(sheet_name, df, column, mask, message):
+    return [
+        Issue(sheet_name, get_row(index), column, value, message)
+        for index, value in df.loc[mask, column].items()
+    ]
+
+
+def check_columns(sheet_name, columns):
+    if columns is None:
+        return [Issue(sheet_name, None, None, None, "Missing sheet")]
+
+    return [
+        Issue(sheet_name, 1, column, None, "Missing column")
+        for column in get_required_columns(sheet_name)
+        if column not in columns
+    ]
+
+
+def check_dates(sheet_name, df, parser):
+    """Checks that the cells of the date columns are dates in one of the date
+    formats, the cells that are not are loaded as empty, and reports the partial
+    deed dates, that are loaded as the first day of the month or year."""
+    issues = []
+
+    for column in [c for c in df.columns if "date" in c]:
+        values = df[column]
+        dates = parser.parse_dates(values)
+        mask = values.notnull() & dates.isnull()
+
+        issues.extend(get_issues(sheet_name, df, column, mask, "Invalid date"))
+
+    if "deed_date" in df:
+        precisions = parser.parse_precisions(df["deed_date"])
+        mask = precisions.isin([PRECISION_MONTH, PRECISION_YEAR])
+
+        issues.extend(get_issues(sheet_name, df, "deed_date", mask, "Partial date"))
+
+    return issues
+
+
+def check_integers(sheet_name, df, columns):
+    """Checks that the cells of the columns are integers, the cells that are not
+    are loaded as empty."""
+    issues = []
+
+    for column in [c for c in columns if c in df]:
+        values = df[column]
+        numbers = to_numbers(values)
+        mask = values.notnull() & (numbers.isnull() | (numbers % 1 != 0))
+
+        issues.extend(get_issues(sheet_name, df, column, mask, "Invalid integer"))
+
+    return issues
+
+
+def check_locations(sheet_name, df, locations):
+    """Checks that the location names are in the locations sheet."""
+    issues = []
+
+    for column in [c for c in df.columns if is_location_column(c)]:
+        names = df[column].astype(object)
+        is_name = names.map(lambda name: isinstance(name, str) and bool(name.strip()))
+        names = names[is_name].str.strip()
+        mask = pd.Series(False, index=df.index)
+        mask[names.index] = ~names.isin(locations)
+
+        issues.extend(get_issues(sheet_name, df, column, mask, "Unknown location"))
+
+    return issues
+
+
+def get_deed_keys(sheet_name, df, parser):
+    """Returns a data frame with the `(n, date, place)` key of the deed of each row
+    that has one, as the loaders compute it."""
+    keys = pd.DataFrame(
+        {
+            "sheet": sheet_name,
+            "index": df.index,
+            "n": to_numbers(df["deed_number"]).fillna(0).values,
+            "date": parser.parse_dates(df["deed_date"]).dt.date.values,
+            "place": df["deed_location"].astype(object).str.strip().values,
+        }
+    )
+
+    return keys.dropna(subset=["date", "place"])
+
+
+def check_deed_keys(keys):
+    """Checks that the deeds of the rows of all the sheets have different keys, the
+    rows with the same key are loaded as one deed."""
+    keys = pd.concat(keys)
+    duplicates = keys[keys.duplicated(subset=["n", "date", "place"], keep=False)]
+
+    return [
+        Issue(
+            sheet_name,
+            get_row(index),
+            "deed_number",
+            f"{int(n)}, {date}, {place}",
+            "Duplicate deed",
+        )
+        for sheet_name, index, n, date, place in duplicates.itertuples(
+            index=False, name=None
+        )
+    ]
+
+
+def validate_workbook(reader):
+    """Returns the issues found in the data sheets of the workbook opened by the
+    `reader`."""
+    issues = []
+    parser = DateParser()
+
+    columns = reader.get_columns("locations")
+    issues.extend(check_columns("locations", columns))
+
+    locations = set()
+    if columns and "display_name" in columns:
+        names = reader.read_sheet("locations")["display_name"].dropna()
+        locations = set(names.astype(str).str.strip())
+
+    keys = []
+    for sheet_name in SHEET_LABELS:
+        columns = reader.get_columns(sheet_name)
+        issues.extend(check_columns(sheet_name, columns))
+
+        if columns is None:
+            continue
+
+        df = reader.read_sheet(sheet_name)
+
+        issues.extend(check_dates(sheet_name, df, parser))
+        issues.extend(
+            check_integers(
+                sheet_name,
+                df,
+                ["deed_number"] + [f"{label}age" for label in SHEET_LABELS[sheet_name]],
+            )
+        )
+        issues.extend(check_locations(sheet_name, df, locations))
+
+        if all(column in df for column in DEED_COLUMNS[:3]):
+            keys.append(get_deed_keys(sheet_name, df, parser))
+
+    if keys:
+        issues.extend(check_deed_keys(keys))
+
+    return issues
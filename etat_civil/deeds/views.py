@@ -1,6 +1,7 @@
 import csv
-from django.http import HttpResponse, JsonResponse
+from django.http import HttpResponse, StreamingHttpResponse
 from django.views import View
+from etat_civil.deeds.geojson import iter_feature_collection
 from etat_civil.deeds.models import Person
 from etat_civil.geonames_place.models import Place
 
@@ -9,7 +10,9 @@ class GeoJSONView(View):
     http_method_names = ["get"]
 
     def get(self, request, *args, **kwargs):
-        response = JsonResponse(Person.persons_to_geojson())
+        response = StreamingHttpResponse(
+            iter_feature_collection(), content_type="application/json"
+        )
         response["Content-Disposition"] = 'attachment; filename="geojson.json"'
 
         return response
@@ -1,5 +1,13 @@
 from django.contrib import admin
-from .models import ClassDescription, Country, FeatureClass, Place
+from django.db.models import Sum
+from .models import (
+    AlternateName,
+    ClassDescription,
+    Country,
+    FeatureClass,
+    GeocodeCache,
+    Place,
+)
 
 
 @admin.register(ClassDescription)
@@ -30,9 +38,55 @@ class PlaceAdmin(admin.ModelAdmin):
         )
 
         if len(queryset) < 10 and len(search_term) > 3:
-            Place.create_or_update_from_geonames(search_term)
+            # the searches already made are not sent to geonames again
+            Place.create_or_update_from_geonames(search_term, use_cache=True)
             queryset, use_distinct = super().get_search_results(
                 request, queryset, search_term
             )
 
         return queryset, use_distinct
+
+
+@admin.register(AlternateName)
+class AlternateNameAdmin(admin.ModelAdmin):
+    autocomplete_fields = ["place"]
+    list_display = ["name", "place", "population"]
+    search_fields = ["name", "key"]
+
+
+@admin.register(GeocodeCache)
+class GeocodeCacheAdmin(admin.ModelAdmin):
+    date_hierarchy = "modified"
+    list_display = [
+        "address",
+        "country_code",
+        "geonames_id",
+        "expires",
+        "hits",
+        "misses",
+        "hit_rate",
+    ]
+    list_filter = ["country_code"]
+    readonly_fields = ["key", "hits", "misses"]
+    search_fields = ["address", "key", "geonames_id"]
+
+    def changelist_view(self, request, extra_context=None):
+        extra_context = extra_context or {}
+        extra_context["cache_stats"] = self.get_cache_stats()
+
+        return super().changelist_view(request, extra_context=extra_context)
+
+    def get_cache_stats(self):
+        stats = GeocodeCache.objects.aggregate(hits=Sum("hits"), misses=Sum("misses"))
+
+        hits = stats["hits"] or 0
+        misses = stats["misses"] or 0
+        lookups = hits + misses
+
+        return {
+            "lookups": lookups,
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": 100 * hits / lookups if lookups else 0,
+            "miss_rate": 100 * misses / lookups if lookups else 0,
+        }
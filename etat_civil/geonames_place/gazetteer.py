@@ -0,0 +1,250 @@
+"""Loads GeoNames gazetteer dumps, `allCountries.txt` or a country extract, see
+http://download.geonames.org/export/dump/readme.txt, into the places tables."""
+import io
+import zipfile
+from collections import namedtuple
+from contextlib import contextmanager
+from itertools import islice
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from etat_civil.geonames_place.models import (
+    AlternateName,
+    ClassDescription,
+    Country,
+    FeatureClass,
+    Place,
+    normalize_address,
+)
+
+GAZETTEER_FIELDS = [
+    "geonames_id",
+    "name",
+    "ascii_name",
+    "alternate_names",
+    "lat",
+    "lon",
+    "feature_class",
+    "feature_code",
+    "country_code",
+    "cc2",
+    "admin1_code",
+    "admin2_code",
+    "admin3_code",
+    "admin4_code",
+    "population",
+    "elevation",
+    "dem",
+    "timezone",
+    "modification_date",
+]
+
+GazetteerRecord = namedtuple("GazetteerRecord", GAZETTEER_FIELDS)
+
+# the names of the feature classes, as geonames returns them in `fclName`, that
+# `Place._hydrate` stores as the class description of the places
+FEATURE_CLASS_NAMES = {
+    "A": "country, state, region,...",
+    "H": "stream, lake, ...",
+    "L": "parks,area, ...",
+    "P": "city, village,...",
+    "R": "road, railroad ",
+    "S": "spot, building, farm",
+    "T": "mountain,hill,rock,... ",
+    "U": "undersea",
+    "V": "forest,heath,...",
+}
+
+
+@contextmanager
+def open_dump(path):
+    """Opens a dump file, or the text file with the same name in a zip file, as
+    text. The file, and the zip file, are closed when the context exits."""
+    path = str(path)
+
+    if not zipfile.is_zipfile(path):
+        with open(path, encoding="utf-8") as f:
+            yield f
+        return
+
+    with zipfile.ZipFile(path) as archive:
+        names = [name for name in archive.namelist() if name.endswith(".txt")]
+
+        with archive.open(names[0]) as member:
+            with io.TextIOWrapper(member, encoding="utf-8") as f:
+                yield f
+
+
+def iter_tsv(f):
+    for line in f:
+        if not line.strip() or line.startswith("#"):
+            continue
+
+        yield line.rstrip("\r\n").split("\t")
+
+
+def iter_records(f):
+    width = len(GAZETTEER_FIELDS)
+
+    for values in iter_tsv(f):
+        if len(values) < width:
+            values = values + [""] * (width - len(values))
+
+        yield GazetteerRecord._make(values[:width])
+
+
+def read_country_names(f):
+    """Returns the country names by ISO code from a `countryInfo.txt` file."""
+    return {values[0]: values[4] for values in iter_tsv(f) if len(values) > 4}
+
+
+class GazetteerLoader:
+    """Streams the records of a gazetteer dump into the database in batches of
+    `batch_size` records. The places that are not in the database are created,
+    with the class description, country and feature class of the record, the
+    places that already exist are not changed. The class descriptions and the
+    countries are the ones geonames returns, see `Place._hydrate`. The name, ASCII
+    name and alternate names of every place are indexed in `AlternateName`,
+    replacing the alternate names loaded before for the place."""
+
+    def __init__(self, batch_size=None, country_names=None, feature_classes=None):
+        self.batch_size = batch_size or settings.GEONAMES_GAZETTEER_BATCH_SIZE
+        self.country_names = country_names or {}
+        self.feature_classes = set(feature_classes or [])
+
+        self.class_descriptions = {}
+        self.countries = {}
+        self.feature_class_objects = {}
+
+        self.created = 0
+        self.names = 0
+
+    def load(self, f):
+        records = iter_records(f)
+        batch = list(islice(records, self.batch_size))
+
+        while batch:
+            self.load_batch(batch)
+            batch = list(islice(records, self.batch_size))
+
+        return self.created, self.names
+
+    def load_batch(self, records):
+        if self.feature_classes:
+            records = [r for r in records if r.feature_class in self.feature_classes]
+
+        records = {int(r.geonames_id): r for r in records if r.geonames_id}
+        if not records:
+            return
+
+        with transaction.atomic():
+            existing = set(
+                Place.objects.filter(geonames_id__in=records.keys()).values_list(
+                    "geonames_id", flat=True
+                )
+            )
+
+            now = timezone.now()
+            new_places = [
+                self.get_place(record, now)
+                for geonames_id, record in records.items()
+                if geonames_id not in existing
+            ]
+            Place.objects.bulk_create(new_places, batch_size=self.batch_size)
+
+            places = Place.objects.in_bulk(
+                list(records.keys()), field_name="geonames_id"
+            )
+
+            AlternateName.objects.filter(place__in=places.values()).delete()
+            names = [
+                name
+                for geonames_id, record in records.items()
+                for name in self.get_alternate_names(places[geonames_id], record)
+            ]
+            AlternateName.objects.bulk_create(names, batch_size=self.batch_size)
+
+        self.created += len(new_places)
+        self.names += len(names)
+
+    def get_place(self, record, now):
+        return Place(
+            geonames_id=int(record.geonames_id),
+            update_from_geonames=False,
+            address=record.name,
+            class_description=self.get_class_description(record),
+            country=self.get_country(record.country_code),
+            feature_class=self.get_feature_class(record.feature_class),
+            lat=to_decimal(record.lat),
+            lon=to_decimal(record.lon),
+            created=now,
+            modified=now,
+        )
+
+    def get_alternate_names(self, place, record):
+        population = int(record.population or 0)
+
+        names = {}
+        for name in [record.name, record.ascii_name] + record.alternate_names.split(
+            ","
+        ):
+            name = name.strip()
+            key = normalize_address(name) if name else None
+
+            if key and key not in names:
+                names[key] = AlternateName(
+                    place=place, name=name[:256], key=key[:256], population=population
+                )
+
+        return names.values()
+
+    def get_class_description(self, record):
+        title = FEATURE_CLASS_NAMES.get(record.feature_class)
+
+        if not title:
+            return None
+
+        if title not in self.class_descriptions:
+            self.class_descriptions[title], _ = ClassDescription.objects.get_or_create(
+                title=title
+            )
+
+        return self.class_descriptions[title]
+
+    def get_country(self, code):
+        """Returns the country of the `code`, without the `country_names` the
+        country is named after its code until a place of the country is updated
+        from geonames."""
+        if not code:
+            return None
+
+        if code not in self.countries:
+            name = self.country_names.get(code, code)
+            country, created = Country.objects.get_or_create(
+                code=code, defaults={"name": name}
+            )
+            if not created and country.name == code and name != code:
+                country.name = name
+                country.save()
+            self.countries[code] = country
+
+        return self.countries[code]
+
+    def get_feature_class(self, title):
+        if not title:
+            return None
+
+        if title not in self.feature_class_objects:
+            self.feature_class_objects[title], _ = FeatureClass.objects.get_or_create(
+                title=title
+            )
+
+        return self.feature_class_objects[title]
+
+
+def to_decimal(value):
+    if not value:
+        return None
+
+    return round(float(value), 6)
@@ -0,0 +1,50 @@
+from pathlib import Path
+
+from django.core.management.base import BaseCommand
+from etat_civil.geonames_place.gazetteer import (
+    GazetteerLoader,
+    open_dump,
+    read_country_names,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Loads a GeoNames gazetteer dump, allCountries.txt or a country extract, "
+        "into the places, to resolve places without querying geonames"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "dump_file", nargs=1, type=Path, help="The dump file, .txt or .zip"
+        )
+        parser.add_argument(
+            "--country-info", type=Path, help="The countryInfo.txt file"
+        )
+        parser.add_argument(
+            "--feature-class",
+            action="append",
+            dest="feature_classes",
+            help="Only load places of the feature class, can be used more than once",
+        )
+        parser.add_argument(
+            "--batch-size", type=int, help="Number of records loaded per batch"
+        )
+
+    def handle(self, *args, **options):
+        country_names = None
+        if options["country_info"]:
+            with open_dump(options["country_info"]) as f:
+                country_names = read_country_names(f)
+
+        loader = GazetteerLoader(
+            batch_size=options["batch_size"],
+            country_names=country_names,
+            feature_classes=options["feature_classes"],
+        )
+
+        self.stdout.write("Loading gazetteer...")
+        with open_dump(options["dump_file"][0]) as f:
+            created, names = loader.load(f)
+
+        self.stdout.write(f"Created {created} places, indexed {names} names")
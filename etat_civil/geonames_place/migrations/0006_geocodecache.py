@@ -0,0 +1,34 @@
+# Generated by Django 2.2.28 on 2026-10-16 23:22
+
+from django.db import migrations, models
+import django.utils.timezone
+import model_utils.fields
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('geonames_place', '0005_alter_field_geonames_id_on_place'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GeocodeCache',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', model_utils.fields.AutoCreatedField(default=django.utils.timezone.now, editable=False, verbose_name='created')),
+                ('modified', model_utils.fields.AutoLastModifiedField(default=django.utils.timezone.now, editable=False, verbose_name='modified')),
+                ('key', models.CharField(max_length=512)),
+                ('country_code', models.CharField(blank=True, default='', max_length=16)),
+                ('address', models.CharField(max_length=512)),
+                ('geonames_id', models.BigIntegerField(blank=True, null=True)),
+                ('expires', models.DateTimeField(blank=True, null=True)),
+                ('hits', models.PositiveIntegerField(default=0)),
+                ('misses', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'ordering': ['key', 'country_code'],
+                'unique_together': {('key', 'country_code')},
+            },
+        ),
+    ]
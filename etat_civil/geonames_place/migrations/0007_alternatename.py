@@ -0,0 +1,40 @@
+# Generated by Django 2.2.28 on 2026-10-16 23:25
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("geonames_place", "0006_geocodecache"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="AlternateName",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("name", models.CharField(max_length=256)),
+                ("key", models.CharField(db_index=True, max_length=256)),
+                ("population", models.BigIntegerField(default=0)),
+                (
+                    "place",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="alternate_names",
+                        to="geonames_place.Place",
+                    ),
+                ),
+            ],
+            options={"ordering": ["key", "-population"],},
+        ),
+    ]
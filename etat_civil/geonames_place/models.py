@@ -1,8 +1,24 @@
 # -*- coding: utf-8 -*-
-import geocoder
+import re
+from datetime import timedelta
+
 from django.conf import settings
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from etat_civil.geonames_place.resolver import GeonamesResolver
 from model_utils.models import TimeStampedModel
+from unidecode import unidecode
+
+
+def normalize_address(address):
+    """Returns the key used to cache the geonames results of an address, the same
+    key `data/scripts/places.py` uses to merge place names."""
+    key = unidecode(address).lower()
+    key = re.sub(r"\W+", "_", key)
+    key = re.sub(r"^_|_$", "", key)
+
+    return key
 
 
 class ClassDescription(TimeStampedModel):
@@ -70,11 +86,9 @@ class Place(TimeStampedModel):
         if not self.geonames_id:
             return
 
-        g = geocoder.geonames(
-            self.geonames_id, key=settings.GEONAMES_KEY, method="details"
-        )
+        geonames = GeonamesResolver().details([self.geonames_id])[self.geonames_id]
 
-        self._hydrate(g)
+        self._hydrate(geonames[0] if geonames else None)
 
     def _hydrate(self, geoname):
         if not geoname:
@@ -89,9 +103,14 @@ class Place(TimeStampedModel):
             self.class_description = cd
 
         if geoname.country and geoname.country_code:
-            c, _ = Country.objects.get_or_create(
-                name=geoname.country, code=geoname.country_code
+            # the countries are looked up by code, the gazetteer may have created
+            # them named after their code, see `GazetteerLoader.get_country`
+            c, created = Country.objects.get_or_create(
+                code=geoname.country_code, defaults={"name": geoname.country}
             )
+            if not created and c.name != geoname.country:
+                c.name = geoname.country
+                c.save()
             self.country = c
 
         if geoname.feature_class:
@@ -109,64 +128,294 @@ class Place(TimeStampedModel):
         return [self.geonames_id, self.address, self.lat, self.lon]
 
     @staticmethod
-    def create_or_update_from_geonames(address, country_code=None):
-        count = 0
-
+    def create_or_update_from_geonames(address, country_code=None, use_cache=False):
+        """Searches geonames for the `address`, creates or updates the places found
+        and caches the result. Returns the number of places saved. The address is
+        only looked up in the `GeocodeCache` with `use_cache`, and not searched
+        again when it is cached, so that the places can be updated."""
         if not address:
-            return count
+            return 0
 
         if len(address) < 3:
-            return count
+            return 0
 
-        options = {
-            "key": settings.GEONAMES_KEY,
-            "maxRows": settings.GEONAMES_MAX_RESULTS,
-        }
+        if use_cache and GeocodeCache.get_many([address], country_code=country_code):
+            return 0
 
-        if country_code:
-            options["country"] = country_code
+        geonames = GeonamesResolver().search(
+            [address], country_code=country_code, max_rows=settings.GEONAMES_MAX_RESULTS
+        )[address]
 
-        geonames = geocoder.geonames(address, **options)
+        places = Place.save_geonames(geonames or [])
+        if geonames is not None:
+            GeocodeCache.set_many(
+                {address: geonames[0].geonames_id if geonames else None},
+                country_code=country_code,
+            )
+
+        return len(places)
+
+    @staticmethod
+    def get_or_create_from_geonames(address, country_code=None):
+        return Place.get_or_create_many_from_geonames(
+            [address], country_code=country_code
+        ).get(address)
+
+    @staticmethod
+    def get_or_create_many_from_geonames(addresses, country_code=None):
+        """Searches geonames for the `addresses` concurrently, and returns a dict
+        with the place of the first result for each address, or None. The
+        addresses in the `GeocodeCache` are not searched again, and the addresses
+        in the gazetteer, see `AlternateName`, are resolved locally."""
+        addresses = [address for address in addresses if address and len(address) > 2]
+
+        cached = GeocodeCache.get_many(addresses, country_code=country_code)
+        places = Place.objects.in_bulk(
+            [pk for pk in set(cached.values()) if pk], field_name="geonames_id"
+        )
+        # the places of the cached results may have been deleted since
+        cached = {
+            address: geonames_id
+            for address, geonames_id in cached.items()
+            if geonames_id is None or geonames_id in places
+        }
 
-        for g in geonames:
-            p, _ = Place.objects.get_or_create(
-                geonames_id=g.geonames_id, update_from_geonames=False
+        local = AlternateName.get_places(
+            [address for address in addresses if address not in cached],
+            country_code=country_code,
+        )
+        places.update({place.geonames_id: place for place in local.values()})
+
+        searched = {}
+        found = {}
+        for address, geonames in (
+            GeonamesResolver()
+            .search(
+                [a for a in addresses if a not in cached and a not in local],
+                country_code=country_code,
             )
-            p._hydrate(g)
-            p.save()
+            .items()
+        ):
+            if geonames is None:
+                continue
+
+            searched[address] = None
+            if geonames:
+                searched[address] = geonames[0].geonames_id
+                found[address] = geonames[0]
+
+        places.update(Place.save_geonames(found.values()))
+        GeocodeCache.set_many(searched, country_code=country_code)
 
-            count += 1
+        local = {address: place.geonames_id for address, place in local.items()}
+        GeocodeCache.set_many(local, country_code=country_code, searched=False)
 
-        return count
+        geonames_ids = {**cached, **local, **searched}
+
+        return {address: places.get(geonames_ids.get(address)) for address in addresses}
 
     @staticmethod
-    def get_or_create_from_geonames(address, country_code=None):
-        if not address:
-            return None
+    def hydrate_many_from_geonames(places):
+        """Gets the details of the `places` from geonames concurrently, and saves
+        them in one batch."""
+        places = [place for place in places if place.geonames_id]
+        details = GeonamesResolver().details([place.geonames_id for place in places])
 
-        if len(address) < 3:
-            return None
+        geonames = [details[place.geonames_id] for place in places]
 
-        options = {"key": settings.GEONAMES_KEY, "maxRows": 1}
+        return Place.save_geonames([g[0] for g in geonames if g])
 
-        if country_code:
-            options["country"] = country_code
+    @staticmethod
+    def save_geonames(geonames):
+        """Creates or updates the places for the geonames results in one
+        transaction, returns a dict with the places by geonames id."""
+        geonames = {g.geonames_id: g for g in geonames}
 
-        geonames = geocoder.geonames(address, **options)
+        if not geonames:
+            return {}
 
-        for g in geonames:
-            p, _ = Place.objects.get_or_create(
-                geonames_id=g.geonames_id, update_from_geonames=False
+        with transaction.atomic():
+            existing = Place.objects.in_bulk(
+                list(geonames.keys()), field_name="geonames_id"
             )
-            p._hydrate(g)
-            p.save()
 
-            return p
+            new_places = []
+            for geonames_id, g in geonames.items():
+                place = existing.get(geonames_id)
+                if place is None:
+                    place = Place(geonames_id=geonames_id)
+                    new_places.append(place)
+
+                place._hydrate(g)
+                place.update_from_geonames = False
+                place.modified = timezone.now()
+
+            Place.objects.bulk_create(new_places)
+            Place.objects.bulk_update(
+                existing.values(),
+                [
+                    "address",
+                    "class_description",
+                    "country",
+                    "feature_class",
+                    "lat",
+                    "lon",
+                    "update_from_geonames",
+                    "modified",
+                ],
+            )
 
-        return None
+        return Place.objects.in_bulk(list(geonames.keys()), field_name="geonames_id")
 
     @staticmethod
     def places_to_list():
         """Exports all the places to a list, which can then be written into CSV file,
         containing the id, name, lat, and lon values for each place. """
         return [place.to_list() for place in Place.objects.all()]
+
+
+class AlternateName(models.Model):
+    """Name of a place in a GeoNames gazetteer dump, indexed by the normalised
+    name, see `etat_civil.geonames_place.gazetteer`. `population` is the
+    population of the place, used to choose between places with the same name."""
+
+    place = models.ForeignKey(
+        Place, on_delete=models.CASCADE, related_name="alternate_names"
+    )
+    name = models.CharField(max_length=256)
+    key = models.CharField(max_length=256, db_index=True)
+    population = models.BigIntegerField(default=0)
+
+    class Meta:
+        ordering = ["key", "-population"]
+
+    def __str__(self):
+        return self.name
+
+    @staticmethod
+    def get_places(addresses, country_code=None):
+        """Returns a dict with the most populous place with each of the names in
+        `addresses`, for the addresses that are in the gazetteer."""
+        keys = {}
+        for address in addresses:
+            keys.setdefault(normalize_address(address), []).append(address)
+
+        if not keys:
+            return {}
+
+        names = AlternateName.objects.filter(key__in=keys.keys()).select_related(
+            "place"
+        )
+        if country_code:
+            names = names.filter(place__country__code=country_code)
+
+        places = {}
+        for name in names.order_by("key", "-population", "place__geonames_id"):
+            for address in keys[name.key]:
+                places.setdefault(address, name.place)
+
+        return places
+
+
+class GeocodeCache(TimeStampedModel):
+    """Geonames search results by normalised address. The entries without a
+    `geonames_id` are negative results, addresses geonames did not find, and
+    expire after `settings.GEONAMES_CACHE_NEGATIVE_TTL` days. `hits` counts the
+    lookups answered by the entry, and `misses` the lookups that had to search
+    geonames for it, the addresses found in the gazetteer are not misses."""
+
+    key = models.CharField(max_length=512)
+    country_code = models.CharField(max_length=16, blank=True, default="")
+    address = models.CharField(max_length=512)
+    geonames_id = models.BigIntegerField(blank=True, null=True)
+    expires = models.DateTimeField(blank=True, null=True)
+    hits = models.PositiveIntegerField(default=0)
+    misses = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ["key", "country_code"]
+        unique_together = ["key", "country_code"]
+
+    def __str__(self):
+        return self.address
+
+    @property
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        if not lookups:
+            return None
+
+        return self.hits / lookups
+
+    @staticmethod
+    def get_many(addresses, country_code=None):
+        """Returns a dict with the cached geonames id, or None for the negative
+        results, of the `addresses` that are in the cache and not expired."""
+        keys = {}
+        for address in addresses:
+            keys.setdefault(normalize_address(address), []).append(address)
+
+        if not keys:
+            return {}
+
+        entries = GeocodeCache.objects.filter(
+            Q(expires__isnull=True) | Q(expires__gt=timezone.now()),
+            key__in=keys.keys(),
+            country_code=country_code or "",
+        )
+
+        cached = {}
+        hits = []
+        for entry in entries:
+            for address in keys[entry.key]:
+                cached[address] = entry.geonames_id
+            hits.append(entry.pk)
+
+        GeocodeCache.objects.filter(pk__in=hits).update(hits=F("hits") + 1)
+
+        return cached
+
+    @staticmethod
+    def set_many(geonames_ids, country_code=None, searched=True):
+        """Caches the geonames id, or None for the addresses geonames did not find,
+        of the addresses in the `geonames_ids` dict. The lookups are counted as
+        misses when geonames was `searched` for the addresses, and not when they
+        were resolved from the gazetteer. The entries cached at the same time by
+        another process are left as they are."""
+        entries = {}
+        for address, geonames_id in geonames_ids.items():
+            entries[normalize_address(address)] = (address, geonames_id)
+
+        if not entries:
+            return
+
+        country_code = country_code or ""
+        now = timezone.now()
+        ttl = timedelta(days=settings.GEONAMES_CACHE_NEGATIVE_TTL)
+
+        with transaction.atomic():
+            existing = {
+                entry.key: entry
+                for entry in GeocodeCache.objects.filter(
+                    key__in=entries.keys(), country_code=country_code
+                )
+            }
+
+            new_entries = []
+            for key, (address, geonames_id) in entries.items():
+                entry = existing.get(key)
+                if entry is None:
+                    entry = GeocodeCache(key=key, country_code=country_code)
+                    new_entries.append(entry)
+
+                entry.address = address
+                entry.geonames_id = geonames_id
+                entry.expires = None if geonames_id else now + ttl
+                entry.misses += int(searched)
+                entry.modified = now
+
+            GeocodeCache.objects.bulk_create(new_entries, ignore_conflicts=True)
+            GeocodeCache.objects.bulk_update(
+                existing.values(),
+                ["address", "geonames_id", "expires", "misses", "modified"],
+            )
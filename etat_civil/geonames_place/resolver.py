@@ -0,0 +1,226 @@
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import geocoder
+from django.conf import settings
+from django.core.cache import cache as default_cache
+
+logger = logging.getLogger(__name__)
+
+
+class QuotaExceeded(Exception):
+    pass
+
+
+class RateLimiter:
+    """Thread-safe limiter for the geonames requests of the process. Requests are
+    spaced so that no more than `requests_per_second` are issued, and no more than
+    `hourly_quota` are issued in any hour, after which `acquire` raises
+    `QuotaExceeded`."""
+
+    def __init__(self, requests_per_second, hourly_quota, clock=time.monotonic):
+        self.interval = 1 / requests_per_second if requests_per_second else 0
+        self.hourly_quota = hourly_quota
+        self.clock = clock
+
+        self.lock = threading.Lock()
+        self.next_request = 0
+        self.requests = deque()
+
+    def acquire(self):
+        with self.lock:
+            now = self.clock()
+
+            while self.requests and self.requests[0] <= now - 3600:
+                self.requests.popleft()
+
+            if self.hourly_quota and len(self.requests) >= self.hourly_quota:
+                raise QuotaExceeded(
+                    f"The hourly quota of {self.hourly_quota} requests was used"
+                )
+
+            wait = max(self.next_request - now, 0)
+            self.next_request = now + wait + self.interval
+            self.requests.append(now + wait)
+
+        if wait:
+            time.sleep(wait)
+
+
+class CacheUnavailable(Exception):
+    pass
+
+
+class SharedRateLimiter:
+    """Limiter for the geonames requests of all the processes that share the
+    `cache`, the Redis cache by default, so that the import jobs running on several
+    workers do not issue more than `requests_per_second` requests together. Each
+    request reserves the next free slot of `1 / requests_per_second` seconds in the
+    cache, and is counted in the requests of the current clock hour, after
+    `hourly_quota` requests `acquire` raises `QuotaExceeded`. When the cache is not
+    available the requests are limited by the process `fallback` limiter."""
+
+    def __init__(
+        self,
+        requests_per_second,
+        hourly_quota,
+        cache=default_cache,
+        key="geonames:limiter",
+        clock=time.time,
+    ):
+        self.interval = 1 / requests_per_second if requests_per_second else 0
+        self.hourly_quota = hourly_quota
+        self.cache = cache
+        self.key = key
+        self.clock = clock
+
+        self.fallback = RateLimiter(requests_per_second, hourly_quota)
+
+    def acquire(self):
+        try:
+            wait = self.reserve()
+        except CacheUnavailable:
+            self.fallback.acquire()
+            return
+
+        if wait > 0:
+            time.sleep(wait)
+
+    def reserve(self):
+        """Counts the request in the hourly quota and reserves its slot, returns
+        the number of seconds to wait for the slot."""
+        now = self.clock()
+
+        if self.hourly_quota:
+            key = f"{self.key}:hour:{int(now // 3600)}"
+            self.cache.add(key, 0, 3600)
+
+            requests = self.cache.incr(key)
+            if requests is None:
+                raise CacheUnavailable()
+
+            if requests > self.hourly_quota:
+                raise QuotaExceeded(
+                    f"The hourly quota of {self.hourly_quota} requests was used"
+                )
+
+        if not self.interval:
+            return 0
+
+        slot = int(now / self.interval)
+        while True:
+            wait = slot * self.interval - now
+            reserved = self.cache.add(
+                f"{self.key}:slot:{slot}", 1, int(max(wait, 0)) + 2
+            )
+
+            if reserved is None:
+                raise CacheUnavailable()
+
+            if reserved:
+                return wait
+
+            slot += 1
+
+
+limiter = SharedRateLimiter(
+    settings.GEONAMES_REQUESTS_PER_SECOND, settings.GEONAMES_HOURLY_QUOTA
+)
+
+
+def is_transient(result):
+    """Returns True if the geocoder result failed with a connection error or a
+    server error that may not happen again."""
+    if not result.error:
+        return False
+
+    status_code = result.status_code
+
+    return not isinstance(status_code, int) or status_code == 429 or status_code >= 500
+
+
+class GeonamesResolver:
+    """Issues geonames lookups from a bounded thread pool. All the lookups go
+    through the rate `limiter` shared by the processes, and lookups that fail with
+    a transient error are retried up to `max_retries` times, waiting `backoff`
+    seconds before the first retry and doubling the wait for each retry after it.
+    The workers only query geonames, the results are written to the database by
+    the caller, see `Place.save_geonames`."""
+
+    def __init__(
+        self,
+        max_workers=None,
+        max_retries=None,
+        backoff=None,
+        rate_limiter=None,
+        lookup=None,
+    ):
+        self.max_workers = max_workers or settings.GEONAMES_MAX_WORKERS
+        self.max_retries = (
+            settings.GEONAMES_MAX_RETRIES if max_retries is None else max_retries
+        )
+        self.backoff = settings.GEONAMES_RETRY_BACKOFF if backoff is None else backoff
+        self.rate_limiter = rate_limiter or limiter
+        self.lookup = lookup or geocoder.geonames
+
+    def search(self, addresses, country_code=None, max_rows=1):
+        """Searches geonames by name, returns a dict with the list of geonames
+        results, or None if the lookup failed, for each of the `addresses`."""
+        options = {"key": settings.GEONAMES_KEY, "maxRows": max_rows}
+
+        if country_code:
+            options["country"] = country_code
+
+        return self.map(addresses, options)
+
+    def details(self, geonames_ids):
+        """Gets the details of the `geonames_ids`, returns a dict with the list of
+        geonames results, or None if the lookup failed, for each id."""
+        return self.map(
+            geonames_ids, {"key": settings.GEONAMES_KEY, "method": "details"}
+        )
+
+    def map(self, locations, options):
+        locations = list(dict.fromkeys(locations))
+
+        if not locations:
+            return {}
+
+        workers = min(self.max_workers, len(locations))
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            results = executor.map(lambda loc: self.get(loc, options), locations)
+
+            return dict(zip(locations, results))
+
+    def get(self, location, options):
+        """Looks up one location, returns an empty list when geonames does not
+        find it, or None when the lookup fails after the retries, or because of
+        the quota."""
+        wait = self.backoff
+
+        for attempt in range(self.max_retries + 1):
+            try:
+                self.rate_limiter.acquire()
+            except QuotaExceeded as e:
+                logger.warning("Geonames lookup for %s skipped: %s", location, e)
+                return None
+
+            result = self.lookup(location, **options)
+
+            if not result.error:
+                return list(result)
+
+            if not is_transient(result):
+                break
+
+            if attempt < self.max_retries:
+                time.sleep(wait)
+                wait *= 2
+
+        logger.warning("Geonames lookup for %s failed: %s", location, result.error)
+
+        return None
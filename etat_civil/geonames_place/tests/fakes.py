@@ -0,0 +1,100 @@
+from etat_civil.geonames_place.models import normalize_address
+
+# the places of the locations of data/raw/test.xlsx, and of the geonames tests
+GAZETTEER = [
+    (3038350, "Aix", 45.69173, 5.90863, "France", "FR"),
+    (361058, "Alexandria", 31.20176, 29.91582, "Egypt", "EG"),
+    (264371, "Athens", 37.98376, 23.72784, "Greece", "GR"),
+    (360630, "Cairo", 30.06263, 31.24967, "Egypt", "EG"),
+    (745044, "Istanbul", 41.01384, 28.94966, "Turkey", "TR"),
+    (3021598, "Deneuille-les-Mines", 46.37859, 2.78209, "France", "FR"),
+    (3020850, "Draguignan", 43.53692, 6.46458, "France", "FR"),
+    (357994, "Egypt", 27.0, 30.0, "Egypt", "EG"),
+    (260114, "Chania", 35.51124, 24.02921, "Greece", "GR"),
+    (11351426, "Marquis", 14.0296, -60.90732, "Saint Lucia", "LC"),
+    (2995469, "Marseille", 43.29695, 5.38107, "France", "FR"),
+    (2988719, "Palisse", 45.41881, 2.20601, "France", "FR"),
+    (3170831, "Piedmont", 45.0, 8.0, "Italy", "IT"),
+    (2523650, "Ragusa", 36.92574, 14.72443, "Italy", "IT"),
+    (3167777, "Sanremo", 43.81725, 7.7772, "Italy", "IT"),
+    (311046, "Izmir", 38.41273, 27.13838, "Turkey", "TR"),
+    (2976742, "Saint-Tropez", 43.26764, 6.64049, "France", "FR"),
+    (2972328, "Toulon", 43.12442, 5.92836, "France", "FR"),
+    (3165185, "Trieste", 45.64953, 13.77678, "Italy", "IT"),
+    (2988507, "Paris", 48.85341, 2.3488, "France", "FR"),
+    (358619, "Port Said", 31.26531, 32.3019, "Egypt", "EG"),
+    (2635167, "United Kingdom", 54.75844, -2.69531, "United Kingdom", "GB"),
+]
+
+# names searched in geonames that are not the name of the place
+ALTERNATE_NAMES = {
+    "Alexandrie": 361058,
+    "Athènes": 264371,
+    "Caire": 360630,
+    "Constantinople": 745044,
+    "Egypte": 357994,
+    "Smyrne": 311046,
+    "St Tropez": 2976742,
+}
+
+
+class FakeResult(list):
+    def __init__(self, results=None, error=False, status_code=200):
+        super().__init__(results or [])
+        self.error = error
+        self.status_code = status_code
+
+    @property
+    def ok(self):
+        return len(self) > 0
+
+
+class FakeGeoname:
+    fieldnames = ["address", "geonames_id", "lat", "lng", "country", "country_code"]
+
+    def __init__(self, geonames_id, address, lat, lng, country, country_code):
+        self.geonames_id = geonames_id
+        self.address = address
+        self.lat = lat
+        self.lng = lng
+        self.country = country
+        self.country_code = country_code
+        self.class_description = "city, village,..."
+        self.feature_class = "P"
+
+
+class FakeGeonames:
+    """Stand-in for `geocoder.geonames` that answers the searches and the details
+    lookups from the `GAZETTEER`, and records the lookups in `calls`."""
+
+    def __init__(self, gazetteer=GAZETTEER, alternate_names=ALTERNATE_NAMES):
+        self.places = {row[0]: FakeGeoname(*row) for row in gazetteer}
+        self.names = {
+            normalize_address(place.address): geonames_id
+            for geonames_id, place in self.places.items()
+        }
+        self.names.update(
+            {
+                normalize_address(name): geonames_id
+                for name, geonames_id in alternate_names.items()
+            }
+        )
+        self.calls = []
+
+    def __call__(self, location, **options):
+        self.calls.append(location)
+
+        if options.get("method") == "details":
+            geonames_id = int(location)
+        else:
+            geonames_id = self.names.get(normalize_address(location))
+
+        place = self.places.get(geonames_id)
+        if place is None:
+            return FakeResult()
+
+        country_code = options.get("country")
+        if country_code and place.country_code != country_code:
+            return FakeResult()
+
+        return FakeResult([place])
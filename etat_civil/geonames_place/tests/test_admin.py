@@ -0,0 +1,23 @@
+import pytest
+from django.contrib.admin.sites import site
+from django.test import RequestFactory
+from etat_civil.geonames_place.admin import PlaceAdmin
+from etat_civil.geonames_place.models import Place
+
+pytestmark = pytest.mark.django_db
+
+
+class TestPlaceAdmin:
+    def test_get_search_results(self, geonames):
+        admin = PlaceAdmin(Place, site)
+        request = RequestFactory().get("/")
+
+        for _ in range(2):
+            queryset, _ = admin.get_search_results(
+                request, Place.objects.all(), "Alexandrie"
+            )
+            assert not queryset.exists()
+
+        # the search is cached, it is not sent to geonames again
+        assert geonames.calls == ["Alexandrie"]
+        assert Place.objects.filter(geonames_id=361058).exists()
@@ -0,0 +1,198 @@
+import zipfile
+
+import pytest
+from django.core.management import call_command
+from etat_civil.geonames_place.gazetteer import (
+    GazetteerLoader,
+    open_dump,
+    read_country_names,
+)
+from etat_civil.geonames_place.models import (
+    AlternateName,
+    ClassDescription,
+    Country,
+    GeocodeCache,
+    Place,
+)
+
+pytestmark = pytest.mark.django_db
+
+DUMP = [
+    [
+        "361058",
+        "Alexandria",
+        "Alexandria",
+        "Alexandrie,Al Iskandariyah,Ισκανδρεία",
+        "31.20176",
+        "29.91582",
+        "P",
+        "PPLA",
+        "EG",
+        "",
+        "06",
+        "",
+        "",
+        "",
+        "3811516",
+        "",
+        "11",
+        "Africa/Cairo",
+        "2019-09-05",
+    ],
+    [
+        "4314550",
+        "Alexandria",
+        "Alexandria",
+        "",
+        "31.2",
+        "-92.4",
+        "P",
+        "PPL",
+        "US",
+        "",
+        "LA",
+        "",
+        "",
+        "",
+        "47723",
+        "",
+        "26",
+        "America/Chicago",
+        "2017-03-09",
+    ],
+    [
+        "360630",
+        "Cairo",
+        "Cairo",
+        "Le Caire,Al Qahirah",
+        "30.06263",
+        "31.24967",
+        "P",
+        "PPLC",
+        "EG",
+        "",
+        "11",
+        "",
+        "",
+        "",
+        "9606916",
+        "",
+        "23",
+        "Africa/Cairo",
+        "2020-01-12",
+    ],
+]
+
+
+@pytest.fixture
+def dump_file(tmpdir):
+    dump_file = tmpdir.join("EG.txt")
+    dump_file.write_text(
+        "\n".join("\t".join(values) for values in DUMP) + "\n", encoding="utf-8"
+    )
+
+    return dump_file
+
+
+class TestGazetteerLoader:
+    def test_load(self, dump_file):
+        loader = GazetteerLoader(batch_size=2, country_names={"EG": "Egypt"})
+
+        with open_dump(dump_file) as f:
+            created, names = loader.load(f)
+
+        assert created == 3
+        assert names == 8
+
+        place = Place.objects.get(geonames_id=361058)
+        assert place.address == "Alexandria"
+        assert str(place.country) == "Egypt (EG)"
+        assert str(place.feature_class) == "P"
+        assert str(place.class_description) == "city, village,..."
+        assert AlternateName.objects.filter(place=place).count() == 4
+
+        with open_dump(dump_file) as f:
+            created, names = GazetteerLoader(feature_classes=["A"]).load(f)
+
+        assert created == 0
+        assert AlternateName.objects.count() == 8
+
+    def test_load_zip(self, dump_file, tmpdir):
+        zip_file = str(tmpdir.join("EG.zip"))
+        with zipfile.ZipFile(zip_file, "w") as archive:
+            archive.write(str(dump_file), "EG.txt")
+
+        call_command("load_geonames", zip_file, "--batch-size", "1")
+
+        assert Place.objects.count() == 3
+        assert str(Place.objects.get(geonames_id=360630).country) == "EG (EG)"
+
+    def test_load_hydrate(self, dump_file, geonames):
+        with open_dump(dump_file) as f:
+            GazetteerLoader().load(f)
+
+        assert str(Place.objects.get(geonames_id=361058).country) == "EG (EG)"
+
+        # the places updated from geonames have the same country and class
+        Place.hydrate_many_from_geonames(Place.objects.filter(geonames_id=361058))
+
+        place = Place.objects.get(geonames_id=361058)
+        assert str(place.country) == "Egypt (EG)"
+        assert place.country == Place.objects.get(geonames_id=360630).country
+        assert Country.objects.count() == 2
+        assert ClassDescription.objects.count() == 1
+
+    def test_open_dump_zip(self, dump_file, tmpdir, monkeypatch):
+        zip_file = str(tmpdir.join("EG.zip"))
+        with zipfile.ZipFile(zip_file, "w") as archive:
+            archive.write(str(dump_file), "EG.txt")
+
+        archives = []
+
+        class ZipFile(zipfile.ZipFile):
+            def __init__(self, *args, **kwargs):
+                super().__init__(*args, **kwargs)
+                archives.append(self)
+
+        monkeypatch.setattr(zipfile, "ZipFile", ZipFile)
+
+        with open_dump(zip_file) as f:
+            assert f.readline().startswith("361058\t")
+
+        assert f.closed
+        assert [archive.fp for archive in archives] == [None]
+
+    def test_read_country_names(self, tmpdir):
+        country_info = tmpdir.join("countryInfo.txt")
+        country_info.write_text(
+            "#ISO\tISO3\tISO-Numeric\tfips\tCountry\n"
+            "EG\tEGY\t818\tEG\tEgypt\tCairo\n",
+            encoding="utf-8",
+        )
+
+        with open_dump(country_info) as f:
+            assert read_country_names(f) == {"EG": "Egypt"}
+
+
+class TestAlternateName:
+    def test_get_places(self, dump_file, django_assert_num_queries):
+        with open_dump(dump_file) as f:
+            GazetteerLoader().load(f)
+
+        places = AlternateName.get_places(["Alexandrie", "le caire", "Nowhere"])
+        assert places["Alexandrie"].geonames_id == 361058
+        assert places["le caire"].geonames_id == 360630
+        assert "Nowhere" not in places
+
+        places = AlternateName.get_places(["Alexandria"], country_code="US")
+        assert places["Alexandria"].geonames_id == 4314550
+
+        with django_assert_num_queries(6):
+            place = Place.get_or_create_from_geonames("Al Qahirah")
+
+        assert place.geonames_id == 360630
+
+        # the places found in the gazetteer are not misses
+        entry = GeocodeCache.objects.get(key="al_qahirah")
+        assert entry.geonames_id == 360630
+        assert entry.misses == 0
@@ -1,8 +1,12 @@
+from datetime import timedelta
+from unittest.mock import patch
+
 import geocoder
 import pytest
 from django.conf import settings
 from django.db.utils import IntegrityError
-from etat_civil.geonames_place.models import Place
+from django.utils import timezone
+from etat_civil.geonames_place.models import GeocodeCache, Place, normalize_address
 
 pytestmark = pytest.mark.django_db
 
@@ -81,3 +85,69 @@ class TestPlace:
         places = Place.places_to_list()
         assert len(places) == 1
         assert "Address" in places[0]
+
+
+def test_normalize_address():
+    assert normalize_address(" Alexandrie (Égypte) ") == "alexandrie_egypte"
+    assert normalize_address("Port-Saïd") == normalize_address("port saïd")
+
+
+@pytest.mark.django_db
+class TestGeocodeCache:
+    def test_get_many(self):
+        assert GeocodeCache.get_many([]) == {}
+
+        GeocodeCache.set_many({"Alexandrie": 361058, "Nowhere": None})
+        GeocodeCache.set_many({"Elsewhere": None}, country_code="EG")
+
+        cached = GeocodeCache.get_many(["alexandrie", "Nowhere", "Elsewhere"])
+        assert cached == {"alexandrie": 361058, "Nowhere": None}
+
+        entry = GeocodeCache.objects.get(key="alexandrie")
+        assert entry.hits == 1
+        assert entry.misses == 1
+        assert entry.hit_rate == 0.5
+
+        GeocodeCache.objects.filter(key="nowhere").update(
+            expires=timezone.now() - timedelta(days=1)
+        )
+        assert GeocodeCache.get_many(["Nowhere"]) == {}
+
+        GeocodeCache.set_many({"Nowhere": 1})
+        entry = GeocodeCache.objects.get(key="nowhere")
+        assert entry.geonames_id == 1
+        assert entry.expires is None
+        assert entry.misses == 2
+
+    def test_get_or_create_many_from_geonames(self, django_assert_num_queries):
+        place = Place.objects.create(
+            geonames_id=361058, address="Alexandria", update_from_geonames=False
+        )
+        GeocodeCache.set_many({"Alexandrie": 361058, "Nowhere": None})
+
+        with django_assert_num_queries(3):
+            places = Place.get_or_create_many_from_geonames(["Alexandrie", "Nowhere"])
+
+        assert places == {"Alexandrie": place, "Nowhere": None}
+        assert Place.get_or_create_from_geonames("alexandrie") == place
+
+    def test_create_or_update_from_geonames(self, geonames):
+        GeocodeCache.set_many({"Alexandrie": None})
+
+        # the cache is not used to update the place
+        assert Place.create_or_update_from_geonames("Alexandrie") == 1
+        assert geonames.calls == ["Alexandrie"]
+
+        entry = GeocodeCache.objects.get(key="alexandrie")
+        assert entry.geonames_id == 361058
+        assert entry.misses == 2
+
+    def test_set_many_conflict(self):
+        GeocodeCache.set_many({"Alexandrie": 361058})
+
+        # an entry cached by another process since the entries were read
+        existing = GeocodeCache.objects.filter
+        with patch.object(GeocodeCache.objects, "filter", return_value=[]):
+            GeocodeCache.set_many({"Alexandrie": 361058, "Nowhere": None})
+        assert existing(key="alexandrie").get().misses == 1
+        assert existing(key="nowhere").exists()
@@ -0,0 +1,163 @@
+import pytest
+from django.core.cache.backends.locmem import LocMemCache
+from etat_civil.geonames_place.resolver import (
+    GeonamesResolver,
+    QuotaExceeded,
+    RateLimiter,
+    SharedRateLimiter,
+    is_transient,
+)
+from etat_civil.geonames_place.tests.fakes import FakeResult
+
+
+class FakeLookup:
+    def __init__(self, responses):
+        self.responses = responses
+        self.calls = []
+
+    def __call__(self, location, **options):
+        self.calls.append(location)
+        return self.responses[location].pop(0)
+
+
+class TestRateLimiter:
+    def test_acquire(self):
+        now = [0]
+        limiter = RateLimiter(0, 2, clock=lambda: now[0])
+
+        limiter.acquire()
+        limiter.acquire()
+        with pytest.raises(QuotaExceeded):
+            limiter.acquire()
+
+        now[0] = 3601
+        limiter.acquire()
+
+    def test_acquire_interval(self):
+        limiter = RateLimiter(1000, None, clock=lambda: 0)
+
+        for _ in range(5):
+            limiter.acquire()
+
+        assert list(limiter.requests) == pytest.approx([0, 0.001, 0.002, 0.003, 0.004])
+        assert limiter.next_request == pytest.approx(0.005)
+
+
+class UnavailableCache:
+    """A cache that fails as the Redis cache does when Redis is down."""
+
+    def add(self, *args):
+        return None
+
+    def incr(self, *args):
+        return None
+
+
+class TestSharedRateLimiter:
+    def get_limiters(self, requests_per_second, hourly_quota, now):
+        cache = LocMemCache("limiter", {})
+        cache.clear()
+
+        # the limiters of two processes
+        return [
+            SharedRateLimiter(
+                requests_per_second, hourly_quota, cache=cache, clock=lambda: now[0]
+            )
+            for _ in range(2)
+        ]
+
+    def test_acquire(self):
+        now = [0]
+        first, second = self.get_limiters(0, 2, now)
+
+        first.acquire()
+        second.acquire()
+        with pytest.raises(QuotaExceeded):
+            first.acquire()
+
+        now[0] = 3601
+        second.acquire()
+
+    def test_reserve(self):
+        now = [10]
+        first, second = self.get_limiters(4, None, now)
+
+        assert first.reserve() == 0
+        assert second.reserve() == pytest.approx(0.25)
+        assert first.reserve() == pytest.approx(0.5)
+
+        now[0] = 11
+        assert second.reserve() == 0
+
+    def test_acquire_unavailable(self):
+        limiter = SharedRateLimiter(4, 2, cache=UnavailableCache())
+
+        limiter.acquire()
+        limiter.acquire()
+        with pytest.raises(QuotaExceeded):
+            limiter.acquire()
+
+        assert len(limiter.fallback.requests) == 2
+
+
+class TestGeonamesResolver:
+    def get_resolver(self, responses, rate_limiter=None):
+        lookup = FakeLookup(responses)
+        resolver = GeonamesResolver(
+            max_workers=2,
+            max_retries=2,
+            backoff=0,
+            rate_limiter=rate_limiter or RateLimiter(0, None),
+            lookup=lookup,
+        )
+
+        return resolver, lookup
+
+    def test_is_transient(self):
+        assert is_transient(FakeResult()) is False
+        assert is_transient(FakeResult(error="ERROR", status_code="Unknown"))
+        assert is_transient(FakeResult(error="ERROR", status_code=503))
+        assert not is_transient(FakeResult(error="Invalid credentials"))
+
+    def test_search_error(self):
+        resolver, lookup = self.get_resolver(
+            {"Alexandria": [FakeResult(error="Invalid credentials")]}
+        )
+
+        assert resolver.search(["Alexandria"]) == {"Alexandria": None}
+        assert len(lookup.calls) == 1
+
+    def test_search(self):
+        resolver, lookup = self.get_resolver(
+            {
+                "Alexandria": [FakeResult(["alexandria"])],
+                "Nowhere": [FakeResult()],
+                "Cairo": [
+                    FakeResult(error="ERROR", status_code="Unknown"),
+                    FakeResult(error="ERROR", status_code=500),
+                    FakeResult(["cairo"]),
+                ],
+                "Suez": [FakeResult(error="ERROR", status_code=502)] * 3,
+            }
+        )
+
+        results = resolver.search(["Alexandria", "Nowhere", "Cairo", "Suez", "Cairo"])
+
+        assert results == {
+            "Alexandria": ["alexandria"],
+            "Nowhere": [],
+            "Cairo": ["cairo"],
+            "Suez": None,
+        }
+        assert lookup.calls.count("Cairo") == 3
+        assert lookup.calls.count("Suez") == 3
+
+    def test_search_quota(self):
+        resolver, lookup = self.get_resolver(
+            {"Alexandria": [FakeResult(["alexandria"])]},
+            rate_limiter=RateLimiter(0, 1),
+        )
+
+        assert resolver.search(["Alexandria"]) == {"Alexandria": ["alexandria"]}
+        assert resolver.search(["Alexandria"]) == {"Alexandria": None}
+        assert len(lookup.calls) == 1